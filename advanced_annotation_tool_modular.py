@@ -4,42 +4,65 @@ Versión modular con funcionalidades separadas
 """
 
 import dash
-from dash import dcc, html, callback, Input, Output, State, ctx, ALL, no_update, clientside_callback
+from dash import dcc, html, dash_table, callback, Input, Output, State, ctx, ALL, no_update, clientside_callback, ClientsideFunction, Patch
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import json
 import argparse
 import os
 import re
+import threading
+import time
+from urllib.parse import quote
+
+from flask import abort, send_file
 
 # Importar módulos locales
 from utils import (
     ConfigLoader, AnnotationManager, CoordinateConverter, 
-    UndoManager, FigureGenerator, CallbackManager
+    UndoManager, FigureGenerator, CallbackManager,
+    SuggestionService, build_detector,
+    BoxPropagator, PropagationJob, ReviewQueue, DatasetReconciler,
+    ThumbnailCache, TilePyramid, IOExecutor, StartupProfiler
 )
 
 
 class AdvancedAnnotationTool:
     """Herramienta avanzada para edición de anotaciones YOLO"""
     
-    def __init__(self, dataset_path):
+    # Miniaturas por página en la vista de cuadrícula
+    GRID_PAGE_SIZE = 48
+    
+    def __init__(self, dataset_path, detector=None, suggestion_prefetch=3, detector_name="", io_workers=4,
+                 profiler=None):
         self.dataset_path = dataset_path
+        # Cronometraje de etapas para --profile-startup (inactivo por defecto)
+        self.profiler = profiler or StartupProfiler()
+        # Hilos para precargar imágenes y etiquetas de los próximos frames (ver utils.io_executor)
+        self.io_workers = io_workers
+        # Detector opcional para pre-anotación (ver utils.preannotation)
+        self.detector = detector
+        self.detector_name = detector_name
+        self.suggestion_prefetch = suggestion_prefetch
         self.classes_yaml = os.path.join(dataset_path, "data.yaml")
         self.images_path = os.path.join(dataset_path, "images")
         self.labels_path = os.path.join(dataset_path, "annotations")
         
         # Inicializar módulos
-        self._initialize_modules(self.classes_yaml)
+        with self.profiler.stage("módulos (utils)"):
+            self._initialize_modules(self.classes_yaml)
         
-        # Variables de estado
-        self.current_image_index = 0
+        # Variables de estado (la imagen actual es de cada cliente: va en el store 'current-image-data')
         self.selected_annotation_id = None
         
         # Verificar directorios
         self._validate_directories()
         
-        # Obtener archivos de imagen
-        self._load_image_files()
+        # Listar imágenes en segundo plano: el servidor arranca sin esperar al scandir de images/
+        self.image_files = []
+        self.image_index = {}
+        self.scan_status = {'running': True, 'error': None, 'started': time.monotonic()}
+        self.scan_done = threading.Event()
+        threading.Thread(target=self._load_image_files, daemon=True, name="dataset-scan").start()
         
         # Configurar la app Dash con tema moderno
         external_stylesheets = [
@@ -52,9 +75,11 @@ class AdvancedAnnotationTool:
         ]
         
 
-        self.app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-        self.setup_layout()
-        self.setup_callbacks()
+        with self.profiler.stage("app Dash + layout + callbacks"):
+            self.app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+            self.setup_layout()
+            self.setup_callbacks()
+            self._setup_routes()
     
     def _initialize_modules(self, classes_yaml):
         """Inicializar todos los módulos necesarios"""
@@ -66,10 +91,26 @@ class AdvancedAnnotationTool:
         # Inicializar managers
         self.annotation_manager = AnnotationManager(self.labels_path, self.classes)
         self.undo_manager = UndoManager(max_steps=20)
-        self.figure_generator = FigureGenerator(self.images_path, self.class_colors)
+        self.tile_pyramid = TilePyramid(self.dataset_path)
+        self.figure_generator = FigureGenerator(self.images_path, self.class_colors, self.tile_pyramid)
+        self.suggestion_service = (
+            SuggestionService(self.detector, self.images_path, prefetch=self.suggestion_prefetch)
+            if self.detector is not None else None
+        )
+        self.box_propagator = BoxPropagator(self.images_path)
+        self.propagation_job = None
+        # Las predicciones de la cola pasan por el worker de sugerencias: el detector nunca se usa desde dos hilos
+        self.review_queue = ReviewQueue(self.dataset_path, detector=self.suggestion_service,
+                                        detector_name=self.detector_name)
+        # Orden de navegación por prioridad de revisión (None = orden por nombre)
+        self.review_order = None
+        self.review_position = {}
+        self.thumbnail_cache = ThumbnailCache(self.dataset_path, self.class_colors)
+        self.io_executor = IOExecutor(self.figure_generator, self.annotation_manager, max_workers=self.io_workers)
         self.callback_manager = CallbackManager(
             self.annotation_manager, self.undo_manager, 
-            self.figure_generator, self.classes
+            self.figure_generator, self.classes, self.suggestion_service,
+            self.box_propagator
         )
         
         # Converter utility
@@ -86,14 +127,34 @@ class AdvancedAnnotationTool:
             print(f"✅ Creado directorio de etiquetas: {self.labels_path}")
     
     def _load_image_files(self):
-        """Cargar lista de archivos de imagen"""
-        self.image_files = sorted([
-            f for f in os.listdir(self.images_path) 
-            if f.lower().endswith(('.jpg', '.jpeg', '.png'))
-        ])
-        
-        if not self.image_files:
-            raise FileNotFoundError(f"No se encontraron imágenes en: {self.images_path}")
+        """Cargar lista de archivos de imagen (en un hilo de fondo; la interfaz consulta scan_status)"""
+        start = time.perf_counter()
+        try:
+            # Un scandir por carpeta: lista de imágenes + aviso de etiquetas huérfanas
+            reconciler = DatasetReconciler(self.dataset_path).scan()
+            reconciler.startup_check()
+            if not reconciler.image_files:
+                raise FileNotFoundError(f"No se encontraron imágenes en: {self.images_path}")
+            # Primero el índice: la interfaz da el listado por terminado en cuanto image_files tiene contenido
+            self.image_index = {name: i for i, name in enumerate(reconciler.image_files)}
+            self.image_files = reconciler.image_files
+            print(f"🖼️ Imágenes encontradas: {len(self.image_files)}")
+        except Exception as e:
+            print(f"❌ Error listando imágenes: {e}")
+            self.scan_status['error'] = str(e)
+        finally:
+            self.profiler.record("listado de imágenes (fondo)", time.perf_counter() - start)
+            self.scan_status['running'] = False
+            self.scan_done.set()
+    
+    def _client_index(self, image_data):
+        """Índice de la imagen que muestra el cliente (store 'current-image-data'); 0 si todavía no tiene ninguna"""
+        return self.image_index.get((image_data or {}).get('filename'), 0)
+    
+    def wait_for_images(self, timeout=None):
+        """Esperar a que termine el listado de imágenes (scripts y benchmarks que usan image_files)"""
+        self.scan_done.wait(timeout)
+        return self.image_files
     
     def setup_layout(self):
         """Configurar el layout de la aplicación"""
@@ -104,7 +165,19 @@ class AdvancedAnnotationTool:
                 dcc.Store(id='current-image-data', data={}),
                 dcc.Store(id='image-dimensions', data={}),
                 dcc.Store(id='selected-annotation', data=None),
+                dcc.Store(id='selected-annotations', data=[]),
                 dcc.Store(id='keyboard-trigger', data=0),
+                dcc.Store(id='keyboard-edits', data=None),
+                dcc.Store(id='keyboard-ack', data=None),
+                # Registro de ediciones sin confirmar: sobrevive a recargas y cortes de conexión
+                dcc.Store(id='edit-log', storage_type='local'),
+                dcc.Store(id='keymap-mirror'),
+                dcc.Store(id='keymap-config', data={'classes': self.classes, 'colors': self.class_colors}),
+                dcc.Store(id='goto-index', data=None),
+                # Listado de imágenes en segundo plano: se consulta hasta que termina y entonces se carga el frame
+                dcc.Store(id='dataset-ready', data=False),
+                dcc.Interval(id='dataset-scan-interval', interval=250, disabled=False),
+                dcc.Store(id='grid-page', data=0),
                 
                 # Elemento invisible para el listener de teclado
                 html.Div(id="keyboard-listener", style={"display": "none"}),
@@ -192,6 +265,11 @@ class AdvancedAnnotationTool:
                                 ], id="last-button", color="light", outline=True,
                                  size="sm", className="border-secondary"),
                             ], className="w-100"),
+                            dbc.Button([
+                                html.I(className="fas fa-th me-1"),
+                                "Cuadrícula"
+                            ], id="grid-button", color="secondary", outline=True,
+                             size="sm", className="w-100 mt-2", title="G"),
                         ])
                     ], width=3),
                     
@@ -207,7 +285,12 @@ class AdvancedAnnotationTool:
                                     html.P(id="image-counter", className="text-center mb-0 fw-bold",
                                           style={"font-size": "0.85rem", "color": "#374151"})
                                 ], className="py-2")
-                            ], className="bg-light border-0 shadow-sm")
+                            ], className="bg-light border-0 shadow-sm mb-2"),
+                            dbc.Switch(id="review-order-switch", label="Orden por prioridad de revisión",
+                                       value=False, className="small mb-1"),
+                            html.Small(id="review-status", className="text-muted d-block",
+                                       style={"font-size": "0.75rem"}),
+                            dcc.Interval(id="review-interval", interval=1500, disabled=True)
                         ])
                     ], width=3),
                     
@@ -275,6 +358,41 @@ class AdvancedAnnotationTool:
                                 size="sm")
                             ], className="w-100 mb-2"),
                             
+                            # Pre-anotación con el detector
+                            dbc.ButtonGroup([
+                                dbc.Button([
+                                    html.I(className="fas fa-magic me-1"),
+                                    "Sugerir"
+                                ], id="suggest-button", color="success", outline=True, size="sm",
+                                 disabled=self.suggestion_service is None, title="Sugerir cajas (S)"),
+                                dbc.Button([
+                                    html.I(className="fas fa-check")
+                                ], id="accept-suggestions-button", color="success", outline=True, size="sm",
+                                 disabled=self.suggestion_service is None, title="Aceptar todas las sugerencias"),
+                                dbc.Button([
+                                    html.I(className="fas fa-times")
+                                ], id="reject-suggestions-button", color="secondary", outline=True, size="sm",
+                                 disabled=self.suggestion_service is None, title="Descartar sugerencias")
+                            ], className="w-100 mb-2"),
+                            
+                            # Propagación de cajas entre frames consecutivos
+                            dbc.InputGroup([
+                                dbc.Button([
+                                    html.I(className="fas fa-forward me-1"),
+                                    "Del anterior"
+                                ], id="propagate-button", color="info", outline=True, size="sm",
+                                 title="Propagar cajas del frame anterior (P)"),
+                                dbc.Input(id="propagate-count", type="number", value=20, min=1, size="sm",
+                                          placeholder="N frames"),
+                                dbc.Button([
+                                    html.I(className="fas fa-fast-forward")
+                                ], id="propagate-range-button", color="info", outline=True, size="sm",
+                                 title="Propagar hacia los N frames siguientes en segundo plano")
+                            ], size="sm", className="mb-1"),
+                            html.Small(id="propagate-status", className="text-muted d-block mb-2",
+                                       style={"font-size": "0.75rem"}),
+                            dcc.Interval(id="propagate-interval", interval=1000, disabled=True),
+                            
                             html.Small([
                                 html.I(className="fas fa-lightbulb me-1"),
                                 "Arrastra para crear • Clic para seleccionar"
@@ -345,10 +463,14 @@ class AdvancedAnnotationTool:
                             config={
                                 'displayModeBar': True,
                                 'modeBarButtonsToRemove': [
-                                    'pan2d', 'select2d', 'lasso2d', 'resetScale2d',
+                                    'pan2d', 'resetScale2d',
                                     'zoomIn2d', 'zoomOut2d', 'autoScale2d'
                                 ],
+                                # Rectángulo/lazo para selección múltiple; 'drawrect' vuelve al modo dibujo
+                                'modeBarButtonsToAdd': ['drawrect'],
                                 'displaylogo': False,
+                                # Solo tiene efecto en imágenes con teselas (ejes no fijos)
+                                'scrollZoom': True,
                                 'toImageButtonOptions': {
                                     'format': 'png', 'filename': 'anotacion',
                                     'height': 500, 'width': 700, 'scale': 1
@@ -382,9 +504,40 @@ class AdvancedAnnotationTool:
                 ], className="mb-0 text-body fw-semibold")
             ], className="bg-white border-bottom border-light"),
             dbc.CardBody([
-                html.Div(id="annotations-list", 
-                        style={'max-height': '320px', 'overflow-y': 'auto'},
-                        className="custom-scrollbar")
+                html.Div([
+                    html.I(className="fas fa-inbox fa-2x mb-2", style={"color": "#94a3b8"}),
+                    html.H6("No hay anotaciones", className="mb-1"),
+                    html.Small("Dibuja un rectángulo para crear una nueva", className="text-muted")
+                ], id="annotations-empty", className="text-center py-3"),
+                # Tabla virtualizada: solo se renderizan las filas visibles y se actualiza con Patch
+                dash_table.DataTable(
+                    id="annotations-table",
+                    columns=[
+                        {"name": "ID", "id": "idx"},
+                        {"name": "Clase", "id": "class_name"},
+                        {"name": "Centro", "id": "center"},
+                        {"name": "Tamaño", "id": "size"},
+                        {"name": "", "id": "select"},
+                        {"name": "", "id": "delete"},
+                    ],
+                    data=[],
+                    virtualization=True,
+                    fixed_rows={'headers': True},
+                    page_action='none',
+                    cell_selectable=True,
+                    style_table={'height': '320px', 'overflowY': 'auto'},
+                    style_header={'fontWeight': '600', 'backgroundColor': '#f8fafc', 'fontSize': '0.75rem'},
+                    style_cell={'fontSize': '0.75rem', 'padding': '4px 6px', 'textAlign': 'left',
+                                'fontFamily': 'Inter, sans-serif', 'border': 'none',
+                                'borderBottom': '1px solid #f1f5f9'},
+                    style_cell_conditional=[
+                        {'if': {'column_id': 'idx'}, 'width': '36px'},
+                        {'if': {'column_id': ['select', 'delete']}, 'width': '30px', 'textAlign': 'center',
+                         'cursor': 'pointer'},
+                    ],
+                    style_data_conditional=self._annotation_table_styles(),
+                    tooltip_header={'select': 'Seleccionar para cambiar clase', 'delete': 'Eliminar'}
+                )
             ], className="p-3")
         ], className="mb-4 border-0 shadow-sm", style={"border-radius": "12px"})
     
@@ -505,14 +658,37 @@ class AdvancedAnnotationTool:
     
     def _create_modals(self):
         """Crear los modals"""
-        return dbc.Modal([
-            dbc.ModalHeader("⚠️ Confirmar Eliminación"),
-            dbc.ModalBody("¿Estás seguro de que quieres eliminar este frame? Esta acción no se puede deshacer."),
-            dbc.ModalFooter([
-                dbc.Button("Cancelar", id="cancel-delete", color="secondary"),
-                dbc.Button("Eliminar", id="confirm-delete", color="danger")
-            ])
-        ], id="delete-modal", is_open=False)
+        return html.Div([
+            dbc.Modal([
+                dbc.ModalHeader("⚠️ Confirmar Eliminación"),
+                dbc.ModalBody("¿Estás seguro de que quieres eliminar este frame? Esta acción no se puede deshacer."),
+                dbc.ModalFooter([
+                    dbc.Button("Cancelar", id="cancel-delete", color="secondary"),
+                    dbc.Button("Eliminar", id="confirm-delete", color="danger")
+                ])
+            ], id="delete-modal", is_open=False),
+            
+            # Vista de cuadrícula: solo se renderiza la página visible
+            dbc.Modal([
+                dbc.ModalHeader("🗂️ Vista de cuadrícula • clic en una miniatura para abrirla"),
+                dbc.ModalBody([
+                    html.Small(id="grid-status", className="text-muted d-block mb-2"),
+                    html.Div(id="grid-container", style={
+                        "display": "grid",
+                        "grid-template-columns": "repeat(auto-fill, minmax(160px, 1fr))",
+                        "gap": "8px"
+                    }),
+                    dcc.Interval(id="grid-interval", interval=2000, disabled=True)
+                ]),
+                dbc.ModalFooter([
+                    dbc.Button(html.I(className="fas fa-chevron-left"), id="grid-prev-page",
+                               color="light", size="sm"),
+                    html.Span(id="grid-page-label", className="small mx-2"),
+                    dbc.Button(html.I(className="fas fa-chevron-right"), id="grid-next-page",
+                               color="light", size="sm")
+                ])
+            ], id="grid-modal", is_open=False, size="xl", scrollable=True)
+        ])
     
     def _create_toast(self):
         """Crear el toast de notificaciones"""
@@ -531,76 +707,210 @@ class AdvancedAnnotationTool:
         self._setup_navigation_callbacks()
         self._setup_annotation_callbacks()
         self._setup_interaction_callbacks()
+        self._setup_suggestion_callbacks()
+        self._setup_propagation_callbacks()
+        self._setup_review_callbacks()
+        self._setup_grid_callbacks()
+        self._setup_tile_callbacks()
         self._setup_utility_callbacks()
     
     def _setup_keyboard_callbacks(self):
         """Configurar callbacks de teclado"""
+        # Atajos de teclado en assets/annotation_keymap.js: clase, mover y redimensionar se dibujan en el
+        # navegador, se anotan en 'edit-log' (localStorage) y llegan al servidor lote a lote por 'keyboard-edits'
         clientside_callback(
-            """
-            function(n) {
-                if (window.keydownListener) {
-                    document.removeEventListener('keydown', window.keydownListener);
-                }
-                
-                window.keydownListener = function(event) {
-                    if (event.target.tagName !== 'INPUT' && event.target.tagName !== 'TEXTAREA') {
-                        if (event.key === 'f' || event.key === 'F') {
-                            const nextBtn = document.getElementById('next-button');
-                            if (nextBtn) { nextBtn.click(); event.preventDefault(); }
-                        } else if (event.key === 'd' || event.key === 'D') {
-                            const prevBtn = document.getElementById('prev-button');
-                            if (prevBtn) { prevBtn.click(); event.preventDefault(); }
-                        } else if (event.ctrlKey && (event.key === 'z' || event.key === 'Z')) {
-                            const undoBtn = document.getElementById('undo-button');
-                            if (undoBtn) { undoBtn.click(); event.preventDefault(); }
-                        } else if (event.key === 'Delete' || event.key === 'Supr') {
-                            const deleteBtn = document.getElementById('delete-selected-button');
-                            if (deleteBtn) { deleteBtn.click(); event.preventDefault(); }
-                        }
-                    }
-                };
-                
-                document.addEventListener('keydown', window.keydownListener);
-                return n + 1;
-            }
-            """,
+            ClientsideFunction(namespace='keymap', function_name='install'),
             Output('keyboard-trigger', 'data'),
-            [Input('keyboard-listener', 'id')]
+            [Input('keyboard-listener', 'id')],
+            [State('keymap-config', 'data')]
+        )
+
+        clientside_callback(
+            ClientsideFunction(namespace='keymap', function_name='mirror'),
+            Output('keymap-mirror', 'data'),
+            [Input('selected-annotation', 'data'),
+             Input('current-annotations', 'data'),
+             Input('opacity-slider', 'value'),
+             Input('display-options', 'value'),
+             Input('current-image-data', 'data'),
+             Input('image-dimensions', 'data')]
         )
+
+        clientside_callback(
+            ClientsideFunction(namespace='keymap', function_name='restore'),
+            Output('keymap-mirror', 'data', allow_duplicate=True),
+            [Input('edit-log', 'data')],
+            prevent_initial_call=True
+        )
+
+        clientside_callback(
+            ClientsideFunction(namespace='keymap', function_name='acknowledge'),
+            Output('keymap-mirror', 'data', allow_duplicate=True),
+            [Input('keyboard-ack', 'data')],
+            prevent_initial_call=True
+        )
+
+        @callback(
+            [Output('current-annotations', 'data', allow_duplicate=True),
+             Output('image-graph', 'figure', allow_duplicate=True),
+             Output('keyboard-ack', 'data'),
+             Output('notification-toast', 'is_open', allow_duplicate=True),
+             Output('notification-toast', 'children', allow_duplicate=True)],
+            [Input('keyboard-edits', 'data')],
+            [State('current-annotations', 'data'),
+             State('image-dimensions', 'data'),
+             State('current-image-data', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value'),
+             State('selected-annotation', 'data')],
+            prevent_initial_call=True
+        )
+        def apply_keyboard_edits(batch, annotations, img_dims, image_data, opacity, display_options, selected):
+            if not batch:
+                return dash.no_update, dash.no_update, dash.no_update, False, ""
+            return self.callback_manager.handle_keyboard_edits(
+                batch, annotations or [], img_dims, image_data, opacity, display_options, selected
+            )
     
     def _setup_navigation_callbacks(self):
         """Configurar callbacks de navegación"""
+        # Navegación: única ruta que carga imagen y etiquetas y envía la figura completa
         @self.app.callback(
             [Output('image-graph', 'figure'),
              Output('current-annotations', 'data'),
              Output('image-counter', 'children'),
              Output('image-dimensions', 'data'),
-             Output('current-image-data', 'data'),
-             Output('annotation-count-badge', 'children')],
+             Output('current-image-data', 'data')],
             [Input('next-button', 'n_clicks'),
              Input('prev-button', 'n_clicks'),
              Input('first-button', 'n_clicks'),
              Input('last-button', 'n_clicks'),
              Input('reload-button', 'n_clicks'),
-             Input('opacity-slider', 'value'),
-             Input('display-options', 'value')],
-            [State('current-annotations', 'data')]
+             Input('goto-index', 'data'),
+             Input('dataset-ready', 'data')],
+            [State('opacity-slider', 'value'),
+             State('display-options', 'value'),
+             State('current-image-data', 'data')]
         )
-        def navigate_and_update_display(next_clicks, prev_clicks, first_clicks, last_clicks, 
-                                      reload_clicks, opacity, display_options, current_annotations):
-            return self._handle_navigation_and_display(
+        def navigate_images(next_clicks, prev_clicks, first_clicks, last_clicks,
+                            reload_clicks, goto_index, dataset_ready, opacity, display_options, image_data):
+            if ctx.triggered_id == 'dataset-ready' and (not dataset_ready or (image_data or {}).get('filename')):
+                # El primer frame ya se cargó (el listado terminó antes de la primera petición)
+                return (dash.no_update,) * 5
+            return self._handle_navigation(
                 next_clicks, prev_clicks, first_clicks, last_clicks, reload_clicks,
-                opacity, display_options, current_annotations
+                opacity, display_options, goto_index, image_data
+            )
+        
+        # Progreso del listado de imágenes; al terminar se avisa a la navegación para cargar el frame
+        @self.app.callback(
+            [Output('dataset-ready', 'data'),
+             Output('dataset-scan-interval', 'disabled'),
+             Output('image-counter', 'children', allow_duplicate=True)],
+            [Input('dataset-scan-interval', 'n_intervals')],
+            prevent_initial_call=True
+        )
+        def poll_dataset_scan(n_intervals):
+            if self.scan_status['running']:
+                elapsed = time.monotonic() - self.scan_status['started']
+                return dash.no_update, False, f"⏳ Listando imágenes del dataset... ({elapsed:.1f} s)"
+            if self.scan_status['error']:
+                return dash.no_update, True, f"❌ {self.scan_status['error']}"
+            return True, True, dash.no_update
+        
+        # Opacidad y etiquetas: Patch de shapes y textos, sin recargar ni reenviar la imagen
+        @self.app.callback(
+            Output('image-graph', 'figure', allow_duplicate=True),
+            [Input('opacity-slider', 'value'),
+             Input('display-options', 'value')],
+            [State('current-annotations', 'data'),
+             State('image-dimensions', 'data'),
+             State('selected-annotation', 'data'),
+             State('selected-annotations', 'data')],
+            prevent_initial_call=True
+        )
+        def update_display(opacity, display_options, annotations, img_dims, selected_id, group):
+            if not img_dims:
+                return dash.no_update
+            show_ids = 'show_ids' in (display_options or [])
+            show_coords = 'show_coords' in (display_options or [])
+            return self.figure_generator.display_patch(
+                annotations or [], img_dims, opacity, show_ids, show_coords, group or selected_id
             )
+        
+        # El contador de cajas se calcula en el navegador
+        clientside_callback(
+            """
+            function(annotations) {
+                return (annotations || []).length + " anotaciones";
+            }
+            """,
+            Output('annotation-count-badge', 'children'),
+            Input('current-annotations', 'data')
+        )
     
     def _setup_annotation_callbacks(self):
         """Configurar callbacks de anotaciones"""
         @self.app.callback(
-            Output('annotations-list', 'children'),
-            [Input('current-annotations', 'data')]
+            [Output('annotations-table', 'data'),
+             Output('annotations-empty', 'style')],
+            [Input('current-annotations', 'data')],
+            [State('annotations-table', 'data')]
+        )
+        def update_annotations_list(annotations, previous_rows):
+            return self._update_annotations_list(annotations, previous_rows)
+        
+        # Resaltar en la tabla la selección actual (simple o múltiple)
+        @self.app.callback(
+            Output('annotations-table', 'style_data_conditional'),
+            [Input('selected-annotation', 'data'),
+             Input('selected-annotations', 'data')]
         )
-        def update_annotations_list(annotations):
-            return self._update_annotations_list(annotations)
+        def highlight_selected_rows(selected_id, group):
+            selected = group or ([selected_id] if selected_id is not None else [])
+            return self._annotation_table_styles(selected)
+        
+        # Clic en la tabla: 🎯 selecciona la caja, 🗑️ la elimina
+        @self.app.callback(
+            [Output('current-annotations', 'data', allow_duplicate=True),
+             Output('image-graph', 'figure', allow_duplicate=True),
+             Output('notification-toast', 'is_open', allow_duplicate=True),
+             Output('notification-toast', 'children', allow_duplicate=True),
+             Output('selected-annotation', 'data', allow_duplicate=True),
+             Output('selected-annotations', 'data', allow_duplicate=True),
+             Output('annotations-table', 'active_cell')],
+            [Input('annotations-table', 'active_cell')],
+            [State('current-annotations', 'data'),
+             State('image-dimensions', 'data'),
+             State('current-image-data', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value'),
+             State('selected-annotation', 'data'),
+             State('selected-annotations', 'data')],
+            prevent_initial_call=True
+        )
+        def handle_table_click(active_cell, annotations, img_dims, image_data, opacity, display_options,
+                               current_selected, group):
+            if not active_cell or not annotations or active_cell.get('row_id') is None:
+                return (dash.no_update,) * 7
+            
+            index = active_cell['row_id']
+            if active_cell['column_id'] == 'delete':
+                updated, fig, toast_open, message, _ = self.callback_manager.handle_delete_by_id_annotation(
+                    1, annotations, index, image_data, opacity, display_options
+                )
+                # active_cell a None para que un segundo clic en la misma celda vuelva a disparar
+                return updated, fig, toast_open, message, None, [], None
+            
+            if not 0 <= index < len(annotations):
+                return (dash.no_update,) * 6 + (None,)
+            patched = self.callback_manager.patch_shapes(
+                [current_selected, index] + list(group or []), annotations, img_dims,
+                opacity, display_options, index
+            )
+            class_name = annotations[index].get('class_name', f"Clase {annotations[index].get('class_id', 0)}")
+            message = f"🎯 Seleccionada desde lista: {class_name} (índice: {index})"
+            return dash.no_update, patched, True, message, index, [], None
     
     def _setup_interaction_callbacks(self):
         """Configurar callbacks de interacción"""
@@ -610,7 +920,8 @@ class AdvancedAnnotationTool:
              Output('image-graph', 'figure', allow_duplicate=True),
              Output('notification-toast', 'is_open'),
              Output('notification-toast', 'children'),
-             Output('selected-annotation', 'data', allow_duplicate=True)],
+             Output('selected-annotation', 'data', allow_duplicate=True),
+             Output('selected-annotations', 'data', allow_duplicate=True)],
             [Input('image-graph', 'relayoutData')],
             [State('current-annotations', 'data'),
              State('image-dimensions', 'data'),
@@ -618,35 +929,22 @@ class AdvancedAnnotationTool:
              State('class-selector', 'value'),
              State('opacity-slider', 'value'),
              State('display-options', 'value'),
-             State('selected-annotation', 'data')],
+             State('selected-annotation', 'data'),
+             State('selected-annotations', 'data')],
             prevent_initial_call=True
         )
         def handle_shape_interaction(relayout_data, annotations, img_dims, image_data, 
-                                   selected_class, opacity, display_options, current_selected):
-            if not relayout_data or not annotations:
-                return dash.no_update, dash.no_update, False, "", dash.no_update
-            
-            print(f"DEBUG RELAYOUT: {relayout_data}")
+                                   selected_class, opacity, display_options, current_selected, group):
+            if not relayout_data or not annotations or self._is_viewport_change(relayout_data):
+                return dash.no_update, dash.no_update, False, "", dash.no_update, dash.no_update
             
             # PRIMERO: Manejar la edición normal (si hay cambios de coordenadas)
             edit_result = self.callback_manager.handle_shape_interaction(
                 relayout_data, annotations, img_dims, image_data, 
-                selected_class, opacity, display_options
+                selected_class, opacity, display_options, current_selected, group
             )
             
-            # Si hay cambios de edición, usar esos datos actualizados
-            if edit_result[0] != annotations:  # Si las anotaciones cambiaron
-                updated_annotations = edit_result[0]
-                updated_figure = edit_result[1]
-                toast_open = edit_result[2]
-                toast_message = edit_result[3]
-                print("DEBUG: Cambios de edición detectados y aplicados")
-            else:
-                # No hay cambios de edición, usar datos originales
-                updated_annotations = annotations
-                updated_figure = None
-                toast_open = False
-                toast_message = ""
+            updated_annotations, updated_figure, toast_open, toast_message = edit_result
             
             # SEGUNDO: Detectar selección de shapes
             selected_annotation_idx = current_selected  # Mantener selección actual por defecto
@@ -661,136 +959,134 @@ class AdvancedAnnotationTool:
                         shape_idx = int(match.group(1))
                         if 0 <= shape_idx < len(updated_annotations):
                             selected_annotation_idx = shape_idx
-                            class_name = updated_annotations[shape_idx].get('class_name', f"Clase {updated_annotations[shape_idx].get('class_id', 0)}")
-                            selection_message = f"🎯 Seleccionada: {class_name} (índice: {shape_idx})"
-                            print(f"DEBUG: Shape {shape_idx} seleccionada")
+                            if shape_idx not in (group or []):
+                                class_name = updated_annotations[shape_idx].get('class_name', f"Clase {updated_annotations[shape_idx].get('class_id', 0)}")
+                                selection_message = f"🎯 Seleccionada: {class_name} (índice: {shape_idx})"
                             break
             
-            # Si hay selección nueva O cambios de edición, regenerar figura
-            if selected_annotation_idx != current_selected or updated_figure is None:
-                show_ids = 'show_ids' in (display_options or ['show_ids'])
-                show_coords = 'show_coords' in (display_options or [])
-                
-                current_image = image_data.get('filename', self.image_files[self.current_image_index])
-                final_figure, _ = self.figure_generator.create_figure_with_annotations(
-                    current_image, updated_annotations, opacity, show_ids, show_coords, selected_annotation_idx
-                )
-                
-                return updated_annotations, final_figure, toast_open or (selected_annotation_idx != current_selected), selection_message, selected_annotation_idx
+            # Tocar una caja fuera de la selección múltiple la deshace
+            leaves_group = bool(group) and selected_annotation_idx not in group
+            group_output = [] if leaves_group else dash.no_update
             
-            # Si no hay cambios, retornar lo que ya tenemos de la edición
-            return updated_annotations, updated_figure or dash.no_update, toast_open, selection_message, selected_annotation_idx
+            # Nueva selección: redibujar solo las cajas afectadas (salvo que ya venga una figura completa)
+            if selected_annotation_idx != current_selected and (leaves_group or not group):
+                toast_open = True
+                if updated_figure is dash.no_update or isinstance(updated_figure, Patch):
+                    updated_figure = self.callback_manager.patch_shapes(
+                        [current_selected, selected_annotation_idx] + list(group or []), updated_annotations,
+                        img_dims, opacity, display_options, selected_annotation_idx,
+                        patched=updated_figure if isinstance(updated_figure, Patch) else None
+                    )
+            
+            # Sin edición real la store no se reescribe (evita recalcular la lista de anotaciones)
+            annotations_output = dash.no_update if updated_annotations is annotations else updated_annotations
+            return annotations_output, updated_figure, toast_open, selection_message, selected_annotation_idx, group_output
         
         # Callback alternativo para detectar clics directos (cuando no hay edición)
         @self.app.callback(
             [Output('selected-annotation', 'data', allow_duplicate=True),
              Output('notification-toast', 'is_open', allow_duplicate=True),
-             Output('notification-toast', 'children', allow_duplicate=True)],
+             Output('notification-toast', 'children', allow_duplicate=True),
+             Output('selected-annotations', 'data', allow_duplicate=True),
+             Output('image-graph', 'figure', allow_duplicate=True)],
             [Input('image-graph', 'clickData')],
             [State('current-annotations', 'data'),
-             State('image-dimensions', 'data')],
+             State('image-dimensions', 'data'),
+             State('current-image-data', 'data'),
+             State('selected-annotation', 'data'),
+             State('selected-annotations', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value')],
             prevent_initial_call=True
         )
-        def handle_direct_click(click_data, annotations, img_dims):
+        def handle_direct_click(click_data, annotations, img_dims, image_data, current_selected, group,
+                                opacity, display_options):
+            no_change = (dash.no_update,) * 5
             if not click_data or not annotations or not img_dims:
-                return dash.no_update, dash.no_update, dash.no_update
+                return no_change
+            
+            # Los clics sobre sugerencias se gestionan en su propio callback
+            if click_data['points'][0].get('customdata'):
+                return no_change
             
             try:
-                # Obtener coordenadas del clic
-                click_x = click_data['points'][0]['x']
-                click_y = click_data['points'][0]['y']
-                
-                print(f"DEBUG DIRECT CLICK: Clic en ({click_x:.1f}, {click_y:.1f})")
+                # Índice espacial del frame: con cajas anidadas se selecciona la más pequeña
+                point = click_data['points'][0]
+                filename = (image_data or {}).get('filename')
+                index = self.callback_manager.select_at(point['x'], point['y'], annotations, img_dims, filename)
+                if index is None:
+                    return dash.no_update, False, "", dash.no_update, dash.no_update
                 
-                # Buscar qué anotación contiene este punto
-                for i in reversed(range(len(annotations))):
-                    ann = annotations[i]
-                    
-                    # Convertir anotación YOLO a píxeles
-                    x_center = ann['x_center'] * img_dims['width']
-                    y_center = ann['y_center'] * img_dims['height']
-                    width = ann['width'] * img_dims['width']
-                    height = ann['height'] * img_dims['height']
-                    
-                    # Calcular límites de la caja con margen
-                    margin = 10
-                    x_min = x_center - width / 2 - margin
-                    x_max = x_center + width / 2 + margin
-                    y_min = img_dims['height'] - (y_center + height / 2) - margin
-                    y_max = img_dims['height'] - (y_center - height / 2) + margin
-                    
-                    if x_min <= click_x <= x_max and y_min <= click_y <= y_max:
-                        class_name = ann.get('class_name', f"Clase {ann.get('class_id', 0)}")
-                        message = f"🎯 Seleccionada por clic: {class_name} (índice: {i})"
-                        print(f"DEBUG: Selección por clic directo - índice {i}")
-                        return i, True, message
-                
-                return dash.no_update, False, ""
+                # Un clic simple sustituye a la selección múltiple: solo se redibujan las cajas afectadas
+                patched = self.callback_manager.patch_shapes(
+                    [current_selected, index] + list(group or []), annotations, img_dims,
+                    opacity, display_options, index
+                )
+                ann = annotations[index]
+                class_name = ann.get('class_name', f"Clase {ann.get('class_id', 0)}")
+                return index, True, f"🎯 Seleccionada por clic: {class_name} (índice: {index})", [], patched
                 
             except Exception as e:
                 print(f"ERROR en clic directo: {e}")
-                return dash.no_update, False, ""
+                return dash.no_update, False, "", dash.no_update, dash.no_update
         
+        # Selección múltiple con las herramientas de rectángulo/lazo de Plotly
         @self.app.callback(
-            [Output('current-annotations', 'data', allow_duplicate=True),
+            [Output('selected-annotations', 'data', allow_duplicate=True),
+             Output('selected-annotation', 'data', allow_duplicate=True),
              Output('image-graph', 'figure', allow_duplicate=True),
              Output('notification-toast', 'is_open', allow_duplicate=True),
-             Output('notification-toast', 'children', allow_duplicate=True),
-             Output('selected-annotation', 'data', allow_duplicate=True)],
-            [Input('delete-selected-button', 'n_clicks')],
+             Output('notification-toast', 'children', allow_duplicate=True)],
+            [Input('image-graph', 'selectedData')],
             [State('current-annotations', 'data'),
-             State('selected-annotation', 'data'),
+             State('image-dimensions', 'data'),
              State('current-image-data', 'data'),
              State('opacity-slider', 'value'),
-             State('display-options', 'value')],
+             State('display-options', 'value'),
+             State('selected-annotations', 'data')],
             prevent_initial_call=True
         )
-        def delete_selected_annotation(delete_clicks, annotations, selected_id, image_data, opacity, display_options):
-            return self.callback_manager.handle_delete_selected_annotation(
-                delete_clicks, annotations, selected_id, image_data, opacity, display_options
+        def handle_box_selection(selected_data, annotations, img_dims, image_data, opacity, display_options, group):
+            if not annotations or not img_dims or not image_data:
+                return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+            return self.callback_manager.handle_region_selection(
+                selected_data, annotations, img_dims, image_data, opacity, display_options, group
             )
         
-        # Callback para botones de selección en la lista de anotaciones
+        # La selección múltiple no sobrevive a un cambio de imagen (ni a un redibujado completo)
         @self.app.callback(
-            [Output('selected-annotation', 'data', allow_duplicate=True),
+            Output('selected-annotations', 'data', allow_duplicate=True),
+            Input('current-image-data', 'data'),
+            prevent_initial_call=True
+        )
+        def reset_group_selection(image_data):
+            return []
+        
+        @self.app.callback(
+            [Output('current-annotations', 'data', allow_duplicate=True),
              Output('image-graph', 'figure', allow_duplicate=True),
              Output('notification-toast', 'is_open', allow_duplicate=True),
-             Output('notification-toast', 'children', allow_duplicate=True)],
-            [Input({"type": "select-btn", "index": ALL}, "n_clicks")],
+             Output('notification-toast', 'children', allow_duplicate=True),
+             Output('selected-annotation', 'data', allow_duplicate=True),
+             Output('selected-annotations', 'data', allow_duplicate=True)],
+            [Input('delete-selected-button', 'n_clicks')],
             [State('current-annotations', 'data'),
+             State('selected-annotation', 'data'),
+             State('selected-annotations', 'data'),
              State('current-image-data', 'data'),
              State('opacity-slider', 'value'),
              State('display-options', 'value')],
             prevent_initial_call=True
         )
-        def handle_annotation_selection(select_clicks, annotations, image_data, opacity, display_options):
-            if not any(select_clicks) or not annotations:
-                return dash.no_update, dash.no_update, dash.no_update, dash.no_update
-            
-            # Encontrar qué botón fue presionado
-            triggered_id = ctx.triggered[0]['prop_id']
-            import json
-            button_info = json.loads(triggered_id.split('.')[0])
-            selected_idx = button_info['index']
-            
-            if 0 <= selected_idx < len(annotations):
-                # Regenerar figura con selección resaltada
-                show_ids = 'show_ids' in (display_options or ['show_ids'])
-                show_coords = 'show_coords' in (display_options or [])
-                current_image = image_data.get('filename', self.image_files[self.current_image_index])
-                
-                updated_figure, _ = self.figure_generator.create_figure_with_annotations(
-                    current_image, annotations, opacity, show_ids, show_coords, selected_idx
-                )
-                
-                class_name = annotations[selected_idx].get('class_name', f"Clase {annotations[selected_idx].get('class_id', 0)}")
-                message = f"🎯 Seleccionada desde lista: {class_name} (índice: {selected_idx})"
-                
-                print(f"DEBUG: Selección desde lista - índice {selected_idx}")
-                
-                return selected_idx, updated_figure, True, message
-            
-            return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        def delete_selected_annotation(delete_clicks, annotations, selected_id, group, image_data, opacity, display_options):
+            if delete_clicks and group:
+                # Todo el grupo en un solo guardado y una sola entrada de deshacer
+                return self.callback_manager.handle_delete_group(
+                    annotations, group, image_data, opacity, display_options
+                ) + ([],)
+            return self.callback_manager.handle_delete_selected_annotation(
+                delete_clicks, annotations, selected_id, image_data, opacity, display_options
+            ) + (dash.no_update,)
         
         # Callback para manejar información de anotación seleccionada
         @self.app.callback(
@@ -803,13 +1099,20 @@ class AdvancedAnnotationTool:
             ],
             [
                 Input('selected-annotation', 'data'),
-                Input('current-annotations', 'data')
+                Input('current-annotations', 'data'),
+                Input('selected-annotations', 'data')
             ]
         )
-        def update_selected_info(selected_id, annotations):
+        def update_selected_info(selected_id, annotations, group):
             button_style_disabled = {"font-weight": "bold", "width": "100%", "opacity": "0.6"}
             button_style_enabled = {"font-weight": "bold", "width": "100%", "opacity": "1.0"}
             
+            if group and annotations:
+                classes_in_group = {annotations[i].get('class_id', 0) for i in group if 0 <= i < len(annotations)}
+                class_idx = classes_in_group.pop() if len(classes_in_group) == 1 else 0
+                info_text = f"🔲 SELECCIÓN MÚLTIPLE → {len(group)} cajas | ✅ El cambio de clase se aplica a todas"
+                return info_text, False, False, class_idx, button_style_enabled
+            
             if selected_id is None or not annotations:
                 return "🔍 Haz clic en cualquier bounding box para seleccionar una anotación y cambiar su clase", \
                        True, True, 0, button_style_disabled
@@ -850,13 +1153,23 @@ class AdvancedAnnotationTool:
                 State('image-graph', 'figure'),
                 State('image-dimensions', 'data'),
                 State('opacity-slider', 'value'),
-                State('display-options', 'value')
+                State('display-options', 'value'),
+                State('selected-annotations', 'data'),
+                State('current-image-data', 'data')
             ],
             prevent_initial_call=True
         )
-        def change_selected_class(n_clicks, selected_id, new_class, annotations, figure, dims, opacity, display_options):
+        def change_selected_class(n_clicks, selected_id, new_class, annotations, figure, dims, opacity, display_options,
+                                  group, image_data):
             print(f"DEBUG CLASS CHANGE START: n_clicks={n_clicks}, selected_id={selected_id}, new_class={new_class} (type: {type(new_class)})")
             
+            if n_clicks and group and annotations:
+                # Selección múltiple: un guardado, un deshacer y Patch solo de las cajas del grupo
+                updated, patched, toast_open, message = self.callback_manager.handle_change_class_group(
+                    annotations, group, new_class, dims, image_data, opacity, display_options
+                )
+                return updated, patched, dash.no_update, toast_open, message
+            
             if not n_clicks or selected_id is None or not annotations:
                 print("DEBUG CLASS CHANGE: Condiciones no cumplidas")
                 return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
@@ -866,7 +1179,7 @@ class AdvancedAnnotationTool:
                 updated_annotations = annotations.copy()
                 if 0 <= selected_id < len(updated_annotations):
                     # Obtener el nombre de la imagen actual
-                    current_image = self.image_files[self.current_image_index]
+                    current_image = image_data['filename']
                     
                     # Guardar estado actual antes del cambio
                     self.callback_manager.undo_manager.push_state(
@@ -925,23 +1238,6 @@ class AdvancedAnnotationTool:
             
             return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-        @self.app.callback(
-            [Output('current-annotations', 'data', allow_duplicate=True),
-             Output('image-graph', 'figure', allow_duplicate=True),
-             Output('notification-toast', 'is_open', allow_duplicate=True),
-             Output('notification-toast', 'children', allow_duplicate=True)],
-            [Input({"type": "delete-btn", "index": ALL}, "n_clicks")],
-            [State('current-annotations', 'data'),
-             State('current-image-data', 'data'),
-             State('opacity-slider', 'value'),
-             State('display-options', 'value')],
-            prevent_initial_call=True
-        )
-        def delete_annotation(delete_clicks, annotations, image_data, opacity, display_options):
-            return self.callback_manager.handle_delete_annotation(
-                delete_clicks, annotations, image_data, opacity, display_options
-            )
-        
         @self.app.callback(
             [Output('current-annotations', 'data', allow_duplicate=True),
              Output('image-graph', 'figure', allow_duplicate=True),
@@ -995,6 +1291,315 @@ class AdvancedAnnotationTool:
                 delete_clicks, annotations, delete_id, image_data, opacity, display_options
             )
     
+    def _setup_suggestion_callbacks(self):
+        """Configurar callbacks de pre-anotación asistida por modelo"""
+        @self.app.callback(
+            [Output('image-graph', 'figure', allow_duplicate=True),
+             Output('notification-toast', 'is_open', allow_duplicate=True),
+             Output('notification-toast', 'children', allow_duplicate=True)],
+            [Input('suggest-button', 'n_clicks')],
+            [State('current-annotations', 'data'),
+             State('current-image-data', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value')],
+            prevent_initial_call=True
+        )
+        def suggest_boxes(suggest_clicks, annotations, image_data, opacity, display_options):
+            return self.callback_manager.handle_suggest_boxes(
+                suggest_clicks, annotations, image_data, opacity, display_options
+            )
+        
+        @self.app.callback(
+            [Output('current-annotations', 'data', allow_duplicate=True),
+             Output('image-graph', 'figure', allow_duplicate=True),
+             Output('notification-toast', 'is_open', allow_duplicate=True),
+             Output('notification-toast', 'children', allow_duplicate=True)],
+            [Input('accept-suggestions-button', 'n_clicks'),
+             Input('reject-suggestions-button', 'n_clicks'),
+             Input('image-graph', 'clickData')],
+            [State('current-annotations', 'data'),
+             State('current-image-data', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value')],
+            prevent_initial_call=True
+        )
+        def resolve_suggestions(accept_clicks, reject_clicks, click_data, annotations, image_data,
+                                opacity, display_options):
+            trigger = ctx.triggered_id
+            if trigger == 'accept-suggestions-button' and accept_clicks:
+                accept_indices = None
+            elif trigger == 'reject-suggestions-button' and reject_clicks:
+                accept_indices = []
+            elif trigger == 'image-graph' and click_data:
+                customdata = click_data['points'][0].get('customdata')
+                if not customdata or customdata[0] != 'suggestion':
+                    return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+                accept_indices = [int(customdata[1])]
+            else:
+                return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+            
+            return self.callback_manager.handle_resolve_suggestions(
+                accept_indices, annotations, image_data, opacity, display_options
+            )
+    
+    def _setup_propagation_callbacks(self):
+        """Configurar callbacks de propagación de cajas entre frames"""
+        @self.app.callback(
+            [Output('current-annotations', 'data', allow_duplicate=True),
+             Output('image-graph', 'figure', allow_duplicate=True),
+             Output('notification-toast', 'is_open', allow_duplicate=True),
+             Output('notification-toast', 'children', allow_duplicate=True)],
+            [Input('propagate-button', 'n_clicks')],
+            [State('current-annotations', 'data'),
+             State('current-image-data', 'data'),
+             State('opacity-slider', 'value'),
+             State('display-options', 'value')],
+            prevent_initial_call=True
+        )
+        def propagate_previous(propagate_clicks, annotations, image_data, opacity, display_options):
+            index = self._client_index(image_data)
+            prev_filename = self.image_files[index - 1] if index > 0 else None
+            return self.callback_manager.handle_propagate_previous(
+                propagate_clicks, prev_filename, annotations, image_data, opacity, display_options
+            )
+        
+        @self.app.callback(
+            [Output('propagate-interval', 'disabled'),
+             Output('propagate-status', 'children')],
+            [Input('propagate-range-button', 'n_clicks')],
+            [State('propagate-count', 'value'),
+             State('current-image-data', 'data')],
+            prevent_initial_call=True
+        )
+        def start_propagation_job(range_clicks, count, image_data):
+            if not range_clicks:
+                return dash.no_update, dash.no_update
+            if self.propagation_job is not None and self.propagation_job.progress['running']:
+                return False, "⏳ Ya hay una propagación en curso"
+            
+            count = int(count or 0)
+            if count <= 0:
+                return True, "⚠️ Indica cuántos frames propagar"
+            index = self._client_index(image_data)
+            self.propagation_job = PropagationJob(
+                self.box_propagator, self.annotation_manager, self.image_files, index, index + count
+            ).start()
+            return False, f"⏳ Propagando a {self.propagation_job.progress['total']} frames..."
+        
+        @self.app.callback(
+            [Output('propagate-interval', 'disabled', allow_duplicate=True),
+             Output('propagate-status', 'children', allow_duplicate=True)],
+            [Input('propagate-interval', 'n_intervals')],
+            prevent_initial_call=True
+        )
+        def poll_propagation_job(n_intervals):
+            job = self.propagation_job
+            if job is None:
+                return True, ""
+            progress = job.progress
+            if progress['running']:
+                return False, f"⏳ {progress['done']}/{progress['total']} frames"
+            if progress['error']:
+                return True, f"❌ Propagación detenida: {progress['error']}"
+            message = (f"✅ Propagación terminada: {progress['written']} frames escritos, "
+                       f"{progress['kept']} ya anotados (usados como ancla)")
+            if progress['journal']:
+                message += f" · diario: {os.path.basename(progress['journal'])}"
+            return True, message
+    
+    def _setup_review_callbacks(self):
+        """Configurar callbacks de la cola de revisión"""
+        @self.app.callback(
+            [Output('review-interval', 'disabled'),
+             Output('review-status', 'children')],
+            [Input('review-order-switch', 'value')],
+            prevent_initial_call=True
+        )
+        def toggle_review_order(enabled):
+            if not enabled:
+                self.review_order = None
+                self.review_position = {}
+                return True, "Orden por nombre de archivo"
+            if self.review_queue.load_cached():
+                return True, self._apply_review_order()
+            if not self.review_queue.progress['running']:
+                self.review_queue.start()
+            return False, "⏳ Calculando prioridades..."
+        
+        @self.app.callback(
+            [Output('review-interval', 'disabled', allow_duplicate=True),
+             Output('review-status', 'children', allow_duplicate=True)],
+            [Input('review-interval', 'n_intervals')],
+            [State('review-order-switch', 'value')],
+            prevent_initial_call=True
+        )
+        def poll_review_queue(n_intervals, enabled):
+            progress = self.review_queue.progress
+            if progress['running']:
+                detail = f" ({progress['done']}/{progress['total']})" if progress['total'] else ""
+                return False, f"⏳ Calculando prioridades: {progress['stage']}{detail}"
+            if progress['error']:
+                return True, f"❌ {progress['error']}"
+            if not enabled:
+                return True, dash.no_update
+            return True, self._apply_review_order()
+    
+    def _navigation_sequence(self):
+        """Índices de imagen en el orden de navegación actual (nombre o prioridad de revisión)"""
+        return self.review_order or range(len(self.image_files))
+    
+    def _create_grid_page(self, page, current_index):
+        """Miniaturas de una página de la cuadrícula (las imágenes las sirve la ruta /thumbnails)"""
+        sequence = self._navigation_sequence()
+        start = page * self.GRID_PAGE_SIZE
+        tiles = []
+        for index in sequence[start:start + self.GRID_PAGE_SIZE]:
+            image_file = self.image_files[index]
+            is_current = index == current_index
+            tiles.append(html.Div([
+                html.Img(src=f"/thumbnails/{quote(image_file)}?v={self.thumbnail_cache.version(image_file)}",
+                         alt=image_file, style={"width": "100%", "display": "block"}),
+                html.Small(image_file, className="d-block text-truncate", style={"font-size": "0.7rem"})
+            ], id={'type': 'grid-thumb', 'index': index}, n_clicks=0, style={
+                "cursor": "pointer", "padding": "2px", "border-radius": "4px",
+                "border": "3px solid #2563eb" if is_current else "1px solid #e5e7eb"
+            }))
+        num_pages = max(1, -(-len(sequence) // self.GRID_PAGE_SIZE))
+        return tiles, f"Página {page + 1} de {num_pages}"
+    
+    def _setup_grid_callbacks(self):
+        """Configurar callbacks de la vista de cuadrícula"""
+        @self.app.callback(
+            [Output('grid-modal', 'is_open'),
+             Output('grid-page', 'data'),
+             Output('grid-interval', 'disabled')],
+            [Input('grid-button', 'n_clicks'),
+             Input('grid-prev-page', 'n_clicks'),
+             Input('grid-next-page', 'n_clicks')],
+            [State('grid-modal', 'is_open'),
+             State('grid-page', 'data'),
+             State('current-image-data', 'data')],
+            prevent_initial_call=True
+        )
+        def open_or_page_grid(grid_clicks, prev_clicks, next_clicks, is_open, page, image_data):
+            num_pages = max(1, -(-len(self._navigation_sequence()) // self.GRID_PAGE_SIZE))
+            if ctx.triggered_id == 'grid-button':
+                if is_open:
+                    return False, no_update, True
+                # Abrir en la página del frame actual y completar la caché en segundo plano
+                sequence = list(self._navigation_sequence())
+                current_index = self._client_index(image_data)
+                position = sequence.index(current_index) if current_index in sequence else 0
+                self.thumbnail_cache.start()
+                return True, position // self.GRID_PAGE_SIZE, False
+            step = -1 if ctx.triggered_id == 'grid-prev-page' else 1
+            return no_update, max(0, min((page or 0) + step, num_pages - 1)), no_update
+        
+        @self.app.callback(
+            [Output('grid-container', 'children'),
+             Output('grid-page-label', 'children')],
+            [Input('grid-page', 'data'),
+             Input('grid-modal', 'is_open')],
+            [State('current-image-data', 'data')],
+            prevent_initial_call=True
+        )
+        def render_grid_page(page, is_open, image_data):
+            if not is_open:
+                return [], ""
+            return self._create_grid_page(page or 0, self._client_index(image_data))
+        
+        @self.app.callback(
+            [Output('goto-index', 'data'),
+             Output('grid-modal', 'is_open', allow_duplicate=True),
+             Output('grid-interval', 'disabled', allow_duplicate=True)],
+            [Input({'type': 'grid-thumb', 'index': ALL}, 'n_clicks')],
+            prevent_initial_call=True
+        )
+        def open_grid_thumbnail(clicks):
+            if not ctx.triggered_id or not ctx.triggered[0]['value']:
+                return no_update, no_update, no_update
+            return ctx.triggered_id['index'], False, True
+        
+        @self.app.callback(
+            Output('grid-status', 'children'),
+            [Input('grid-interval', 'n_intervals')],
+            prevent_initial_call=True
+        )
+        def poll_thumbnail_cache(n_intervals):
+            progress = self.thumbnail_cache.progress
+            if progress['error']:
+                return f"❌ Miniaturas: {progress['error']}"
+            if progress['running'] and progress['total']:
+                return f"⏳ Generando miniaturas en segundo plano: {progress['done']}/{progress['total']}"
+            return f"🖼️ {len(self.image_files)} frames"
+    
+    @staticmethod
+    def _is_viewport_change(relayout_data):
+        """relayoutData de zoom/desplazamiento (sin cambios en las shapes)"""
+        return bool(relayout_data) and all(
+            key.startswith(('xaxis.', 'yaxis.')) or key in ('autosize', 'dragmode') for key in relayout_data
+        )
+    
+    def _setup_tile_callbacks(self):
+        """Configurar el callback que pide las teselas del área visible al hacer zoom"""
+        @self.app.callback(
+            Output('image-graph', 'figure', allow_duplicate=True),
+            [Input('image-graph', 'relayoutData')],
+            [State('current-image-data', 'data'),
+             State('image-dimensions', 'data')],
+            prevent_initial_call=True
+        )
+        def update_visible_tiles(relayout_data, image_data, img_dims):
+            if not self._is_viewport_change(relayout_data) or not image_data or not img_dims:
+                return no_update
+            width, height = img_dims.get('width'), img_dims.get('height')
+            if not width or not height or not self.figure_generator.is_tiled(width, height):
+                return no_update
+            
+            image_filename = image_data['filename']
+            if relayout_data.get('xaxis.autorange') or relayout_data.get('yaxis.autorange'):
+                self.figure_generator.set_viewport(image_filename, None, None)
+            elif 'xaxis.range[0]' in relayout_data and 'yaxis.range[0]' in relayout_data:
+                self.figure_generator.set_viewport(
+                    image_filename,
+                    (relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']),
+                    (relayout_data['yaxis.range[0]'], relayout_data['yaxis.range[1]'])
+                )
+            else:
+                return no_update
+            
+            # Patch: solo viajan las imágenes de fondo, no las shapes ni la figura completa
+            patched = Patch()
+            patched['layout']['images'] = self.figure_generator.background_images(image_filename, width, height)
+            return patched
+    
+    def _setup_routes(self):
+        """Rutas Flask adicionales (miniaturas servidas como archivos, fuera de los callbacks)"""
+        @self.app.server.route('/thumbnails/<path:image_file>')
+        def serve_thumbnail(image_file):
+            if os.path.basename(image_file) != image_file:
+                abort(404)
+            path = self.thumbnail_cache.thumbnail_path(image_file)
+            if path is None:
+                abort(404)
+            # La URL lleva la versión de la etiqueta: el navegador puede cachear sin revalidar
+            return send_file(path, mimetype="image/webp", max_age=86400)
+        
+        @self.app.server.route('/tiles/<image_file>/overview.webp')
+        def serve_overview(image_file):
+            if not os.path.isfile(os.path.join(self.images_path, image_file)):
+                abort(404)
+            return send_file(self.tile_pyramid.overview_path(image_file), mimetype="image/webp", max_age=86400)
+        
+        @self.app.server.route('/tiles/<image_file>/<int:level>/<int:tile_x>_<int:tile_y>.webp')
+        def serve_tile(image_file, level, tile_x, tile_y):
+            if not os.path.isfile(os.path.join(self.images_path, image_file)):
+                abort(404)
+            path = self.tile_pyramid.tile_path(image_file, level, tile_x, tile_y)
+            if path is None:
+                abort(404)
+            return send_file(path, mimetype="image/webp", max_age=86400)
+    
     def _setup_utility_callbacks(self):
         """Configurar callbacks de utilidades"""
         @self.app.callback(
@@ -1005,57 +1610,43 @@ class AdvancedAnnotationTool:
             return self._update_statistics(annotations)
     
     # Métodos de implementación de callbacks
-    def _handle_navigation_and_display(self, next_clicks, prev_clicks, first_clicks, last_clicks, 
-                                     reload_clicks, opacity, display_options, current_annotations):
-        """Implementar navegación y actualización de display"""
-        image_changed = False
-        
+    def _handle_navigation(self, next_clicks, prev_clicks, first_clicks, last_clicks,
+                           reload_clicks, opacity, display_options, goto_index=None, image_data=None):
+        """Cambiar de imagen y cargar sus etiquetas (metadatos y parseo memoizados)"""
+        if not self.image_files:
+            # Listado todavía en curso (o fallido): poll_dataset_scan muestra el estado
+            return dash.no_update, dash.no_update, "⏳ Listando imágenes del dataset...", dash.no_update, dash.no_update
+        # Cada pestaña navega por su cuenta: el punto de partida es la imagen que ese cliente tiene cargada
+        current_index = self._client_index(image_data)
         if ctx.triggered:
             button_id = ctx.triggered[0]['prop_id'].split('.')[0]
+            new_index = current_index
             if button_id == 'next-button' and next_clicks:
-                new_index = min(self.current_image_index + 1, len(self.image_files) - 1)
-                image_changed = new_index != self.current_image_index
-                self.current_image_index = new_index
+                new_index = self._step_index(1, current_index)
             elif button_id == 'prev-button' and prev_clicks:
-                new_index = max(self.current_image_index - 1, 0)
-                image_changed = new_index != self.current_image_index
-                self.current_image_index = new_index
+                new_index = self._step_index(-1, current_index)
             elif button_id == 'first-button' and first_clicks:
-                image_changed = self.current_image_index != 0
-                self.current_image_index = 0
+                new_index = self.review_order[0] if self.review_order else 0
             elif button_id == 'last-button' and last_clicks:
-                new_index = len(self.image_files) - 1
-                image_changed = self.current_image_index != new_index
-                self.current_image_index = new_index
-            elif button_id == 'reload-button':
-                image_changed = True  # Forzar recarga
-            elif button_id in ['opacity-slider', 'display-options']:
-                # Solo actualizar display - NO cambiar imagen
-                current_image = self.image_files[self.current_image_index]
-                show_ids = 'show_ids' in (display_options or [])
-                show_coords = 'show_coords' in (display_options or [])
-                
-                fig, img_dims = self.figure_generator.create_figure_with_annotations(
-                    current_image, current_annotations or [], opacity, show_ids, show_coords
-                )
-                
-                counter_text = f"Imagen {self.current_image_index + 1} de {len(self.image_files)}: {current_image}"
-                badge_text = f"{len(current_annotations or [])} anotaciones"
-                
-                return fig, current_annotations, counter_text, img_dims, {'filename': current_image}, badge_text
-        else:
-            # Primera carga
-            image_changed = True
+                new_index = self.review_order[-1] if self.review_order else len(self.image_files) - 1
+            elif button_id == 'goto-index' and goto_index is not None:
+                new_index = max(0, min(int(goto_index), len(self.image_files) - 1))
+            
+            # Sin cambio de imagen (p. ej. 'siguiente' en el último frame) no se envía nada; recargar sí
+            if new_index == current_index and button_id not in ('reload-button', 'dataset-ready'):
+                return (dash.no_update,) * 5
+            current_index = new_index
         
-        current_image = self.image_files[self.current_image_index]
-        
-        # Solo cargar desde archivo si la imagen cambió
-        if image_changed:
-            print(f"DEBUG: Cambiando a imagen: {current_image}")
-            annotations = self.annotation_manager.load_annotations(current_image)
-        else:
-            # Mantener anotaciones actuales si solo cambió la visualización
-            annotations = current_annotations or []
+        current_image = self.image_files[current_index]
+        annotations = self.annotation_manager.load_annotations(current_image)
+        if self.suggestion_service is not None:
+            # Calcular en segundo plano las sugerencias de los próximos frames
+            upcoming = [self.image_files[self._step_index(k, current_index)]
+                        for k in range(1, self.suggestion_prefetch + 1)]
+            self.suggestion_service.prefetch([f for f in upcoming if f != current_image])
+        # Leer en segundo plano imagen y etiquetas de los frames vecinos: la próxima navegación sale de caché
+        neighbours = [self.image_files[self._step_index(k, current_index)] for k in (1, 2, -1)]
+        self.io_executor.prefetch([f for f in dict.fromkeys(neighbours) if f != current_image])
         
         show_ids = 'show_ids' in (display_options or ['show_ids'])
         show_coords = 'show_coords' in (display_options or [])
@@ -1064,80 +1655,70 @@ class AdvancedAnnotationTool:
             current_image, annotations, opacity, show_ids, show_coords
         )
         
-        counter_text = f"Imagen {self.current_image_index + 1} de {len(self.image_files)}: {current_image}"
-        badge_text = f"{len(annotations)} anotaciones"
+        counter_text = f"Imagen {current_index + 1} de {len(self.image_files)}: {current_image}"
+        if self.review_order:
+            counter_text += f" • Prioridad {self.review_position.get(current_index, 0) + 1}"
         
-        return fig, annotations, counter_text, img_dims, {'filename': current_image}, badge_text
+        # La versión de la etiqueta permite al servidor detectar conflictos en los lotes del navegador
+        image_data = {'filename': current_image, 'version': self.annotation_manager.label_version(current_image)}
+        return fig, annotations, counter_text, img_dims, image_data
     
-    def _update_annotations_list(self, annotations):
-        """Actualizar lista de anotaciones"""
-        if not annotations:
-            return [dbc.Alert([
-                html.Div([
-                    html.I(className="fas fa-inbox fa-2x mb-2", style={"color": "#94a3b8"}),
-                    html.H6("No hay anotaciones", className="mb-1"),
-                    html.Small("Dibuja un rectángulo para crear una nueva", className="text-muted")
-                ], className="text-center")
-            ], color="light", className="border-0 bg-light")]
-        
-        items = []
-        for idx, ann in enumerate(annotations):
-            # Color de borde más suave
-            border_color = self.class_colors[ann['class_id'] % len(self.class_colors)]
-            
-            items.append(
-                dbc.Card([
-                    dbc.CardBody([
-                        dbc.Row([
-                            dbc.Col([
-                                html.Div([
-                                    html.I(className="fas fa-tag me-2", 
-                                          style={"color": border_color, "font-size": "0.9rem"}),
-                                    html.Span(ann['class_name'], className="fw-semibold text-dark")
-                                ], className="d-flex align-items-center mb-1"),
-                                html.Small(f"ID: {idx}", className="text-muted", style={"font-size": "0.75rem"}),
-                            ], width=6),
-                            dbc.Col([
-                                dbc.ButtonGroup([
-                                    dbc.Button([
-                                        html.I(className="fas fa-crosshairs")
-                                    ], id={"type": "select-btn", "index": idx}, 
-                                     size="sm", color="warning", outline=True, 
-                                     title="Seleccionar para cambiar clase"),
-                                    dbc.Button([
-                                        html.I(className="fas fa-trash")
-                                    ], id={"type": "delete-btn", "index": ann.get('id', idx)}, 
-                                     size="sm", color="danger", outline=True, 
-                                     title="Eliminar")
-                                ], size="sm")
-                            ], width=6, className="text-end")
-                        ]),
-                        html.Hr(className="my-2 border-light"),
-                        html.Div([
-                            html.Small([
-                                html.I(className="fas fa-crosshairs me-1", style={"color": "#6b7280"}),
-                                f"Centro: ({ann['x_center']:.3f}, {ann['y_center']:.3f})"
-                            ], className="d-block text-muted mb-1", style={"font-size": "0.75rem"}),
-                            html.Small([
-                                html.I(className="fas fa-expand-arrows-alt me-1", style={"color": "#6b7280"}),
-                                f"Tamaño: {ann['width']:.3f} × {ann['height']:.3f}"
-                            ], className="d-block text-muted mb-2", style={"font-size": "0.75rem"}),
-                            dbc.Alert([
-                                html.I(className="fas fa-info-circle me-1"),
-                                html.Small("Haz clic en 🎯 para seleccionar • Arrastra bordes para redimensionar")
-                            ], color="info", className="py-1 mb-0 border-0", 
-                               style={"background-color": "#e7f3ff", "font-size": "0.7rem"})
-                        ])
-                    ], className="p-3")
-                ], className="mb-3 border-0 shadow-sm", 
-                   style={
-                       "border-left": f"4px solid {border_color} !important", 
-                       "border-radius": "8px",
-                       "background": "white"
-                   })
-            )
+    def _step_index(self, step, current_index):
+        """Índice del frame a 'step' posiciones de 'current_index', en orden por nombre o por prioridad de revisión"""
+        if not self.review_order:
+            return max(0, min(current_index + step, len(self.image_files) - 1))
+        position = self.review_position.get(current_index, -1)
+        position = max(0, min(position + step, len(self.review_order) - 1))
+        return self.review_order[position]
+    
+    def _apply_review_order(self):
+        """Usar el ranking de la cola de revisión para navegar"""
+        index_of = {name: i for i, name in enumerate(self.image_files)}
+        self.review_order = [index_of[name] for name in self.review_queue.order() if name in index_of]
+        self.review_position = {index: pos for pos, index in enumerate(self.review_order)}
+        return f"🧭 Navegando por prioridad: {len(self.review_order)} frames (peores primero)"
+    
+    @staticmethod
+    def _annotation_row(idx, ann):
+        """Fila compacta de la tabla de anotaciones ('id' = índice, lo que devuelve active_cell['row_id'])"""
+        return {
+            'id': idx,
+            'idx': idx,
+            'class_id': ann['class_id'],
+            'class_name': ann['class_name'],
+            'center': f"{ann['x_center']:.3f}, {ann['y_center']:.3f}",
+            'size': f"{ann['width']:.3f} × {ann['height']:.3f}",
+            'select': "🎯",
+            'delete': "🗑️",
+        }
+    
+    def _annotation_table_styles(self, selected=None):
+        """Color por clase en la columna de clase y resaltado de las filas seleccionadas"""
+        styles = [{'if': {'filter_query': f'{{class_id}} = {class_id}', 'column_id': 'class_name'},
+                   'color': self.class_colors[class_id % len(self.class_colors)], 'fontWeight': '600'}
+                  for class_id in range(len(self.classes))]
+        for idx in selected or []:
+            styles.append({'if': {'filter_query': f'{{idx}} = {idx}'}, 'backgroundColor': '#fef9c3'})
+        return styles
+    
+    def _update_annotations_list(self, annotations, previous_rows=None):
+        """Actualizar la tabla de anotaciones enviando solo las filas que cambiaron"""
+        annotations = annotations or []
+        empty_style = {'display': 'block'} if not annotations else {'display': 'none'}
+        rows = [self._annotation_row(idx, ann) for idx, ann in enumerate(annotations)]
+        previous_rows = previous_rows or []
+        if not previous_rows:
+            return rows, empty_style
         
-        return items
+        patched = Patch()
+        for idx, row in enumerate(rows[:len(previous_rows)]):
+            if row != previous_rows[idx]:
+                patched[idx] = row
+        if len(rows) > len(previous_rows):
+            patched.extend(rows[len(previous_rows):])
+        for idx in reversed(range(len(rows), len(previous_rows))):
+            del patched[idx]
+        return patched, empty_style
     
     def _update_statistics(self, annotations):
         """Actualizar estadísticas"""
@@ -1180,7 +1761,10 @@ class AdvancedAnnotationTool:
         print("🚀 Iniciando Herramienta Avanzada de Corrección de Etiquetado...")
         print(f"📁 Dataset: {self.dataset_path}")
         print(f"📄 Archivo YAML de clases: {self.config_loader.config_path}")
-        print(f"🖼️ Imágenes encontradas: {len(self.image_files)}")
+        if self.scan_done.is_set():
+            print(f"🖼️ Imágenes encontradas: {len(self.image_files)}")
+        else:
+            print("🖼️ Listando imágenes en segundo plano...")
         print(f"🏷️ Clases disponibles ({len(self.classes)}): {', '.join(self.classes)}")
         print(f"🎨 Colores personalizados: {'✅ Sí' if len(self.class_colors) == len(self.classes) else '❌ Por defecto'}")
         print(f"🌐 Servidor iniciando en: http://{host}:{port}")
@@ -1193,9 +1777,15 @@ class AdvancedAnnotationTool:
         print("• 💾 GUARDADO: Automático al crear, editar o eliminar")
         print("• 🎨 PERSONALIZACIÓN: Clases y colores desde YAML")
         print("• 📊 ESTADÍSTICAS: Conteo por clase y área promedio")
+        if self.suggestion_service is not None:
+            print("• 💡 PRE-ANOTACIÓN: S=Sugerir cajas, clic en el punto central para aceptar")
+        print("• ⏩ PROPAGACIÓN: P=Traer cajas del frame anterior, ⏭ para propagar N frames")
+        print("• 🧭 REVISIÓN: Orden por prioridad (incertidumbre, desacuerdo, conteo anómalo)")
+        print("• 🗂️ CUADRÍCULA: G=Vista de miniaturas paginada con las cajas dibujadas")
         print("="*60)
+        print("ℹ️ Servidor de desarrollo de Dash; en producción: gunicorn -c gunicorn.conf.py wsgi:server")
         
-        self.app.run(debug=debug, port=port, host=host)
+        self.app.run(debug=debug, port=port, host=host, threaded=True)
 
 
 if __name__ == "__main__":
@@ -1207,11 +1797,39 @@ if __name__ == "__main__":
         default="dataset_cruce_3",
         help="Ruta del dataset a usar (ej: dataset_cruce_3)"
     )
+    parser.add_argument(
+        "--detector",
+        type=str,
+        default=None,
+        help="Detector para sugerir cajas: 'stub', pesos YOLO (.pt) o modelo ONNX (.onnx)"
+    )
+    parser.add_argument(
+        "--detector-conf",
+        type=float,
+        default=0.25,
+        help="Confianza mínima de las sugerencias del detector"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interfaz donde escuchar")
+    parser.add_argument("--port", type=int, default=8050, help="Puerto del servidor")
+    parser.add_argument("--io-workers", type=int, default=4,
+                        help="Hilos para precargar imágenes y etiquetas de los frames vecinos")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Informar del tiempo de imports y de cada etapa de inicialización")
     args = parser.parse_args()
 
     try:
-        tool = AdvancedAnnotationTool(dataset_path=args.dataset)
-        tool.run(debug=False, port=8050)
+        profiler = StartupProfiler(enabled=args.profile_startup)
+        tool = AdvancedAnnotationTool(
+            dataset_path=args.dataset,
+            detector=build_detector(args.detector, confidence=args.detector_conf),
+            detector_name=args.detector or "",
+            io_workers=args.io_workers,
+            profiler=profiler
+        )
+        # Sin esperar al listado de imágenes: se mide lo que tarda el servidor en contestar la página
+        probe_host = "127.0.0.1" if args.host in ("0.0.0.0", "") else args.host
+        profiler.report_on_first_response(f"http://{probe_host}:{args.port}/", "advanced_annotation_tool_modular")
+        tool.run(debug=False, port=args.port, host=args.host)
     except Exception as e:
         print(f"❌ Error iniciando la aplicación: {e}")
         print("💡 Asegúrate de que:")
@@ -0,0 +1,18 @@
+"""
+Punto de entrada ASGI del editor
+
+    ANNOTATION_DATASET=dataset_cruce_3 uvicorn asgi:application --host 0.0.0.0 --port 8050
+
+Dash es una aplicación WSGI (Flask): se adapta con a2wsgi si está instalado o con el middleware WSGI de
+uvicorn. Cada petición se atiende en un hilo del adaptador, igual que con gunicorn en modo gthread.
+"""
+import os
+
+from wsgi import server
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+
+application = WSGIMiddleware(server, workers=int(os.environ.get("ANNOTATION_THREADS", "8")))
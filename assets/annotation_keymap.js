@@ -0,0 +1,378 @@
+// Atajos de teclado del editor.
+// Los cambios de la caja seleccionada (clase, mover, redimensionar, Tab) se dibujan al momento en el
+// navegador con Plotly.react (no genera relayoutData) y se anotan en un registro local ('edit-log',
+// guardado en localStorage) que se sincroniza con el servidor lote a lote, con número de secuencia.
+// Si el servidor no responde, el registro sobrevive a recargas y se reenvía al recuperar la conexión.
+(function () {
+    const FLUSH_DELAY_MS = 400;
+    const RETRY_MS = 5000;
+    const state = window.annotationKeymap = window.annotationKeymap || {
+        config: {classes: [], colors: []},
+        selected: null,
+        annotations: [],
+        opacity: 0.3,
+        display: ['show_ids'],
+        filename: null,
+        dims: null,
+        pending: null,
+        timer: null,
+        afterFlush: null,
+        // Registro de lotes sin confirmar: {seq: último número usado, entries: [{seq, filename, base, edits}]}
+        log: {seq: 0, entries: []},
+        // Versión (hash) de la etiqueta de cada imagen según la última respuesta del servidor
+        versions: {},
+        imageVersion: null,
+        inflight: null,
+        retry: null
+    };
+
+    function noUpdate() {
+        return window.dash_clientside.no_update;
+    }
+
+    function graphDiv() {
+        return document.querySelector('#image-graph .js-plotly-plot');
+    }
+
+    function clickButton(id) {
+        const button = document.getElementById(id);
+        if (button && !button.disabled) {
+            button.click();
+        }
+    }
+
+    function hasPending() {
+        return state.pending !== null && Object.keys(state.pending.edits).length > 0;
+    }
+
+    function persist() {
+        window.dash_clientside.set_props('edit-log', {data: state.log});
+    }
+
+    // Enviar el lote más antiguo sin confirmar (uno cada vez, en orden); se reintenta si no llega respuesta
+    function send() {
+        if (state.inflight !== null || !state.log.entries.length) {
+            return;
+        }
+        const entry = state.log.entries[0];
+        state.inflight = entry.seq;
+        window.dash_clientside.set_props('keyboard-edits', {data: Object.assign({sent: Date.now()}, entry)});
+        clearTimeout(state.retry);
+        state.retry = setTimeout(function () {
+            console.warn('Sin respuesta del servidor; reenviando lote ' + entry.seq);
+            state.inflight = null;
+            send();
+        }, RETRY_MS);
+    }
+
+    function flush() {
+        clearTimeout(state.timer);
+        state.timer = null;
+        if (!hasPending()) {
+            return false;
+        }
+        const seq = state.log.seq + 1;
+        const entry = {
+            seq: seq,
+            filename: state.pending.filename,
+            base: state.versions[state.pending.filename] || null,
+            edits: state.pending.edits
+        };
+        state.log = {seq: seq, entries: state.log.entries.concat([entry])};
+        state.pending = null;
+        persist();
+        send();
+        return true;
+    }
+
+    // Acciones del servidor que leen las anotaciones: esperar a que el registro se haya sincronizado
+    function clickAfterFlush(id) {
+        flush();
+        if (state.log.entries.length) {
+            state.afterFlush = id;
+        } else {
+            clickButton(id);
+        }
+    }
+
+    function queueEdit(index, values) {
+        if (state.pending === null || state.pending.filename !== state.filename) {
+            flush();
+            state.pending = {filename: state.filename, edits: {}};
+        }
+        state.pending.edits[index] = Object.assign(state.pending.edits[index] || {}, values);
+        clearTimeout(state.timer);
+        state.timer = setTimeout(flush, FLUSH_DELAY_MS);
+    }
+
+    function classOf(index) {
+        const pending = state.pending && state.pending.edits[index];
+        if (pending && pending.class_id !== undefined) {
+            return pending.class_id;
+        }
+        const annotation = state.annotations[index];
+        return annotation ? annotation.class_id : 0;
+    }
+
+    function classColor(classId) {
+        const colors = state.config.colors;
+        return colors.length ? colors[classId % colors.length] : '#00d4aa';
+    }
+
+    function rgba(hex, alpha) {
+        const value = hex.replace('#', '');
+        const channels = [0, 2, 4].map(function (i) { return parseInt(value.substr(i, 2), 16); });
+        return 'rgba(' + channels.join(',') + ',' + alpha + ')';
+    }
+
+    // Mismo estilo que FigureGenerator.shape_for
+    function styleShape(shape, index) {
+        const opacity = state.opacity === undefined || state.opacity === null ? 0.3 : state.opacity;
+        if (index === state.selected) {
+            shape.line = Object.assign({}, shape.line, {color: '#ffff00', width: 5});
+            shape.fillcolor = 'rgba(255,255,0,' + Math.min(opacity + 0.3, 1.0) + ')';
+        } else {
+            const color = classColor(classOf(index));
+            shape.line = Object.assign({}, shape.line, {color: color, width: 3});
+            shape.fillcolor = rgba(color, opacity);
+        }
+    }
+
+    // Mismo texto y posición que FigureGenerator.label_for
+    function updateLabel(layout, index, shape) {
+        if (!layout.annotations || layout.annotations.length !== layout.shapes.length) {
+            return;
+        }
+        const classId = classOf(index);
+        const color = classColor(classId);
+        const parts = [];
+        if (state.display.indexOf('show_ids') >= 0) {
+            parts.push('ID:' + index);
+        }
+        parts.push(state.config.classes[classId] || ('Clase ' + classId));
+        if (state.display.indexOf('show_coords') >= 0 && state.dims) {
+            const xCenter = (shape.x0 + shape.x1) / 2 / state.dims.width;
+            const yCenter = (state.dims.height - (shape.y0 + shape.y1) / 2) / state.dims.height;
+            parts.push('(' + xCenter.toFixed(3) + ',' + yCenter.toFixed(3) + ')');
+        }
+        layout.annotations[index] = Object.assign({}, layout.annotations[index], {
+            x: shape.x0, y: shape.y1, text: parts.join(' | '), bgcolor: color, bordercolor: color
+        });
+    }
+
+    // Redibujar en el navegador: copias de shapes/etiquetas/trazas y Plotly.react
+    function redraw(gd, indices, coords) {
+        const layout = Object.assign({}, gd.layout);
+        layout.shapes = (gd.layout.shapes || []).slice();
+        layout.annotations = (gd.layout.annotations || []).slice();
+        const data = gd.data.slice();
+        const centers = data.length ? Object.assign({}, data[0]) : null;
+        if (centers) {
+            centers.x = (centers.x || []).slice();
+            centers.y = (centers.y || []).slice();
+            centers.marker = Object.assign({}, centers.marker);
+            if (Array.isArray(centers.marker.color)) {
+                centers.marker.color = centers.marker.color.slice();
+            }
+            data[0] = centers;
+        }
+        indices.forEach(function (index) {
+            if (index === null || index === undefined || !layout.shapes[index]) {
+                return;
+            }
+            const shape = Object.assign({}, layout.shapes[index], coords && coords[index]);
+            styleShape(shape, index);
+            layout.shapes[index] = shape;
+            updateLabel(layout, index, shape);
+            if (centers && index < centers.x.length) {
+                centers.x[index] = (shape.x0 + shape.x1) / 2;
+                centers.y[index] = (shape.y0 + shape.y1) / 2;
+                if (Array.isArray(centers.marker.color)) {
+                    centers.marker.color[index] = classColor(classOf(index));
+                }
+            }
+        });
+        window.Plotly.react(gd, data, layout);
+    }
+
+    function setClass(classId) {
+        const gd = graphDiv();
+        if (!gd || state.selected === null || classId >= state.config.classes.length) {
+            return false;
+        }
+        queueEdit(state.selected, {class_id: classId});
+        redraw(gd, [state.selected]);
+        return true;
+    }
+
+    // Flechas: mover 1 px (10 px con Shift); con Alt se mueve el borde derecho/superior (redimensionar)
+    function nudge(dx, dy, resize) {
+        const gd = graphDiv();
+        const index = state.selected;
+        if (!gd || index === null || !gd.layout.shapes || !gd.layout.shapes[index] || !state.dims) {
+            return false;
+        }
+        const shape = gd.layout.shapes[index];
+        let x0 = Math.min(shape.x0, shape.x1), x1 = Math.max(shape.x0, shape.x1);
+        let y0 = Math.min(shape.y0, shape.y1), y1 = Math.max(shape.y0, shape.y1);
+        if (resize) {
+            x1 = Math.min(Math.max(x1 + dx, x0 + 1), state.dims.width);
+            y1 = Math.min(Math.max(y1 + dy, y0 + 1), state.dims.height);
+        } else {
+            dx = Math.min(Math.max(dx, -x0), state.dims.width - x1);
+            dy = Math.min(Math.max(dy, -y0), state.dims.height - y1);
+            x0 += dx; x1 += dx; y0 += dy; y1 += dy;
+        }
+        const coords = {x0: x0, y0: y0, x1: x1, y1: y1};
+        queueEdit(index, coords);
+        redraw(gd, [index], {[index]: coords});
+        return true;
+    }
+
+    function cycleSelection(step) {
+        const gd = graphDiv();
+        const count = gd && gd.layout.shapes ? gd.layout.shapes.length : 0;
+        if (!count) {
+            return false;
+        }
+        const previous = state.selected;
+        const start = previous === null || previous === undefined ? (step > 0 ? -1 : 0) : previous;
+        state.selected = ((start + step) % count + count) % count;
+        redraw(gd, [previous, state.selected]);
+        window.dash_clientside.set_props('selected-annotation', {data: state.selected});
+        return true;
+    }
+
+    function onKeydown(event) {
+        const tag = event.target.tagName;
+        if (tag === 'INPUT' || tag === 'TEXTAREA' || tag === 'SELECT') {
+            return;
+        }
+        const key = event.key;
+        const step = event.shiftKey ? 10 : 1;
+        let handled = false;
+
+        if (event.ctrlKey && (key === 'z' || key === 'Z')) {
+            clickAfterFlush('undo-button');
+            handled = true;
+        } else if (event.ctrlKey || event.metaKey) {
+            return;
+        } else if (key === 'f' || key === 'F') {
+            flush();
+            clickButton('next-button');
+            handled = true;
+        } else if (key === 'd' || key === 'D') {
+            flush();
+            clickButton('prev-button');
+            handled = true;
+        } else if (key === 's' || key === 'S') {
+            clickAfterFlush('suggest-button');
+            handled = true;
+        } else if (key === 'g' || key === 'G') {
+            flush();
+            clickButton('grid-button');
+            handled = true;
+        } else if (key === 'p' || key === 'P') {
+            clickAfterFlush('propagate-button');
+            handled = true;
+        } else if (key === 'Delete' || key === 'Supr') {
+            clickAfterFlush('delete-selected-button');
+            handled = true;
+        } else if (/^[0-9]$/.test(key)) {
+            // 1-9 -> clases 0-8, 0 -> clase 9
+            handled = setClass(key === '0' ? 9 : parseInt(key, 10) - 1);
+        } else if (key === 'Tab') {
+            handled = cycleSelection(event.shiftKey ? -1 : 1);
+        } else if (key === 'ArrowLeft') {
+            handled = nudge(-step, 0, event.altKey);
+        } else if (key === 'ArrowRight') {
+            handled = nudge(step, 0, event.altKey);
+        } else if (key === 'ArrowUp') {
+            // Ejes del gráfico con y hacia arriba
+            handled = nudge(0, step, event.altKey);
+        } else if (key === 'ArrowDown') {
+            handled = nudge(0, -step, event.altKey);
+        }
+        if (handled) {
+            event.preventDefault();
+        }
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        keymap: {
+            install: function (n, config) {
+                state.config = config || state.config;
+                if (window.keydownListener) {
+                    document.removeEventListener('keydown', window.keydownListener);
+                }
+                window.keydownListener = onKeydown;
+                document.addEventListener('keydown', window.keydownListener);
+                if (!window.keymapOnline) {
+                    window.keymapOnline = function () {
+                        state.inflight = null;
+                        send();
+                    };
+                    window.addEventListener('online', window.keymapOnline);
+                }
+                return (n || 0) + 1;
+            },
+            // Copia en el navegador del estado que necesitan los atajos
+            mirror: function (selected, annotations, opacity, displayOptions, imageData, dims) {
+                const filename = imageData ? imageData.filename : null;
+                if (filename !== state.filename) {
+                    // Cambio de imagen: lo pendiente se registra con el nombre de su imagen
+                    flush();
+                }
+                if (imageData && imageData.version !== undefined && imageData.version !== state.imageVersion) {
+                    // Etiqueta recién leída del disco al navegar o recargar
+                    state.imageVersion = imageData.version;
+                    state.versions[filename] = imageData.version;
+                }
+                state.selected = selected === undefined ? null : selected;
+                state.annotations = annotations || [];
+                state.opacity = opacity;
+                state.display = displayOptions || [];
+                state.filename = filename;
+                state.dims = dims;
+                return noUpdate();
+            },
+            // Registro guardado en localStorage de una sesión anterior: retomar la sincronización
+            restore: function (log) {
+                if (log && log.seq > state.log.seq) {
+                    state.log = {seq: log.seq, entries: log.entries || []};
+                    send();
+                }
+                return noUpdate();
+            },
+            // El servidor confirmó (o rechazó por conflicto) un lote: quitarlo del registro y seguir. Si no
+            // pudo guardarlo ('error') el lote se queda en el registro y se reintenta más tarde
+            acknowledge: function (ack) {
+                if (!ack || ack.seq === undefined) {
+                    return noUpdate();
+                }
+                clearTimeout(state.retry);
+                state.inflight = null;
+                if (ack.status === 'error') {
+                    state.retry = setTimeout(send, RETRY_MS);
+                    return noUpdate();
+                }
+                if (ack.version) {
+                    state.versions[ack.filename] = ack.version;
+                }
+                state.log = {
+                    seq: state.log.seq,
+                    entries: state.log.entries.filter(function (entry) { return entry.seq > ack.seq; })
+                };
+                persist();
+                if (state.log.entries.length) {
+                    send();
+                } else if (state.afterFlush && !hasPending()) {
+                    const id = state.afterFlush;
+                    state.afterFlush = null;
+                    clickButton(id);
+                }
+                return noUpdate();
+            }
+        }
+    });
+})();
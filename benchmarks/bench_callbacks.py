@@ -0,0 +1,115 @@
+"""
+Benchmark de los callbacks del editor: tamaño de la respuesta y latencia por disparador
+
+Compara el coste de reconstruir la figura completa en cada disparador (lo que hacía el antiguo callback
+único de navegación/visualización) con las salidas actuales: Patch de opacidad/etiquetas, navegación
+con metadatos y etiquetas memoizados y Patch de filas de la tabla de anotaciones.
+
+Uso:
+    python benchmarks/bench_callbacks.py --dataset /ruta/al/dataset --frames 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import AnnotationManager, ConfigLoader, FigureGenerator  # noqa: E402
+from utils import figure_generator as figure_module  # noqa: E402
+from utils.label_index import IMAGE_EXTENSIONS  # noqa: E402
+
+
+def measure(function, repeat):
+    """Mediana en ms y tamaño en bytes del JSON que se enviaría al navegador"""
+    timings, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = to_json_plotly(function())
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(payload)
+    return statistics.median(timings), size
+
+
+def annotation_rows(annotations):
+    """Mismas filas que la tabla de anotaciones del editor"""
+    return [{'id': idx, 'idx': idx, 'class_id': ann['class_id'], 'class_name': ann['class_name'],
+             'center': f"{ann['x_center']:.3f}, {ann['y_center']:.3f}",
+             'size': f"{ann['width']:.3f} × {ann['height']:.3f}", 'select': "🎯", 'delete': "🗑️"}
+            for idx, ann in enumerate(annotations)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de payload y latencia de los callbacks del editor")
+    parser.add_argument("--dataset", required=True, help="Carpeta con images/, annotations/ y data.yaml")
+    parser.add_argument("--frames", type=int, default=20, help="Número de frames a recorrer")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medida")
+    args = parser.parse_args()
+
+    config = ConfigLoader(os.path.join(args.dataset, "data.yaml"))
+    classes = config.get_classes()
+    images_path = os.path.join(args.dataset, "images")
+    labels_path = os.path.join(args.dataset, "annotations")
+    image_files = sorted(f for f in os.listdir(images_path) if f.lower().endswith(IMAGE_EXTENSIONS))[:args.frames]
+    if not image_files:
+        print(f"❌ No hay imágenes en {images_path}")
+        return
+
+    generator = FigureGenerator(images_path, config.get_colors(len(classes)))
+    results = {}
+
+    def full_figure_cold(image_file):
+        # Antes: cada disparador volvía a leer etiquetas, abrir la imagen y codificarla en base64
+        figure_module._image_size.cache_clear()
+        figure_module._image_base64.cache_clear()
+        annotations = AnnotationManager(labels_path, classes).load_annotations(image_file)
+        return generator.create_figure_with_annotations(image_file, annotations, 0.3, True, False)[0]
+
+    manager = AnnotationManager(labels_path, classes)
+
+    def navigation_warm(image_file):
+        annotations = manager.load_annotations(image_file)
+        return generator.create_figure_with_annotations(image_file, annotations, 0.3, True, False)[0]
+
+    for image_file in image_files:
+        annotations = manager.load_annotations(image_file)
+        width, height = generator.image_size(image_file)
+        dims = {'width': width, 'height': height}
+        rows = annotation_rows(annotations)
+        edited = [dict(ann) for ann in annotations]
+        if edited:
+            edited[0]['x_center'] = min(1.0, edited[0]['x_center'] + 0.01)
+
+        def table_patch():
+            from dash import Patch
+            patched = Patch()
+            for idx, row in enumerate(annotation_rows(edited)):
+                if row != rows[idx]:
+                    patched[idx] = row
+            return patched.to_plotly_json()
+
+        measures = {
+            "Opacidad/etiquetas (antes: figura completa)": lambda: full_figure_cold(image_file),
+            "Opacidad/etiquetas (ahora: Patch)": lambda: generator.display_patch(
+                annotations, dims, 0.5, True, False).to_plotly_json(),
+            "Navegación (sin memoizar)": lambda: full_figure_cold(image_file),
+            "Navegación (revisita memoizada)": lambda: navigation_warm(image_file),
+            "Lista tras editar (antes: todas las filas)": lambda: annotation_rows(edited),
+            "Lista tras editar (ahora: Patch de filas)": table_patch,
+        }
+        for name, function in measures.items():
+            results.setdefault(name, []).append(measure(function, args.repeat))
+
+    print(f"📊 {len(image_files)} frames de {args.dataset} (mediana por frame)")
+    print(f"{'Disparador':<46}{'ms':>10}{'KB':>12}")
+    for name, values in results.items():
+        latency = statistics.median(v[0] for v in values)
+        size = statistics.median(v[1] for v in values) / 1024
+        print(f"{name:<46}{latency:>10.2f}{size:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
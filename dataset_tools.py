@@ -0,0 +1,309 @@
+"""
+Herramientas de línea de comandos para generar y mantener datasets YOLO
+Uso: python dataset_tools.py <comando> --help
+"""
+
+import argparse
+import functools
+import json
+import os
+
+import yaml
+
+
+def load_ontology_mapping(value):
+    """Cargar la ontología {prompt: clase} desde un JSON en línea o un archivo JSON/YAML"""
+    if os.path.exists(value):
+        with open(value, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    return json.loads(value)
+
+
+def build_base_model(model_name, ontology_mapping, class_names=None, device=None):
+    """Construir el modelo base a partir de su nombre (el dispositivo lo fija el worker)"""
+    if model_name == "stub":
+        from utils import StubDetectionModel
+        names = class_names or list((ontology_mapping or {"vehicle": "vehicle"}).values())
+        return StubDetectionModel(class_names=names)
+
+    from autodistill.detection import CaptionOntology
+
+    ontology = CaptionOntology(ontology_mapping)
+    if model_name == "grounding-dino":
+        from autodistill_grounding_dino import GroundingDINO
+        return GroundingDINO(ontology=ontology)
+    if model_name == "grounded-sam":
+        from autodistill_grounded_sam import GroundedSAM
+        return GroundedSAM(ontology=ontology)
+    raise ValueError(f"Modelo base no soportado: {model_name}")
+
+
+def cmd_label(args):
+    """Etiquetar una carpeta de frames por lotes, reanudando si se interrumpió"""
+    from utils import LabelingRunner, InferenceCache
+
+    ontology_mapping = load_ontology_mapping(args.ontology) if args.ontology else None
+    base_model = build_base_model(args.model, ontology_mapping)
+    runner = LabelingRunner(
+        base_model, args.output,
+        batch_size=args.batch_size, num_workers=args.workers, prefetch=args.prefetch,
+        cache=InferenceCache(args.cache_dir) if args.cache_dir else None
+    )
+    runner.run(args.input)
+
+
+def cmd_label_sharded(args):
+    """Etiquetar una carpeta repartiendo los frames entre varios procesos"""
+    from utils import ShardedLabelingCoordinator, InferenceCache
+
+    ontology_mapping = load_ontology_mapping(args.ontology) if args.ontology else None
+    coordinator = ShardedLabelingCoordinator(
+        functools.partial(build_base_model, args.model, ontology_mapping),
+        args.output,
+        num_workers=args.num_workers,
+        devices=args.devices.split(",") if args.devices else None,
+        node_index=args.node_index,
+        num_nodes=args.num_nodes,
+        runner_kwargs={
+            'batch_size': args.batch_size, 'num_workers': args.threads,
+            'cache': InferenceCache(args.cache_dir) if args.cache_dir else None,
+        },
+    )
+    coordinator.run(args.input, poll_interval=args.poll_interval)
+
+
+def parse_class_values(value, cast=float):
+    """Parsear pares 'clase:valor' separados por coma (ej: '0:0.5,2:0.3')"""
+    if not value:
+        return {}
+    pairs = (item.split(":", 1) for item in value.split(",") if item.strip())
+    return {int(k): cast(v) for k, v in pairs}
+
+
+def cmd_refilter(args):
+    """Re-filtrar detecciones guardadas con nuevos umbrales y NMS, regenerando annotations/"""
+    from utils import DetectionRefilter
+
+    refilter = DetectionRefilter(args.dataset).load()
+    mask = refilter.select(
+        confidence=args.conf,
+        class_confidence=parse_class_values(args.class_conf),
+        iou_threshold=args.iou,
+        class_agnostic=args.agnostic,
+        max_per_frame=args.max_det,
+    )
+    refilter.apply(mask, dry_run=args.dry_run, force=args.force)
+
+
+def cmd_reorganize(args):
+    """Fusionar splits en images/ + annotations/ (o separarlos) con diario para rollback"""
+    from utils import DatasetLayout
+
+    layout = DatasetLayout(args.dataset, num_workers=args.workers)
+    if args.rollback:
+        layout.rollback(args.rollback)
+    elif args.direction == "merge":
+        layout.merge_splits(splits=args.splits.split(","), mode=args.mode, dry_run=args.dry_run)
+    else:
+        assignments = {}
+        if args.assignments:
+            with open(args.assignments, 'r', encoding='utf-8') as f:
+                assignments = json.load(f)
+        layout.split_into(assignments, default_split=args.default_split, mode=args.mode, dry_run=args.dry_run)
+
+
+def cmd_split(args):
+    """Generar splits estratificados por clase y por segmentos de video"""
+    from utils import SplitBuilder
+
+    ratios = tuple(float(v) for v in args.ratios.split(","))
+    builder = SplitBuilder(args.dataset, ratios=ratios, segment_length=args.segment_length, seed=args.seed,
+                           gap=args.gap)
+    splits = builder.build()
+    if not args.dry_run:
+        builder.write(splits)
+
+
+def cmd_export(args):
+    """Exportar images/ + annotations/ al layout train/valid de Ultralytics (incremental)"""
+    from utils import TrainingExporter
+
+    exporter = TrainingExporter(args.dataset, args.output, link_mode=args.link_mode, num_workers=args.workers)
+    exporter.export(default_split=args.default_split, full=args.full)
+
+
+def cmd_review(args):
+    """Calcular la cola de revisión (peores frames primero) para el editor"""
+    from utils import ReviewQueue, build_detector
+
+    queue = ReviewQueue(
+        args.dataset,
+        detector=build_detector(args.detector, confidence=args.detector_conf),
+        detector_name=args.detector or "",
+        chunk_size=args.chunk_size,
+    ).compute()
+    components = queue.components
+    index_of = {name: i for i, name in enumerate(queue.image_files)}
+    print(f"{'frame':40s} {'score':>6s} {'incert.':>8s} {'desac.':>7s} {'conteo':>7s}")
+    for name in queue.order()[:args.top]:
+        i = index_of[name]
+        print(f"{name:40s} {queue.scores[i]:6.2f} {components['uncertainty'][i]:8.2f} "
+              f"{components['disagreement'][i]:7.2f} {components['count_anomaly'][i]:7.2f}")
+
+
+def cmd_lint(args):
+    """Revisar la calidad de las etiquetas (y corregirlas con --fix)"""
+    from utils import LabelLinter
+
+    linter = LabelLinter(args.dataset, num_workers=args.workers, duplicate_iou=args.dup_iou, size_z=args.size_z)
+    linter.run(fix=args.fix, report_path=args.report)
+
+
+def cmd_reconcile(args):
+    """Detectar etiquetas sin imagen y stems duplicados; con --fix mover los huérfanos a _orphans/"""
+    from utils import DatasetReconciler
+
+    reconciler = DatasetReconciler(args.dataset).scan()
+    reconciler.report()
+    if args.fix:
+        reconciler.move_orphans(dry_run=args.dry_run)
+
+
+def cmd_bulk(args):
+    """Editar etiquetas de todo el dataset (o deshacer una edición anterior con --undo)"""
+    from utils import BulkEditor
+
+    editor = BulkEditor(args.dataset, num_workers=args.workers)
+    if args.undo:
+        editor.undo(args.undo)
+        return
+    remap = parse_class_values(args.remap, cast=int) if args.remap else None
+    delete = [int(c) for c in args.delete.split(",")] if args.delete else None
+    image_size = tuple(int(v) for v in args.image_size.lower().split("x")) if args.image_size else None
+    operations = BulkEditor.build_operations(remap=remap, delete=delete,
+                                             shift_removed=args.shift_removed, min_size=args.min_size)
+    editor.run(operations, image_size=image_size, dry_run=args.dry_run)
+
+
+def build_parser():
+    """Construir el parser de argumentos con todos los subcomandos"""
+    parser = argparse.ArgumentParser(description="Herramientas para datasets YOLO")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    label = subparsers.add_parser("label", help="Etiquetado automático por lotes y reanudable")
+    label.add_argument("--input", required=True, help="Carpeta con los frames a etiquetar")
+    label.add_argument("--output", required=True, help="Dataset de salida (images/ + annotations/)")
+    label.add_argument("--model", default="grounding-dino",
+                       choices=["grounding-dino", "grounded-sam", "stub"], help="Modelo base")
+    label.add_argument("--ontology", help='Ontología JSON (ej: \'{"vehicle": "vehicle"}\') o ruta a JSON/YAML')
+    label.add_argument("--batch-size", type=int, default=8, help="Imágenes por lote de inferencia")
+    label.add_argument("--workers", type=int, default=4, help="Hilos de decodificación/escritura")
+    label.add_argument("--prefetch", type=int, default=32, help="Tamaño máximo de la cola de imágenes decodificadas")
+    label.add_argument("--cache-dir", help="Caché de detecciones crudas (evita repetir inferencia)")
+    label.set_defaults(func=cmd_label)
+
+    sharded = subparsers.add_parser("label-sharded", help="Etiquetado repartido entre varios procesos/nodos")
+    sharded.add_argument("--input", required=True, help="Carpeta con los frames a etiquetar")
+    sharded.add_argument("--output", required=True, help="Dataset de salida (images/ + annotations/)")
+    sharded.add_argument("--model", default="grounding-dino",
+                         choices=["grounding-dino", "grounded-sam", "stub"], help="Modelo base")
+    sharded.add_argument("--ontology", help="Ontología JSON o ruta a JSON/YAML")
+    sharded.add_argument("--num-workers", type=int, default=2, help="Procesos worker en este nodo")
+    sharded.add_argument("--devices", help="Dispositivos por worker separados por coma (ej: cuda:0,cuda:1,cpu)")
+    sharded.add_argument("--node-index", type=int, default=0, help="Índice de este nodo (0..num-nodes-1)")
+    sharded.add_argument("--num-nodes", type=int, default=1, help="Número total de nodos")
+    sharded.add_argument("--batch-size", type=int, default=8, help="Imágenes por lote en cada worker")
+    sharded.add_argument("--threads", type=int, default=2, help="Hilos de decodificación por worker")
+    sharded.add_argument("--cache-dir", help="Caché de detecciones crudas (compartida entre workers)")
+    sharded.add_argument("--poll-interval", type=float, default=5.0, help="Segundos entre reportes de progreso")
+    sharded.set_defaults(func=cmd_label_sharded)
+
+    refilter = subparsers.add_parser("refilter", help="Re-filtrar detecciones (umbral + NMS) sin inferencia")
+    refilter.add_argument("--dataset", required=True, help="Dataset con detections/ y annotations/")
+    refilter.add_argument("--conf", type=float, default=0.35, help="Umbral de confianza global")
+    refilter.add_argument("--class-conf", help="Umbrales por clase (ej: 0:0.5,2:0.3)")
+    refilter.add_argument("--iou", type=float, default=0.5, help="Umbral IoU del NMS (1 = sin NMS)")
+    refilter.add_argument("--agnostic", action="store_true", help="NMS entre todas las clases")
+    refilter.add_argument("--max-det", type=int, help="Máximo de cajas por frame")
+    refilter.add_argument("--dry-run", action="store_true", help="Solo mostrar lo que cambiaría")
+    refilter.add_argument("--force", action="store_true", help="Sobrescribir también frames editados a mano")
+    refilter.set_defaults(func=cmd_refilter)
+
+    reorganize = subparsers.add_parser("reorganize", help="Fusionar/separar splits train/valid con rollback")
+    reorganize.add_argument("--dataset", required=True, help="Carpeta del dataset")
+    reorganize.add_argument("--direction", default="merge", choices=["merge", "split"],
+                            help="merge: splits -> images/+annotations/; split: al revés")
+    reorganize.add_argument("--splits", default="train,valid,test", help="Splits a fusionar (merge)")
+    reorganize.add_argument("--assignments", help='JSON {"stem": "split"} para --direction split')
+    reorganize.add_argument("--default-split", help="Split para los frames sin asignación (split)")
+    reorganize.add_argument("--mode", default="move", choices=["move", "link"],
+                            help="move: renombrar; link: hardlinks conservando el origen")
+    reorganize.add_argument("--workers", type=int, default=8, help="Hilos para copias entre dispositivos")
+    reorganize.add_argument("--dry-run", action="store_true", help="Solo mostrar el plan")
+    reorganize.add_argument("--rollback", help="Deshacer usando un diario layout_journal_*.jsonl")
+    reorganize.set_defaults(func=cmd_reorganize)
+
+    split = subparsers.add_parser("split", help="Splits train/val/test estratificados y sin fugas entre frames")
+    split.add_argument("--dataset", required=True, help="Dataset con images/ + annotations/")
+    split.add_argument("--ratios", default="0.8,0.2,0", help="Proporciones train,val,test")
+    split.add_argument("--segment-length", type=int, default=50,
+                       help="Frames consecutivos que van siempre al mismo split")
+    split.add_argument("--gap", type=int, default=5,
+                       help="Frames descartados en la frontera entre segmentos de splits distintos")
+    split.add_argument("--seed", type=int, default=0, help="Semilla para desempates")
+    split.add_argument("--dry-run", action="store_true", help="Solo mostrar el reparto")
+    split.set_defaults(func=cmd_split)
+
+    export = subparsers.add_parser("export", help="Exportar al layout de entrenamiento actualizando solo cambios")
+    export.add_argument("--dataset", required=True, help="Dataset editado (images/ + annotations/)")
+    export.add_argument("--output", required=True, help="Carpeta de entrenamiento (train/ valid/ test/)")
+    export.add_argument("--link-mode", default="hardlink", choices=["hardlink", "symlink", "copy"],
+                        help="Cómo materializar las imágenes (las etiquetas siempre se copian)")
+    export.add_argument("--default-split", default="train", choices=["train", "val", "valid", "test"],
+                        help="Split de todas las imágenes si no hay listas <split>.txt (con listas, las imágenes "
+                             "que no aparecen en ninguna no se exportan)")
+    export.add_argument("--workers", type=int, default=8, help="Hilos de E/S")
+    export.add_argument("--full", action="store_true", help="Ignorar el estado y reexportar todo")
+    export.set_defaults(func=cmd_export)
+
+    review = subparsers.add_parser("review", help="Priorizar frames para revisión (incertidumbre/desacuerdo)")
+    review.add_argument("--dataset", required=True, help="Dataset con images/ + annotations/ (+ detections/)")
+    review.add_argument("--detector", help="Modelo destilado para medir desacuerdo: .pt, .onnx o 'stub'")
+    review.add_argument("--detector-conf", type=float, default=0.25, help="Confianza mínima del detector")
+    review.add_argument("--chunk-size", type=int, default=64, help="Frames por bloque guardado en caché")
+    review.add_argument("--top", type=int, default=20, help="Frames a mostrar")
+    review.set_defaults(func=cmd_review)
+
+    lint = subparsers.add_parser("lint", help="Revisar la calidad de las etiquetas de todo el dataset")
+    lint.add_argument("--dataset", required=True, help="Dataset con images/ + annotations/ + data.yaml")
+    lint.add_argument("--fix", action="store_true", help="Corregir: eliminar inválidas/duplicadas y recortar al rango")
+    lint.add_argument("--dup-iou", type=float, default=0.9, help="IoU a partir del cual dos cajas son duplicadas")
+    lint.add_argument("--size-z", type=float, default=5.0, help="Z robusto de log-área para marcar tamaños atípicos")
+    lint.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por CPU)")
+    lint.add_argument("--report", help="Ruta del informe JSON (por defecto <dataset>/lint_report.json)")
+    lint.set_defaults(func=cmd_lint)
+
+    reconcile = subparsers.add_parser("reconcile", help="Cruzar images/ con annotations/ y detections/")
+    reconcile.add_argument("--dataset", required=True, help="Dataset con images/ + annotations/")
+    reconcile.add_argument("--fix", action="store_true", help="Mover las etiquetas sin imagen a _orphans/")
+    reconcile.add_argument("--dry-run", action="store_true", help="Con --fix, solo mostrar lo que se movería")
+    reconcile.set_defaults(func=cmd_reconcile)
+
+    bulk = subparsers.add_parser("bulk", help="Editar etiquetas de todo el dataset con diario para deshacer")
+    bulk.add_argument("--dataset", required=True, help="Dataset con images/ + annotations/")
+    bulk.add_argument("--remap", help="Remapear clases, p. ej. '3:1,4:1'")
+    bulk.add_argument("--delete", help="Borrar las cajas de estas clases, p. ej. '5,6'")
+    bulk.add_argument("--shift-removed", type=int, help="Clase quitada de data.yaml: se borra y las siguientes bajan un índice")
+    bulk.add_argument("--min-size", type=float, help="Borrar cajas con ancho o alto menor que N píxeles")
+    bulk.add_argument("--image-size", help="Resolución común 'ANCHOxALTO' (evita leer cada imagen con --min-size)")
+    bulk.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por CPU)")
+    bulk.add_argument("--dry-run", action="store_true", help="Solo mostrar lo que cambiaría")
+    bulk.add_argument("--undo", help="Deshacer usando un diario bulk_journal_*.jsonl")
+    bulk.set_defaults(func=cmd_bulk)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
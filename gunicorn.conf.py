@@ -0,0 +1,31 @@
+"""
+Configuración de gunicorn para el editor
+
+    ANNOTATION_DATASET=dataset_cruce_3 gunicorn -c gunicorn.conf.py wsgi:server
+
+La pila de deshacer y las cachés (etiquetas parseadas, imágenes codificadas, índice espacial) viven en
+memoria del proceso, así que por defecto se usa un único proceso con varios hilos (gthread): las lecturas de
+imágenes y los guardados de un usuario ya no bloquean a los demás. La imagen actual la guarda cada navegador
+(store 'current-image-data'), deshacer solo toca la imagen visible y las sugerencias, el área visible y el índice
+espacial se guardan por imagen, así que varios anotadores no se pisan. Con
+ANNOTATION_WORKERS > 1 cada proceso tendría su propio estado, lo que solo sirve si cada anotador trabaja
+contra un proceso fijo (p. ej. un dataset por proceso detrás de un proxy).
+"""
+import os
+
+bind = os.environ.get("ANNOTATION_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("ANNOTATION_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("ANNOTATION_THREADS", "8"))
+
+# La primera sugerencia del detector puede tardar mientras se carga el modelo
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Sin preload: los hilos de fondo (precarga, miniaturas, sugerencias) se crean en cada worker, no en el master
+preload_app = False
+
+accesslog = os.environ.get("ANNOTATION_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.environ.get("ANNOTATION_LOG_LEVEL", "info")
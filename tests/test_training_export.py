@@ -0,0 +1,81 @@
+"""
+Pruebas de la exportación al layout de entrenamiento a partir de los splits de SplitBuilder
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import SplitBuilder, TrainingExporter  # noqa: E402
+
+
+class TrainingExportAfterSplitTest(unittest.TestCase):
+    """Los frames del hueco entre splits no deben volver a entrar en ningún split al exportar"""
+
+    NUM_FRAMES = 24
+    SEGMENT_LENGTH = 4
+    GAP = 2
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_path = os.path.join(self.tmp.name, "dataset")
+        self.export_path = os.path.join(self.tmp.name, "export")
+        os.makedirs(os.path.join(self.dataset_path, "images"))
+        os.makedirs(os.path.join(self.dataset_path, "annotations"))
+        for i in range(self.NUM_FRAMES):
+            stem = f"video_frame_{i:06d}"
+            # El exportador solo enlaza las imágenes: no hace falta que sean JPEG válidos
+            with open(os.path.join(self.dataset_path, "images", stem + ".jpg"), 'wb') as f:
+                f.write(b"jpg")
+            with open(os.path.join(self.dataset_path, "annotations", stem + ".txt"), 'w') as f:
+                f.write(f"{i % 2} 0.5 0.5 0.1 0.1\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _exported(self):
+        """{carpeta_split: imágenes exportadas}"""
+        exported = {}
+        for folder in TrainingExporter.SPLIT_FOLDERS.values():
+            images_dir = os.path.join(self.export_path, folder, "images")
+            exported[folder] = set(os.listdir(images_dir)) if os.path.isdir(images_dir) else set()
+        return exported
+
+    def _build_splits(self):
+        builder = SplitBuilder(self.dataset_path, ratios=(0.5, 0.5, 0.0),
+                               segment_length=self.SEGMENT_LENGTH, gap=self.GAP)
+        splits = builder.build()
+        builder.write(splits)
+        listed = set().union(*splits.values())
+        gap_frames = set(os.listdir(os.path.join(self.dataset_path, "images"))) - listed
+        self.assertTrue(gap_frames, "el reparto de prueba debería dejar frames en el hueco")
+        return splits, gap_frames
+
+    def test_gap_frames_are_not_exported(self):
+        splits, gap_frames = self._build_splits()
+        TrainingExporter(self.dataset_path, self.export_path).export()
+
+        exported = self._exported()
+        for folder, image_files in exported.items():
+            self.assertFalse(image_files & gap_frames, f"frames del hueco exportados en {folder}/")
+        for split, image_files in splits.items():
+            self.assertEqual(exported[TrainingExporter.SPLIT_FOLDERS[split]], set(image_files))
+
+    def test_stale_copies_of_gap_frames_are_removed(self):
+        exporter = TrainingExporter(self.dataset_path, self.export_path)
+        # Exportación anterior sin listas: todo va a train
+        exporter.export()
+        self.assertEqual(len(self._exported()["train"]), self.NUM_FRAMES)
+
+        _, gap_frames = self._build_splits()
+        exporter.export()
+        for folder, image_files in self._exported().items():
+            self.assertFalse(image_files & gap_frames, f"copias antiguas del hueco en {folder}/")
+
+
+if __name__ == "__main__":
+    unittest.main()
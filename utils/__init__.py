@@ -1,19 +1,60 @@
 """
 Archivo __init__.py para el módulo utils
+
+Los módulos se importan al usar cada nombre por primera vez: 'from utils import LabelIndex' no carga
+Dash, Plotly ni PIL (lo que pesa en las herramientas de línea de comandos).
 """
+import importlib
+
+# Nombre exportado -> módulo que lo define
+_EXPORTS = {
+    'ConfigLoader': '.config_loader',
+    'AnnotationManager': '.annotation_manager',
+    'CoordinateConverter': '.coordinate_converter',
+    'UndoManager': '.undo_manager',
+    'FigureGenerator': '.figure_generator',
+    'CallbackManager': '.callback_manager',
+    'LabelIO': '.label_io',
+    'InferenceCache': '.inference_cache',
+    'LabelingRunner': '.labeling_runner',
+    'StubDetectionModel': '.labeling_runner',
+    'ShardedLabelingCoordinator': '.sharded_labeling',
+    'DetectionRefilter': '.detection_refilter',
+    'DatasetLayout': '.dataset_layout',
+    'LabelIndex': '.label_index',
+    'SplitBuilder': '.split_builder',
+    'TrainingExporter': '.training_export',
+    'StubDetector': '.preannotation',
+    'YOLODetector': '.preannotation',
+    'ONNXDetector': '.preannotation',
+    'SuggestionService': '.preannotation',
+    'build_detector': '.preannotation',
+    'BoxPropagator': '.box_propagation',
+    'PropagationJob': '.box_propagation',
+    'ReviewQueue': '.review_queue',
+    'LabelLinter': '.label_linter',
+    'DatasetReconciler': '.dataset_reconciler',
+    'ThumbnailCache': '.thumbnail_cache',
+    'TilePyramid': '.tile_pyramid',
+    'BulkEditor': '.bulk_operations',
+    'ShapeEditEngine': '.shape_edit_engine',
+    'SpatialIndex': '.spatial_index',
+    'IOExecutor': '.io_executor',
+    'StartupProfiler': '.startup_profiler',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # Las siguientes búsquedas ya no pasan por __getattr__
+    globals()[name] = value
+    return value
 
-from .config_loader import ConfigLoader
-from .annotation_manager import AnnotationManager
-from .coordinate_converter import CoordinateConverter
-from .undo_manager import UndoManager
-from .figure_generator import FigureGenerator
-from .callback_manager import CallbackManager
 
-__all__ = [
-    'ConfigLoader',
-    'AnnotationManager', 
-    'CoordinateConverter',
-    'UndoManager',
-    'FigureGenerator',
-    'CallbackManager'
-]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
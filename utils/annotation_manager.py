@@ -2,20 +2,69 @@
 Módulo para manejo de anotaciones YOLO
 """
 import os
+import threading
+from collections import OrderedDict
+
+from .label_io import LabelIO
 
 
 class AnnotationManager:
     """Clase para manejar las operaciones con anotaciones YOLO"""
     
-    def __init__(self, labels_path, classes):
+    def __init__(self, labels_path, classes, cache_size=256):
         self.labels_path = labels_path
         self.classes = classes
+        # Etiquetas ya parseadas: {ruta: ((mtime_ns, tamaño), anotaciones)}
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # La caché se comparte entre los hilos del servidor y la precarga de IOExecutor
+        self._lock = threading.Lock()
+        # Versión (hash del contenido) de cada etiqueta según la última escritura de este proceso. Solo la
+        # actualizan los guardados: una lectura (p. ej. la precarga) no debe dar por buena una edición externa
+        self._versions = {}
     
     def load_annotations(self, image_filename):
-        """Cargar anotaciones para una imagen específica"""
+        """Cargar anotaciones para una imagen específica (se reutiliza el parseo si el archivo no cambió)"""
         label_filename = os.path.splitext(image_filename)[0] + '.txt'
         label_path = os.path.join(self.labels_path, label_filename)
         
+        try:
+            stat = os.stat(label_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            cached = self._cache.get(label_path)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(label_path)
+                # Copias: los callbacks modifican las anotaciones en sitio
+                return [dict(ann) for ann in cached[1]]
+        
+        annotations = self._parse_annotations(label_path, label_filename) if signature else []
+        with self._lock:
+            self._cache[label_path] = (signature, [dict(ann) for ann in annotations])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return annotations
+    
+    def label_version(self, image_filename):
+        """Versión actual en disco de la etiqueta de una imagen (hash del contenido; '' equivale a sin etiqueta)"""
+        label_path = os.path.join(self.labels_path, os.path.splitext(image_filename)[0] + '.txt')
+        return LabelIO.content_hash(LabelIO.read_text(label_path))
+    
+    def has_conflict(self, image_filename, base_version):
+        """¿Cambió la etiqueta fuera de este editor desde 'base_version'?
+
+        No hay conflicto si el disco coincide con la versión de la que partió el cliente o con la última que
+        este proceso escribió (p. ej. ediciones con el ratón hechas después)."""
+        label_path = os.path.join(self.labels_path, os.path.splitext(image_filename)[0] + '.txt')
+        current = self.label_version(image_filename)
+        with self._lock:
+            saved = self._versions.get(label_path)
+        return current != base_version and current != saved
+    
+    def _parse_annotations(self, label_path, label_filename):
+        """Parsear un archivo de etiquetas YOLO"""
         annotations = []
         if os.path.exists(label_path):
             with open(label_path, 'r') as f:
@@ -50,11 +99,21 @@ class AnnotationManager:
         
         return annotations
     
+    @staticmethod
+    def _format_line(ann):
+        """Línea YOLO de una anotación"""
+        return f"{ann['class_id']} {ann['x_center']:.6f} {ann['y_center']:.6f} {ann['width']:.6f} {ann['height']:.6f}\n"
+    
     def save_annotations(self, image_filename, annotations):
         """Guardar anotaciones en formato YOLO"""
         print(f"DEBUG: Guardando {len(annotations)} anotaciones para {image_filename}")
         label_filename = os.path.splitext(image_filename)[0] + '.txt'
         label_path = os.path.join(self.labels_path, label_filename)
+        # Sistemas de archivos con mtime de baja resolución: no fiarse solo de la firma
+        version = LabelIO.content_hash("".join(self._format_line(ann) for ann in annotations))
+        with self._lock:
+            self._cache.pop(label_path, None)
+            self._versions[label_path] = version
         
         if not annotations:
             # Si no hay anotaciones, eliminar archivo si existe
@@ -66,8 +125,7 @@ class AnnotationManager:
         try:
             with open(label_path, 'w') as f:
                 for ann in annotations:
-                    line = f"{ann['class_id']} {ann['x_center']:.6f} {ann['y_center']:.6f} {ann['width']:.6f} {ann['height']:.6f}\n"
-                    f.write(line)
+                    f.write(self._format_line(ann))
             print(f"DEBUG: Archivo guardado exitosamente: {label_path}")
             
             # Verificar que se guardó correctamente
@@ -0,0 +1,156 @@
+"""
+Módulo para propagar anotaciones entre frames consecutivos de video con template matching en CPU
+"""
+import json
+import os
+import threading
+import time
+
+from .coordinate_converter import CoordinateConverter
+from .label_io import LabelIO
+
+
+class BoxPropagator:
+    """Clase para trasladar las cajas de un frame al siguiente buscando cada recorte en una ventana cercana"""
+
+    def __init__(self, images_path, search_margin=0.5, min_score=0.5, max_side=640):
+        self.images_path = images_path
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.max_side = max_side
+        self.converter = CoordinateConverter()
+
+    def load_gray(self, image_filename):
+        """Cargar en escala de grises y reducir (el tracking no necesita resolución completa)"""
+        import cv2  # Import diferido: solo se necesita al propagar
+        image = cv2.imread(os.path.join(self.images_path, image_filename), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError(f"No se pudo leer la imagen: {image_filename}")
+        scale = min(1.0, self.max_side / max(image.shape))
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return image
+
+    def _track_box(self, prev_gray, next_gray, annotation):
+        """Buscar el recorte de la caja en el frame siguiente; devuelve (anotación movida, score)"""
+        import cv2
+        height, width = prev_gray.shape
+        x_min, y_min, x_max, y_max = (int(round(v)) for v in
+                                      self.converter.yolo_to_pixel(annotation, width, height))
+        box_w, box_h = x_max - x_min, y_max - y_min
+        if box_w < 4 or box_h < 4:
+            return dict(annotation), 0.0
+
+        margin_x = max(4, int(box_w * self.search_margin))
+        margin_y = max(4, int(box_h * self.search_margin))
+        sx0, sy0 = max(0, x_min - margin_x), max(0, y_min - margin_y)
+        sx1, sy1 = min(width, x_max + margin_x), min(height, y_max + margin_y)
+
+        template = prev_gray[y_min:y_max, x_min:x_max]
+        window = next_gray[sy0:sy1, sx0:sx1]
+        if window.shape[0] < box_h or window.shape[1] < box_w:
+            return dict(annotation), 0.0
+
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (best_x, best_y) = cv2.minMaxLoc(result)
+        moved = dict(annotation)
+        if score >= self.min_score:
+            moved['x_center'] = (sx0 + best_x + box_w / 2) / width
+            moved['y_center'] = (sy0 + best_y + box_h / 2) / height
+        return moved, float(score)
+
+    def propagate(self, prev_filename, next_filename, annotations, prev_gray=None, next_gray=None):
+        """Propagar las anotaciones de prev a next; devuelve (anotaciones, scores)"""
+        prev_gray = prev_gray if prev_gray is not None else self.load_gray(prev_filename)
+        next_gray = next_gray if next_gray is not None else self.load_gray(next_filename)
+        propagated, scores = [], []
+        for i, annotation in enumerate(annotations):
+            moved, score = self._track_box(prev_gray, next_gray, annotation)
+            moved['id'] = i
+            propagated.append(moved)
+            scores.append(score)
+        return propagated, scores
+
+
+class PropagationJob:
+    """Clase para propagar en segundo plano a lo largo de un rango de frames, con diario para deshacer"""
+
+    def __init__(self, propagator, annotation_manager, image_files, start_index, end_index, overwrite=False,
+                 journal_path=None):
+        self.propagator = propagator
+        self.annotation_manager = annotation_manager
+        self.image_files = image_files
+        self.start_index = start_index
+        self.end_index = min(end_index, len(image_files) - 1)
+        self.overwrite = overwrite
+        # Mismo formato que el diario de BulkEditor: se deshace con 'dataset_tools.py bulk --undo'
+        self.journal_path = journal_path or os.path.join(
+            os.path.dirname(annotation_manager.labels_path),
+            f"propagation_journal_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.progress = {'done': 0, 'total': max(0, self.end_index - start_index),
+                         'written': 0, 'kept': 0, 'running': False, 'error': None, 'journal': None}
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Lanzar el hilo de trabajo"""
+        self.progress['running'] = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Pedir la cancelación (termina tras el frame en curso)"""
+        self._cancel.set()
+
+    def _save(self, journal, image_filename, annotations):
+        """Registrar el contenido anterior (con fsync) y después escribir la etiqueta"""
+        label_file = LabelIO.label_filename(image_filename)
+        path = os.path.join(self.annotation_manager.labels_path, label_file)
+        before = LabelIO.read_text(path)
+        after = "".join(self.annotation_manager._format_line(ann) for ann in annotations)
+        # 'existed': deshacer borra las etiquetas que la propagación creó en frames sin anotar
+        journal.write(json.dumps({'file': label_file, 'before': before, 'existed': os.path.exists(path),
+                                  'after_hash': LabelIO.content_hash(after)}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        self.annotation_manager.save_annotations(image_filename, annotations)
+
+    def _run(self):
+        journal = None
+        try:
+            current = self.image_files[self.start_index]
+            annotations = self.annotation_manager.load_annotations(current)
+            current_gray = self.propagator.load_gray(current)
+
+            for index in range(self.start_index + 1, self.end_index + 1):
+                if self._cancel.is_set() or not annotations:
+                    break
+                next_file = self.image_files[index]
+                next_gray = self.propagator.load_gray(next_file)
+                existing = self.annotation_manager.load_annotations(next_file)
+
+                if existing and not self.overwrite:
+                    # Un frame ya anotado sirve de nuevo ancla para la cadena
+                    annotations = existing
+                    self.progress['kept'] += 1
+                else:
+                    annotations, _ = self.propagator.propagate(
+                        current, next_file, annotations, current_gray, next_gray
+                    )
+                    if journal is None:
+                        journal = open(self.journal_path, 'w', encoding='utf-8')
+                        self.progress['journal'] = self.journal_path
+                    self._save(journal, next_file, annotations)
+                    self.progress['written'] += 1
+
+                current, current_gray = next_file, next_gray
+                self.progress['done'] += 1
+        except Exception as e:
+            print(f"❌ Error propagando anotaciones: {e}")
+            self.progress['error'] = str(e)
+        finally:
+            if journal is not None:
+                journal.close()
+                print(f"📝 Diario para deshacer la propagación: {self.journal_path}")
+            self.progress['running'] = False
@@ -0,0 +1,216 @@
+"""
+Módulo para editar etiquetas de todo el dataset de una vez (remapear, borrar clases, filtrar cajas pequeñas)
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .label_io import LabelIO
+from .label_index import LabelIndex
+
+
+def _apply_to_text(text, operations, image_size):
+    """Aplicar las operaciones línea a línea; las líneas no afectadas se conservan tal cual"""
+    lines, stats = [], Counter()
+    for line in text.splitlines():
+        parts = line.split()
+        try:
+            class_id = int(parts[0])
+            width, height = float(parts[3]), float(parts[4])
+        except (ValueError, IndexError):
+            lines.append(line)  # Línea mal formada: no es cosa de esta herramienta (ver 'lint')
+            continue
+
+        new_class, keep = class_id, True
+        for name, value in operations:
+            if name == "remap" and new_class in value:
+                new_class = value[new_class]
+            elif name == "delete" and new_class in value:
+                keep = False
+            elif name == "shift" and new_class >= value:
+                # La clase eliminada de data.yaml se borra y las siguientes bajan un índice
+                if new_class == value:
+                    keep = False
+                else:
+                    new_class -= 1
+            elif name == "drop_small" and image_size is not None:
+                if width * image_size[0] < value or height * image_size[1] < value:
+                    keep = False
+            if not keep:
+                stats[name] += 1
+                break
+
+        if not keep:
+            continue
+        if new_class != class_id:
+            stats['relabeled'] += 1
+            lines.append(" ".join([str(new_class)] + parts[1:]))
+        else:
+            lines.append(line)
+    return ("\n".join(lines) + "\n" if lines else ""), stats
+
+
+def _read_image_size(image_path):
+    """Tamaño (ancho, alto) leyendo solo la cabecera de la imagen"""
+    from PIL import Image
+    try:
+        with Image.open(image_path) as image:
+            return image.size
+    except OSError:
+        return None
+
+
+def _bulk_worker(labels_path, images_path, items, operations, image_size, journal_path, dry_run):
+    """Procesar un bloque de etiquetas en un proceso worker; devuelve (archivos cambiados, estadísticas)"""
+    needs_size = any(name == "drop_small" for name, _ in operations)
+    changes, stats = [], Counter()
+    for label_file, image_file in items:
+        path = os.path.join(labels_path, label_file)
+        before = LabelIO.read_text(path)
+        size = image_size
+        if needs_size and size is None:
+            size = _read_image_size(os.path.join(images_path, image_file))
+        after, file_stats = _apply_to_text(before, operations, size)
+        if not file_stats:
+            continue
+        stats.update(file_stats)
+        changes.append((label_file, before, after))
+
+    if dry_run or not changes:
+        return [label_file for label_file, _, _ in changes], stats
+
+    # Primero el diario (con fsync) y después los archivos: un corte deja siempre cómo deshacerlo
+    with open(journal_path, 'w', encoding='utf-8') as journal:
+        for label_file, before, after in changes:
+            journal.write(json.dumps({'file': label_file, 'before': before,
+                                      'existed': os.path.exists(os.path.join(labels_path, label_file)),
+                                      'after_hash': LabelIO.content_hash(after)}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    for label_file, _, after in changes:
+        path = os.path.join(labels_path, label_file)
+        if after:
+            LabelIO.write_atomic(path, after)
+        elif os.path.exists(path):
+            # Sin cajas no queda archivo, igual que al guardar desde el editor (deshacer lo vuelve a crear)
+            os.remove(path)
+    return [label_file for label_file, _, _ in changes], stats
+
+
+class BulkEditor:
+    """Clase para aplicar operaciones de etiquetado a todo el dataset con un único diario para deshacer"""
+
+    def __init__(self, dataset_path, num_workers=None, chunk_size=2000):
+        self.dataset_path = dataset_path
+        self.images_path = os.path.join(dataset_path, "images")
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def build_operations(remap=None, delete=None, shift_removed=None, min_size=None):
+        """Lista ordenada de operaciones: remapear -> borrar -> desplazar ids -> filtrar cajas pequeñas"""
+        operations = []
+        if remap:
+            operations.append(("remap", {int(k): int(v) for k, v in remap.items()}))
+        if delete:
+            operations.append(("delete", {int(c) for c in delete}))
+        if shift_removed is not None:
+            operations.append(("shift", int(shift_removed)))
+        if min_size:
+            operations.append(("drop_small", float(min_size)))
+        return operations
+
+    def _candidates(self, operations):
+        """Etiquetas que pueden cambiar según el índice de conteos (el resto ni se abre)"""
+        index = LabelIndex(self.dataset_path).build()
+        if any(name == "drop_small" for name, _ in operations):
+            rows = np.flatnonzero(index.counts.sum(axis=1) > 0)
+        else:
+            classes = set()
+            for name, value in operations:
+                if name in ("remap", "delete"):
+                    classes |= set(value)
+                elif name == "shift":
+                    classes |= set(range(value, index.counts.shape[1]))
+            columns = [c for c in classes if 0 <= c < index.counts.shape[1]]
+            rows = np.flatnonzero(index.counts[:, columns].sum(axis=1) > 0) if columns else []
+        return [(index.stems[i] + LabelIO.LABEL_EXTENSION, index.image_files[i]) for i in rows]
+
+    def run(self, operations, image_size=None, dry_run=False, journal_path=None):
+        """Aplicar las operaciones; devuelve la ruta del diario (None en dry-run o sin cambios)"""
+        if not operations:
+            print("⚠️ No se indicó ninguna operación")
+            return None
+        items = self._candidates(operations)
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        journal_path = journal_path or os.path.join(
+            self.dataset_path, f"bulk_journal_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        print(f"🧮 {len(items)} etiquetas candidatas en {len(chunks)} bloques: "
+              f"{', '.join(name for name, _ in operations)}")
+
+        jobs = [(self.labels_path, self.images_path, chunk, operations, image_size,
+                 f"{journal_path}.part{i}", dry_run) for i, chunk in enumerate(chunks)]
+        if len(jobs) <= 1 or self.num_workers <= 1:
+            results = [_bulk_worker(*job) for job in jobs]
+        else:
+            # spawn: mismo comportamiento en Linux y Windows (como el etiquetado distribuido)
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context) as executor:
+                futures = [executor.submit(_bulk_worker, *job) for job in jobs]
+                results = [future.result() for future in futures]
+
+        changed, stats = [], Counter()
+        for files, chunk_stats in results:
+            changed += files
+            stats.update(chunk_stats)
+
+        detail = ", ".join(f"{name}: {count}" for name, count in sorted(stats.items())) or "sin cambios"
+        if dry_run:
+            print(f"🔍 Dry-run: se modificarían {len(changed)} etiquetas ({detail})")
+            for label_file in changed[:10]:
+                print(f"   {label_file}")
+            return None
+
+        # Un único diario: se unen las partes de cada worker
+        parts = [job[5] for job in jobs if os.path.exists(job[5])]
+        if not parts:
+            print("✅ Ninguna etiqueta necesitaba cambios")
+            return None
+        with open(journal_path, 'w', encoding='utf-8') as journal:
+            for part in parts:
+                with open(part, 'r', encoding='utf-8') as f:
+                    journal.write(f.read())
+        for part in parts:
+            os.remove(part)
+        print(f"✅ {len(changed)} etiquetas modificadas ({detail})")
+        print(f"📝 Diario para deshacer: {journal_path}")
+        return journal_path
+
+    def undo(self, journal_path):
+        """Restaurar el contenido anterior; se respetan los archivos editados después de la operación"""
+        restored, skipped = 0, 0
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        for record in records:
+            path = os.path.join(self.labels_path, record['file'])
+            if LabelIO.content_hash(LabelIO.read_text(path)) != record['after_hash']:
+                skipped += 1
+                continue
+            # Diarios antiguos sin 'existed': el archivo existía
+            if record.get('existed', True):
+                LabelIO.write_atomic(path, record['before'])
+            elif os.path.exists(path):
+                os.remove(path)
+            restored += 1
+
+        os.replace(journal_path, journal_path + ".undone")
+        print(f"↶ Deshecho: {restored} etiquetas restauradas")
+        if skipped:
+            print(f"⚠️ {skipped} etiquetas se editaron después y no se tocaron")
+        return restored
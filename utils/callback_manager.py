@@ -2,121 +2,195 @@
 Módulo para los callbacks de Dash
 """
 import json
-from dash import ctx, no_update
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from dash import ctx, no_update, Patch
 from .coordinate_converter import CoordinateConverter
+from .label_io import LabelIO
+from .shape_edit_engine import ShapeEditEngine
+from .spatial_index import SpatialIndex
 
 
 class CallbackManager:
     """Clase para manejar los callbacks de Dash"""
     
-    def __init__(self, annotation_manager, undo_manager, figure_generator, classes):
+    # Índices espaciales que se conservan (uno por imagen abierta en algún cliente)
+    MAX_SPATIAL_INDEXES = 16
+    
+    def __init__(self, annotation_manager, undo_manager, figure_generator, classes, suggestion_service=None,
+                 box_propagator=None):
         self.annotation_manager = annotation_manager
         self.undo_manager = undo_manager
         self.figure_generator = figure_generator
         self.classes = classes
+        self.suggestion_service = suggestion_service
+        self.box_propagator = box_propagator
         self.converter = CoordinateConverter()
+        self.edit_engine = ShapeEditEngine()
+        # Un índice por imagen: entre el sync() y la consulta de un cliente, otro no puede reconstruirlo
+        self._spatial_indexes = OrderedDict()
+        self._spatial_lock = threading.Lock()
     
     def handle_shape_interaction(self, relayout_data, annotations, img_dims, image_data, 
-                               selected_class, opacity, display_options):
+                               selected_class, opacity, display_options, selected_id=None, group=None):
         """Manejar interacción con formas - creación y edición"""
         if not relayout_data or not img_dims or not image_data:
             return annotations or [], no_update, False, ""
 
         annotations = annotations or []
+        kind, payload = self.edit_engine.parse(relayout_data, annotations, img_dims)
         
-        print(f"DEBUG: relayout_data keys: {relayout_data.keys()}")
-        
-        # Detectar nueva forma dibujada
-        if 'shapes' in relayout_data and relayout_data['shapes']:
-            shapes = relayout_data['shapes']
-            print(f"DEBUG: Shapes count: {len(shapes)}, Annotations count: {len(annotations)}")
-            
-            # Si hay más shapes que anotaciones actuales, es una nueva forma
-            if len(shapes) > len(annotations):
-                print("DEBUG: Detectada nueva forma")
-                return self._handle_new_shape(shapes[-1], annotations, img_dims, image_data, 
-                                            selected_class, opacity, display_options)
-            
-            # Si hay igual número de shapes, podría ser edición
-            elif len(shapes) == len(annotations) and shapes:
-                print("DEBUG: Detectada posible edición")
-                return self._handle_shape_edit(shapes, annotations, img_dims, image_data, 
-                                             opacity, display_options)
-        
-        # Manejar edición de shape individual por coordenada
-        shape_coord_changed = False
-        shape_index = None
-        shape_updates = {}
-        
-        for key in relayout_data:
-            if key.startswith('shapes[') and any(key.endswith(coord) for coord in ['].x0', '].x1', '].y0', '].y1']):
-                print(f"DEBUG: Detectada edición individual de forma: {key} = {relayout_data[key]}")
-                shape_coord_changed = True
-                
-                # Extraer índice de la shape y la coordenada
-                try:
-                    parts = key.replace('shapes[', '').replace(']', '').split('.')
-                    shape_idx = int(parts[0])
-                    coord_name = parts[1]
-                    shape_index = shape_idx
-                    
-                    if shape_idx not in shape_updates:
-                        shape_updates[shape_idx] = {}
-                    shape_updates[shape_idx][coord_name] = relayout_data[key]
-                    
-                    print(f"DEBUG: Shape index: {shape_idx}, coord: {coord_name}, value: {relayout_data[key]}")
-                except Exception as e:
-                    print(f"DEBUG: Error extrayendo índice: {e}")
-        
-        # Si tenemos cambios de coordenadas individuales, reconstruir las shapes
-        if shape_coord_changed and shape_updates:
-            print(f"DEBUG: RECONSTRUYENDO shapes con cambios individuales")
-            print(f"DEBUG: Shape updates: {shape_updates}")
-            
-            # Necesitamos reconstruir las shapes completas a partir de las anotaciones actuales
-            # y aplicar los cambios individuales
-            reconstructed_shapes = []
-            
-            for i, ann in enumerate(annotations):
-                # Convertir anotación actual a coordenadas de shape
-                x_center = ann['x_center'] * img_dims['width']
-                y_center = ann['y_center'] * img_dims['height']
-                width = ann['width'] * img_dims['width']
-                height = ann['height'] * img_dims['height']
-                
-                # Calcular coordenadas de la shape (esquinas)
-                x0 = x_center - width / 2
-                x1 = x_center + width / 2
-                y0 = img_dims['height'] - (y_center + height / 2)  # Plotly Y invertido
-                y1 = img_dims['height'] - (y_center - height / 2)  # Plotly Y invertido
-                
-                shape = {
-                    'x0': x0,
-                    'x1': x1, 
-                    'y0': y0,
-                    'y1': y1,
-                    'type': 'rect',
-                    'line': {'color': 'rgba(0,212,170,1)', 'width': 2}
-                }
-                
-                # Si esta shape tiene cambios, aplicarlos
-                if i in shape_updates:
-                    updates = shape_updates[i]
-                    print(f"DEBUG: Aplicando cambios a shape {i}: {updates}")
-                    for coord, value in updates.items():
-                        shape[coord] = value
-                
-                reconstructed_shapes.append(shape)
-            
-            print(f"DEBUG: Shapes reconstruidas: {len(reconstructed_shapes)}")
-            
-            # Ahora procesar con las shapes reconstruidas
-            return self._handle_shape_edit(reconstructed_shapes, annotations, img_dims, image_data, 
-                                         opacity, display_options)
+        if kind == 'new':
+            return self._handle_new_shape(payload, annotations, img_dims, image_data, 
+                                        selected_class, opacity, display_options)
+        if kind == 'edit':
+            return self._handle_shape_edit(payload, annotations, img_dims, image_data, 
+                                         opacity, display_options, selected_id, group)
+        if relayout_data.get('shapes') is not None:
+            # Lista de shapes desincronizada (p. ej. borrada desde la barra): redibujar todo
+            show_ids = 'show_ids' in (display_options or ['show_ids'])
+            show_coords = 'show_coords' in (display_options or [])
+            fig, _ = self.figure_generator.create_figure_with_annotations(
+                image_data['filename'], annotations, opacity, show_ids, show_coords, selected_id
+            )
+            return annotations, fig, False, ""
         
         # No hacer nada si no hay cambios relevantes
         return annotations, no_update, False, ""
     
+    @contextmanager
+    def spatial_index(self, annotations, img_dims, image_filename):
+        """Índice espacial de una imagen al día con 'annotations', reservado mientras dura el bloque"""
+        with self._spatial_lock:
+            index = self._spatial_indexes.pop(image_filename, None) or SpatialIndex()
+            self._spatial_indexes[image_filename] = index
+            while len(self._spatial_indexes) > self.MAX_SPATIAL_INDEXES:
+                self._spatial_indexes.popitem(last=False)
+            yield index.sync(annotations, img_dims, image_filename)
+    
+    def select_at(self, click_x, click_y, annotations, img_dims, image_filename, margin=10):
+        """Índice de la caja bajo un clic (coordenadas del gráfico); con cajas anidadas gana la más pequeña"""
+        with self.spatial_index(annotations, img_dims, image_filename) as index:
+            hits = index.hit_test(click_x, img_dims['height'] - click_y, margin)
+        return hits[0] if hits else None
+    
+    def duplicate_warning(self, annotations, img_dims, image_filename, index, min_iou=0.9):
+        """Aviso si la caja 'index' casi coincide con otra de la misma clase"""
+        with self.spatial_index(annotations, img_dims, image_filename) as spatial:
+            matches = spatial.overlapping(spatial.boxes[index], min_iou, int(spatial.class_ids[index]),
+                                          exclude=index)
+        if not matches:
+            return ""
+        other, iou = matches[0]
+        return f" ⚠️ Posible duplicado de ID:{other} (IoU {iou:.2f})"
+    
+    def select_in_region(self, selected_data, annotations, img_dims, image_filename):
+        """Índices cuyo centro cae en el rectángulo o lazo de selectedData"""
+        if not selected_data or not annotations:
+            return []
+        box_range = selected_data.get('range')
+        if box_range and 'x' in box_range and 'y' in box_range:
+            # Rectángulo: candidatas desde el índice espacial y filtro exacto por centro
+            x0, x1 = sorted(box_range['x'])
+            y0, y1 = sorted(img_dims['height'] - y for y in box_range['y'])
+            with self.spatial_index(annotations, img_dims, image_filename) as index:
+                candidates = index.query(x0, y0, x1, y1)
+            return [i for i in candidates
+                    if x0 <= annotations[i]['x_center'] * img_dims['width'] <= x1
+                    and y0 <= annotations[i]['y_center'] * img_dims['height'] <= y1]
+        # Lazo: Plotly ya resolvió qué centros quedan dentro
+        return sorted({int(point['customdata'][1]) for point in selected_data.get('points', [])
+                       if point.get('customdata') and point['customdata'][0] == 'box'
+                       and int(point['customdata'][1]) < len(annotations)})
+    
+    def handle_region_selection(self, selected_data, annotations, img_dims, image_data, opacity,
+                                display_options, previous_group=None):
+        """Selección múltiple: devuelve (grupo, índice principal, patch de resaltado, toast, mensaje)"""
+        group = self.select_in_region(selected_data, annotations, img_dims, image_data.get('filename'))
+        touched = sorted(set(previous_group or []) | set(group))
+        if len(group) <= 1:
+            # Una sola caja se comporta como la selección normal
+            selected_id = group[0] if group else None
+            patched = self.patch_shapes(touched, annotations, img_dims, opacity, display_options, selected_id)
+            if selected_id is None:
+                return [], None, patched, bool(previous_group), "Selección vacía" if previous_group else ""
+            class_name = annotations[selected_id].get('class_name', f"Clase {annotations[selected_id].get('class_id', 0)}")
+            return [], selected_id, patched, True, f"🎯 Seleccionada: {class_name} (índice: {selected_id})"
+        patched = self.patch_shapes(touched, annotations, img_dims, opacity, display_options, group)
+        return group, group[0], patched, True, \
+            f"🔲 {len(group)} cajas seleccionadas • Supr elimina • arrastra una para moverlas todas"
+    
+    def handle_delete_group(self, annotations, group, image_data, opacity, display_options):
+        """Eliminar todas las cajas de la selección múltiple con un solo guardado y un solo deshacer"""
+        group = {i for i in group if 0 <= i < len(annotations)}
+        if not group:
+            return annotations, no_update, True, "⚠️ No hay cajas seleccionadas", None
+        try:
+            self.undo_manager.push_state(image_data['filename'], annotations)
+            remaining = [dict(ann, id=i) for i, ann in enumerate(a for j, a in enumerate(annotations) if j not in group)]
+            self.annotation_manager.save_annotations(image_data['filename'], remaining)
+            
+            show_ids = 'show_ids' in (display_options or ['show_ids'])
+            show_coords = 'show_coords' in (display_options or [])
+            fig, _ = self.figure_generator.create_figure_with_annotations(
+                image_data['filename'], remaining, opacity, show_ids, show_coords
+            )
+            return remaining, fig, True, f"🗑️ {len(group)} cajas eliminadas - Guardado automático", None
+        except Exception as e:
+            print(f"ERROR eliminando selección: {e}")
+            return annotations, no_update, True, f"❌ Error eliminando selección: {str(e)}", None
+    
+    def handle_change_class_group(self, annotations, group, new_class, img_dims, image_data, opacity,
+                                  display_options):
+        """Cambiar la clase de todas las cajas seleccionadas (un guardado, un deshacer, Patch solo del grupo)"""
+        new_class = int(new_class)
+        if not 0 <= new_class < len(self.classes):
+            return no_update, no_update, True, f"❌ Error: Índice de clase inválido ({new_class})"
+        group = [i for i in group if 0 <= i < len(annotations) and annotations[i]['class_id'] != new_class]
+        if not group:
+            return no_update, no_update, True, f"ℹ️ Las cajas seleccionadas ya son {self.classes[new_class]}"
+        
+        self.undo_manager.push_state(image_data['filename'], annotations)
+        updated = list(annotations)
+        for i in group:
+            updated[i] = dict(annotations[i], **{'class': new_class, 'class_id': new_class,
+                                                 'class_name': self.classes[new_class]})
+        try:
+            self.annotation_manager.save_annotations(image_data['filename'], updated)
+        except Exception as save_error:
+            print(f"ERROR guardando cambio de clase: {save_error}")
+        patched = self.patch_shapes(group, updated, img_dims, opacity, display_options, group)
+        patched['data'][0]['marker']['color'] = [
+            self.figure_generator.class_colors[ann['class_id'] % len(self.figure_generator.class_colors)]
+            for ann in updated
+        ]
+        return updated, patched, True, f"✅ {len(group)} cajas cambiadas a {self.classes[new_class]}"
+    
+    def patch_shapes(self, indices, annotations, img_dims, opacity, display_options, selected_id=None,
+                     patched=None):
+        """Patch de figura que redibuja solo las shapes (y etiquetas) indicadas"""
+        patched = patched if patched is not None else Patch()
+        show_ids = 'show_ids' in (display_options or ['show_ids'])
+        show_coords = 'show_coords' in (display_options or [])
+        for index in indices:
+            if index is None or not 0 <= index < len(annotations):
+                continue
+            ann = annotations[index]
+            patched['layout']['shapes'][index] = self.figure_generator.shape_for(
+                index, ann, img_dims['width'], img_dims['height'], opacity, selected_id
+            )
+            center_x, center_y = self.figure_generator.center_for(ann, img_dims['width'], img_dims['height'])
+            patched['data'][0]['x'][index] = center_x
+            patched['data'][0]['y'][index] = center_y
+            if show_ids or show_coords:
+                patched['layout']['annotations'][index] = self.figure_generator.label_for(
+                    index, ann, img_dims['width'], img_dims['height'], show_ids, show_coords
+                )
+        return patched
+    
     def _handle_new_shape(self, new_shape, annotations, img_dims, image_data, 
                          selected_class, opacity, display_options):
         """Manejar creación de nueva forma"""
@@ -212,7 +286,8 @@ class CallbackManager:
             
             print("DEBUG: Figura regenerada exitosamente")
             
-            return new_annotations, fig, True, f"✅ Nueva caja: {self.classes[selected_class]} - Guardado automático"
+            warning = self.duplicate_warning(new_annotations, img_dims, image_data['filename'], len(new_annotations) - 1)
+            return new_annotations, fig, True, f"✅ Nueva caja: {self.classes[selected_class]} - Guardado automático{warning}"
             
         except Exception as e:
             print(f"ERROR COMPLETO creando nueva anotación: {str(e)}")
@@ -220,102 +295,135 @@ class CallbackManager:
             traceback.print_exc()
             return annotations, no_update, True, f"❌ Error creando caja: {str(e)}"
     
-    def _handle_shape_edit(self, shapes, annotations, img_dims, image_data, opacity, display_options):
-        """Manejar edición de formas existentes"""
+    def _handle_shape_edit(self, deltas, annotations, img_dims, image_data, opacity, display_options,
+                           selected_id=None, group=None):
+        """Manejar edición de formas existentes: solo se convierten y redibujan las cajas tocadas"""
         try:
-            # Guardar estado para undo ANTES de hacer cualquier cambio
+            # Arrastrar una caja de la selección múltiple mueve todo el grupo (un solo guardado y un solo deshacer)
+            deltas = self.edit_engine.expand_group_move(deltas, annotations, img_dims, group)
+            if group:
+                selected_id = group
+            updated_annotations, changed = self.edit_engine.apply(deltas, annotations, img_dims)
+            if not changed:
+                # Cambio rechazado (caja demasiado pequeña) o insignificante: devolver las shapes a su sitio
+                return annotations, self.patch_shapes(deltas, annotations, img_dims, opacity,
+                                                      display_options, selected_id), False, ""
+            
+            # Guardar estado para undo antes de persistir el cambio
             self.undo_manager.push_state(image_data['filename'], annotations)
-            
-            updated_annotations = []
-            changes_made = False
-            
-            print(f"DEBUG: Editando {len(shapes)} shapes, {len(annotations)} annotations")
-            
-            for i, (shape, ann) in enumerate(zip(shapes, annotations)):
-                print(f"DEBUG: Procesando shape {i}: {shape}")
-                
-                # Obtener coordenadas de la shape editada
-                x0 = min(shape['x0'], shape['x1'])
-                x1 = max(shape['x0'], shape['x1'])
-                y0 = min(shape['y0'], shape['y1'])
-                y1 = max(shape['y0'], shape['y1'])
-                
-                print(f"DEBUG: Coordenadas pixel: x0={x0}, y0={y0}, x1={x1}, y1={y1}")
-                
-                # Convertir coordenadas Y
-                y0_img = img_dims['height'] - y1
-                y1_img = img_dims['height'] - y0
-                
-                print(f"DEBUG: Coordenadas convertidas: x0={x0}, y0_img={y0_img}, x1={x1}, y1_img={y1_img}")
-                
-                # Validar tamaño mínimo
-                if self.converter.validate_pixel_coords(x0, y0_img, x1, y1_img, min_size=5):
-                    # Convertir a YOLO
-                    x_center, y_center, width, height = self.converter.pixel_to_yolo(
-                        x0, y0_img, x1, y1_img, img_dims['width'], img_dims['height']
-                    )
-                    
-                    print(f"DEBUG: Nuevas coordenadas YOLO: center=({x_center:.6f}, {y_center:.6f}), size=({width:.6f}, {height:.6f})")
-                    print(f"DEBUG: Coordenadas anteriores: center=({ann['x_center']:.6f}, {ann['y_center']:.6f}), size=({ann['width']:.6f}, {ann['height']:.6f})")
-                    
-                    # Verificar si hubo cambios (tolerancia muy pequeña)
-                    x_change = abs(ann['x_center'] - x_center)
-                    y_change = abs(ann['y_center'] - y_center)
-                    w_change = abs(ann['width'] - width)
-                    h_change = abs(ann['height'] - height)
-                    
-                    print(f"DEBUG: Cambios calculados: dx={x_change:.8f}, dy={y_change:.8f}, dw={w_change:.8f}, dh={h_change:.8f}")
-                    
-                    if (x_change > 0.00001 or y_change > 0.00001 or w_change > 0.00001 or h_change > 0.00001):
-                        changes_made = True
-                        print(f"DEBUG: ¡CAMBIOS DETECTADOS en anotación {i}!")
-                        print(f"  Anterior: center=({ann['x_center']:.6f}, {ann['y_center']:.6f}), size=({ann['width']:.6f}, {ann['height']:.6f})")
-                        print(f"  Nuevo: center=({x_center:.6f}, {y_center:.6f}), size=({width:.6f}, {height:.6f})")
-                    else:
-                        print(f"DEBUG: No hay cambios significativos en anotación {i}")
-                    
-                    # Actualizar anotación
-                    updated_ann = ann.copy()
-                    updated_ann['x_center'] = x_center
-                    updated_ann['y_center'] = y_center
-                    updated_ann['width'] = width
-                    updated_ann['height'] = height
-                    updated_annotations.append(updated_ann)
-                else:
-                    # Mantener anotación original si es muy pequeña
-                    print(f"DEBUG: Shape {i} demasiado pequeña, manteniendo original")
-                    updated_annotations.append(ann)
-            
-            # Solo guardar si algo cambió
-            if changes_made:
-                print(f"DEBUG: ¡GUARDANDO CAMBIOS! para imagen {image_data['filename']}")
-                
-                # Guardar automáticamente
-                try:
-                    self.annotation_manager.save_annotations(image_data['filename'], updated_annotations)
-                    print("DEBUG: ¡Guardado exitoso!")
-                except Exception as save_error:
-                    print(f"ERROR guardando automáticamente: {save_error}")
-                
-                # Regenerar figura
-                show_ids = 'show_ids' in (display_options or ['show_ids'])
-                show_coords = 'show_coords' in (display_options or [])
-                fig, _ = self.figure_generator.create_figure_with_annotations(
-                    image_data['filename'], updated_annotations, opacity, show_ids, show_coords
-                )
-                
-                return updated_annotations, fig, True, "✏️ Caja editada - Guardado automático"
-            else:
-                print("DEBUG: NO hay cambios que guardar")
-            
+            try:
+                self.annotation_manager.save_annotations(image_data['filename'], updated_annotations)
+            except Exception as save_error:
+                print(f"ERROR guardando automáticamente: {save_error}")
+            
+            # Patch: solo viajan las shapes y etiquetas de las cajas editadas
+            patched = self.patch_shapes(changed, updated_annotations, img_dims, opacity,
+                                        display_options, selected_id)
+            
+            # El índice espacial solo reubica las cajas editadas
+            with self.spatial_index(updated_annotations, img_dims, image_data['filename']):
+                pass
+            message = "✏️ Caja editada" if len(changed) == 1 else f"✏️ {len(changed)} cajas editadas"
+            if len(changed) == 1:
+                message += self.duplicate_warning(updated_annotations, img_dims, image_data['filename'], changed[0])
+            return updated_annotations, patched, True, f"{message} - Guardado automático"
+        
         except Exception as e:
             print(f"ERROR editando anotación: {str(e)}")
             import traceback
             traceback.print_exc()
             return annotations, no_update, True, f"❌ Error editando: {str(e)}"
-        
-        return annotations, no_update, False, ""
-    
+
+    def handle_keyboard_edits(self, batch, annotations, img_dims, image_data, opacity, display_options,
+                              selected_id=None):
+        """Aplicar un lote del registro de ediciones del navegador (un guardado y un deshacer por lote)
+
+        El lote es {'seq', 'filename', 'base', 'edits': {índice: {class_id?, x0?, y0?, x1?, y1?}}} con
+        coordenadas del gráfico y 'base' la versión de la etiqueta de la que partió el navegador. Las ediciones
+        son valores absolutos, así que reenviar un lote ya aplicado no cambia nada. Devuelve (anotaciones,
+        figura, confirmación {'seq', 'filename', 'version', 'status'}, abrir aviso, mensaje). Con 'status' 'error'
+        el navegador conserva el lote en su registro y lo reintenta."""
+        seq = batch.get('seq', 0)
+        edits = {int(k): v for k, v in (batch.get('edits') or {}).items()}
+        filename = batch.get('filename')
+        if not edits or not filename:
+            return no_update, no_update, {'seq': seq, 'filename': filename, 'status': 'ok'}, False, ""
+
+        current = image_data.get('filename') if image_data else None
+        if self.annotation_manager.has_conflict(filename, batch.get('base')):
+            # La etiqueta cambió fuera del editor mientras el lote esperaba: se descarta y se muestra lo del disco
+            ack = {'seq': seq, 'filename': filename, 'status': 'conflict',
+                   'version': self.annotation_manager.label_version(filename)}
+            message = f"⚠️ Conflicto: {filename} cambió fuera del editor; se descartaron {len(edits)} ediciones"
+            if filename != current:
+                return no_update, no_update, ack, True, message
+            disk_annotations = self.annotation_manager.load_annotations(filename)
+            show_ids = 'show_ids' in (display_options or ['show_ids'])
+            show_coords = 'show_coords' in (display_options or [])
+            fig, _ = self.figure_generator.create_figure_with_annotations(
+                filename, disk_annotations, opacity, show_ids, show_coords
+            )
+            return disk_annotations, fig, ack, True, message
+
+        if filename != current:
+            # El lote llegó después de cambiar de imagen: se aplica sobre las etiquetas guardadas de su imagen
+            annotations = self.annotation_manager.load_annotations(filename)
+            width, height = self.figure_generator.image_size(filename)
+            img_dims = {'width': width, 'height': height}
+
+        try:
+            deltas = {i: {c: e[c] for c in ShapeEditEngine.COORDS if c in e} for i, e in edits.items()}
+            updated, changed = self.edit_engine.apply({i: d for i, d in deltas.items() if d}, annotations, img_dims)
+            changed = set(changed)
+            for index, edit in edits.items():
+                new_class = edit.get('class_id')
+                if new_class is None or not 0 <= index < len(updated) or not 0 <= int(new_class) < len(self.classes):
+                    continue
+                new_class = int(new_class)
+                if updated[index]['class_id'] != new_class:
+                    updated[index] = dict(updated[index], **{'class': new_class, 'class_id': new_class,
+                                                             'class_name': self.classes[new_class]})
+                    changed.add(index)
+            changed = sorted(changed)
+
+            if changed:
+                self.undo_manager.push_state(filename, annotations)
+                try:
+                    self.annotation_manager.save_annotations(filename, updated)
+                except Exception as save_error:
+                    print(f"ERROR guardando cambios de teclado: {save_error}")
+                    # Nada quedó guardado: sin entrada de deshacer y el navegador reintenta el lote
+                    self.undo_manager.pop_state(filename)
+                    return no_update, no_update, {'seq': seq, 'filename': filename, 'status': 'error'}, True, \
+                        f"❌ Error guardando {filename}: {save_error}; se reintentará"
+            ack = {'seq': seq, 'filename': filename, 'status': 'ok',
+                   'version': self.annotation_manager.label_version(filename)}
+
+            if filename != current:
+                if not changed:
+                    return no_update, no_update, ack, False, ""
+                return no_update, no_update, ack, True, f"⌨️ {len(changed)} cajas guardadas en {filename}"
+            if not changed:
+                # Nada aplicable (caja demasiado pequeña) o ya aplicado: dejar las cajas como las tiene el servidor
+                return no_update, self.patch_shapes(sorted(edits), annotations, img_dims, opacity,
+                                                    display_options, selected_id), ack, False, ""
+
+            # El navegador ya dibujó el cambio; el Patch deja la figura del servidor igual que la local
+            patched = self.patch_shapes(sorted(set(changed) | set(edits)), updated, img_dims, opacity,
+                                        display_options, selected_id)
+            for index in changed:
+                patched['data'][0]['marker']['color'][index] = self.figure_generator.class_style(
+                    updated[index]['class_id'])['color']
+            with self.spatial_index(updated, img_dims, filename):
+                pass
+            message = "⌨️ Caja editada" if len(changed) == 1 else f"⌨️ {len(changed)} cajas editadas"
+            return updated, patched, ack, False, f"{message} - Guardado automático"
+
+        except Exception as e:
+            print(f"ERROR aplicando ediciones de teclado: {str(e)}")
+            return no_update, no_update, {'seq': seq, 'filename': filename, 'status': 'error'}, True, \
+                f"❌ Error editando: {str(e)}"
+
     def handle_delete_annotation(self, delete_clicks, annotations, image_data, opacity, display_options):
         """Eliminar anotación específica"""
         if not any(delete_clicks or []) or not ctx.triggered:
@@ -537,15 +645,9 @@ class CallbackManager:
             return no_update, no_update, False, ""
         
         try:
-            # Recuperar estado anterior del stack de undo
-            previous_state = self.undo_manager.pop_state()
+            # Recuperar el último estado de esta imagen (las acciones en otras imágenes se conservan)
+            previous_state = self.undo_manager.pop_state(image_data['filename'])
             if not previous_state:
-                return no_update, no_update, True, "⚠️ No hay acciones para deshacer"
-            
-            # Verificar que sea para la imagen correcta
-            if previous_state['image_filename'] != image_data['filename']:
-                # Si no es la misma imagen, devolver el estado al stack
-                self.undo_manager.undo_stack.append(previous_state)
                 return no_update, no_update, True, "⚠️ No hay acciones para deshacer en esta imagen"
             
             # Restaurar anotaciones
@@ -564,7 +666,138 @@ class CallbackManager:
             except Exception as save_error:
                 print(f"Error guardando automáticamente: {save_error}")
             
-            return annotations, fig, True, f"↶ Acción deshecha - {self.undo_manager.get_undo_count()} deshacer restantes"
+            return annotations, fig, True, f"↶ Acción deshecha - {self.undo_manager.get_undo_count(image_data['filename'])} deshacer restantes"
             
         except Exception as e:
             return no_update, no_update, True, f"❌ Error deshaciendo: {str(e)}"
+    
+    @staticmethod
+    def _unlabeled_suggestions(suggestions, annotations, iou_threshold=0.5):
+        """Descartar sugerencias que ya coinciden con una anotación existente"""
+        if not suggestions or not annotations:
+            return suggestions
+        keys = ['x_center', 'y_center', 'width', 'height']
+        new = LabelIO.yolo_to_xyxy([[s[k] for k in keys] for s in suggestions])
+        old = LabelIO.yolo_to_xyxy([[a[k] for k in keys] for a in annotations])
+        inter_w = np.clip(np.minimum(new[:, None, 2], old[None, :, 2]) - np.maximum(new[:, None, 0], old[None, :, 0]), 0, None)
+        inter_h = np.clip(np.minimum(new[:, None, 3], old[None, :, 3]) - np.maximum(new[:, None, 1], old[None, :, 1]), 0, None)
+        inter = inter_w * inter_h
+        area_new = (new[:, 2] - new[:, 0]) * (new[:, 3] - new[:, 1])
+        area_old = (old[:, 2] - old[:, 0]) * (old[:, 3] - old[:, 1])
+        iou = inter / np.maximum(area_new[:, None] + area_old[None, :] - inter, 1e-12)
+        return [s for s, overlap in zip(suggestions, iou.max(axis=1)) if overlap <= iou_threshold]
+    
+    def handle_suggest_boxes(self, suggest_clicks, annotations, image_data, opacity, display_options):
+        """Pedir sugerencias al detector para la imagen actual y mostrarlas como pendientes"""
+        if not suggest_clicks or not image_data:
+            return no_update, False, ""
+        if self.suggestion_service is None:
+            return no_update, True, "⚠️ No hay detector configurado (use --detector)"
+        
+        try:
+            suggestions = self.suggestion_service.get(image_data['filename'])
+        except Exception as e:
+            return no_update, True, f"❌ {str(e)}"
+        
+        suggestions = [s for s in suggestions if 0 <= s['class_id'] < len(self.classes)]
+        suggestions = self._unlabeled_suggestions(suggestions, annotations or [])
+        self.figure_generator.set_suggestions(image_data['filename'], suggestions)
+        
+        show_ids = 'show_ids' in (display_options or ['show_ids'])
+        show_coords = 'show_coords' in (display_options or [])
+        fig, _ = self.figure_generator.create_figure_with_annotations(
+            image_data['filename'], annotations or [], opacity, show_ids, show_coords
+        )
+        if not suggestions:
+            return fig, True, "ℹ️ El detector no encontró cajas nuevas"
+        return fig, True, f"💡 {len(suggestions)} sugerencias • Clic en el punto central para aceptar una"
+    
+    def handle_resolve_suggestions(self, accept_indices, annotations, image_data, opacity, display_options):
+        """Aceptar las sugerencias indicadas (None = todas) o descartarlas ([]); el resto sigue pendiente"""
+        if not image_data:
+            return no_update, no_update, False, ""
+        
+        filename = image_data['filename']
+        pending = self.figure_generator.get_suggestions(filename)
+        if not pending:
+            return no_update, no_update, True, "⚠️ No hay sugerencias pendientes"
+        
+        annotations = annotations or []
+        if accept_indices is not None and not accept_indices:
+            # Descartar todas
+            remaining, new_annotations, message = [], annotations, "🚫 Sugerencias descartadas"
+        else:
+            accept = set(range(len(pending))) if accept_indices is None else set(accept_indices)
+            self.undo_manager.push_state(filename, annotations)
+            accepted = [pending[i] for i in sorted(accept) if 0 <= i < len(pending)]
+            remaining = [s for i, s in enumerate(pending) if i not in accept]
+            new_annotations = annotations + [
+                {
+                    'id': len(annotations) + i,
+                    'class_id': s['class_id'],
+                    'class_name': self.classes[s['class_id']],
+                    'x_center': s['x_center'],
+                    'y_center': s['y_center'],
+                    'width': s['width'],
+                    'height': s['height']
+                }
+                for i, s in enumerate(accepted)
+            ]
+            try:
+                self.annotation_manager.save_annotations(filename, new_annotations)
+            except Exception as save_error:
+                print(f"Error guardando automáticamente: {save_error}")
+            message = f"✅ {len(accepted)} sugerencias aceptadas - Guardado automático"
+        
+        self.figure_generator.set_suggestions(filename, remaining)
+        show_ids = 'show_ids' in (display_options or ['show_ids'])
+        show_coords = 'show_coords' in (display_options or [])
+        fig, _ = self.figure_generator.create_figure_with_annotations(
+            filename, new_annotations, opacity, show_ids, show_coords
+        )
+        return new_annotations, fig, True, message
+    
+    def handle_propagate_previous(self, propagate_clicks, prev_filename, annotations, image_data,
+                                  opacity, display_options):
+        """Traer las anotaciones del frame anterior, reajustadas con template matching"""
+        if not propagate_clicks or not image_data:
+            return no_update, no_update, False, ""
+        if self.box_propagator is None or prev_filename is None:
+            return no_update, no_update, True, "⚠️ No hay frame anterior desde el que propagar"
+        
+        try:
+            previous = self.annotation_manager.load_annotations(prev_filename)
+            if not previous:
+                return no_update, no_update, True, "⚠️ El frame anterior no tiene anotaciones"
+            
+            propagated, scores = self.box_propagator.propagate(prev_filename, image_data['filename'], previous)
+            annotations = annotations or []
+            # No duplicar cajas que ya existen en el frame actual
+            kept = self._unlabeled_suggestions(propagated, annotations)
+            if not kept:
+                return no_update, no_update, True, "ℹ️ Todas las cajas del frame anterior ya están anotadas"
+            
+            self.undo_manager.push_state(image_data['filename'], annotations)
+            new_annotations = annotations + kept
+            for i, ann in enumerate(new_annotations):
+                ann['id'] = i
+            
+            try:
+                self.annotation_manager.save_annotations(image_data['filename'], new_annotations)
+            except Exception as save_error:
+                print(f"Error guardando automáticamente: {save_error}")
+            
+            show_ids = 'show_ids' in (display_options or ['show_ids'])
+            show_coords = 'show_coords' in (display_options or [])
+            fig, _ = self.figure_generator.create_figure_with_annotations(
+                image_data['filename'], new_annotations, opacity, show_ids, show_coords
+            )
+            low = sum(1 for score in scores if score < self.box_propagator.min_score)
+            message = f"⏩ {len(kept)} cajas propagadas desde el frame anterior"
+            if low:
+                message += f" ({low} sin coincidencia clara: revisar)"
+            return new_annotations, fig, True, message
+        
+        except Exception as e:
+            print(f"ERROR propagando anotaciones: {e}")
+            return no_update, no_update, True, f"❌ Error propagando: {str(e)}"
@@ -0,0 +1,251 @@
+"""
+Módulo para reorganizar datasets entre el layout de autodistill (train/valid) y images/ + annotations/
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .label_io import LabelIO
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class DatasetLayout:
+    """Clase para fusionar/separar splits con resolución de nombres O(1), diario y rollback"""
+
+    SPLITS = ("train", "valid", "test")
+
+    def __init__(self, dataset_path, num_workers=8):
+        self.dataset_path = dataset_path
+        self.images_path = os.path.join(dataset_path, "images")
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.num_workers = num_workers
+        self._journal_lock = threading.Lock()
+
+    @staticmethod
+    def _scan(directory, extensions=None):
+        """Listar archivos de un directorio con un único scandir (vacío si no existe)"""
+        if not os.path.isdir(directory):
+            return []
+        with os.scandir(directory) as entries:
+            return sorted(
+                e.name for e in entries
+                if e.is_file() and not e.name.startswith('.')
+                and (extensions is None or e.name.lower().endswith(extensions))
+            )
+
+    @staticmethod
+    def _unique_stem(stem, tag, taken):
+        """Resolver colisiones contra un conjunto precalculado (sin sondear el disco)"""
+        if stem not in taken:
+            return stem
+        base = f"{stem}_{tag}" if tag else stem
+        candidate, i = base, 0
+        while candidate in taken:
+            i += 1
+            candidate = f"{base}_{i}"
+        return candidate
+
+    def plan_merge(self, splits=SPLITS):
+        """Planificar la fusión de <split>/images y <split>/labels en images/ + annotations/"""
+        taken = {os.path.splitext(n)[0] for n in self._scan(self.images_path)}
+        taken |= {os.path.splitext(n)[0] for n in self._scan(self.labels_path)}
+
+        plan = []
+        for split in splits:
+            split_images = os.path.join(self.dataset_path, split, "images")
+            split_labels = os.path.join(self.dataset_path, split, "labels")
+            images = self._scan(split_images, IMAGE_EXTENSIONS)
+            labels = {os.path.splitext(n)[0]: n for n in self._scan(split_labels, (LabelIO.LABEL_EXTENSION,))}
+
+            # Imagen y etiqueta reciben siempre el mismo nombre final
+            for image_name in images:
+                stem, ext = os.path.splitext(image_name)
+                new_stem = self._unique_stem(stem, split, taken)
+                taken.add(new_stem)
+                plan.append((os.path.join(split_images, image_name),
+                             os.path.join(self.images_path, new_stem + ext)))
+                label_name = labels.pop(stem, None)
+                if label_name:
+                    plan.append((os.path.join(split_labels, label_name),
+                                 os.path.join(self.labels_path, new_stem + LabelIO.LABEL_EXTENSION)))
+
+            # Etiquetas sin imagen: se mueven igual para no perderlas
+            for stem, label_name in labels.items():
+                new_stem = self._unique_stem(stem, split, taken)
+                taken.add(new_stem)
+                plan.append((os.path.join(split_labels, label_name),
+                             os.path.join(self.labels_path, new_stem + LabelIO.LABEL_EXTENSION)))
+        return plan
+
+    def plan_split(self, split_of_stem, default_split=None):
+        """Planificar el paso de images/ + annotations/ a <split>/images y <split>/labels"""
+        plan = []
+        labels = {os.path.splitext(n)[0]: n for n in self._scan(self.labels_path, (LabelIO.LABEL_EXTENSION,))}
+        for image_name in self._scan(self.images_path, IMAGE_EXTENSIONS):
+            stem = os.path.splitext(image_name)[0]
+            split = split_of_stem.get(stem, default_split)
+            if split is None:
+                continue
+            plan.append((os.path.join(self.images_path, image_name),
+                         os.path.join(self.dataset_path, split, "images", image_name)))
+            if stem in labels:
+                plan.append((os.path.join(self.labels_path, labels[stem]),
+                             os.path.join(self.dataset_path, split, "labels", labels[stem])))
+        return plan
+
+    @staticmethod
+    def _same_device(src_dir, dst_dir):
+        """Comprobar si origen y destino están en el mismo sistema de archivos"""
+        try:
+            return os.stat(src_dir).st_dev == os.stat(dst_dir).st_dev
+        except OSError:
+            return False
+
+    def _journal(self, journal_file, src, dst, method):
+        """Registrar una operación completada"""
+        if journal_file is None:
+            return
+        with self._journal_lock:
+            journal_file.write(json.dumps({'src': src, 'dst': dst, 'method': method}) + "\n")
+            # Si el proceso muere a mitad, el diario ya tiene todo lo movido hasta ahí
+            journal_file.flush()
+
+    def _transfer_local(self, src, dst, mode):
+        """Operación en el mismo sistema de archivos: rename o hardlink (nunca se pisa un destino existente)"""
+        try:
+            # link falla si dst ya existe; os.rename lo sobrescribiría sin avisar
+            os.link(src, dst)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Sistema de archivos sin hardlinks
+            if os.path.exists(dst):
+                raise FileExistsError(f"El destino ya existe: {dst}")
+            if mode == "move":
+                os.rename(src, dst)
+                return "rename"
+            shutil.copy2(src, dst)
+            return "copy"
+        if mode == "move":
+            os.remove(src)
+            return "rename"
+        return "link"
+
+    @staticmethod
+    def _transfer_remote(src, dst, mode):
+        """Operación entre dispositivos: copia (y borrado del origen si se mueve)"""
+        if os.path.exists(dst):
+            raise FileExistsError(f"El destino ya existe: {dst}")
+        shutil.copy2(src, dst)
+        if mode == "move":
+            os.remove(src)
+            return "copy_move"
+        return "copy"
+
+    def execute(self, plan, mode="move", dry_run=False, journal_path=None):
+        """Ejecutar un plan (mode='move' o 'link'); devuelve la ruta del diario para rollback"""
+        summary = {'files': len(plan), 'local': 0, 'remote': 0}
+        if not plan:
+            print("ℹ️ No hay archivos que reorganizar")
+            return None
+
+        collisions = [dst for _, dst in plan if os.path.exists(dst)]
+        if collisions:
+            raise FileExistsError(f"{len(collisions)} destinos ya existen (p. ej. {collisions[0]}); "
+                                  f"no se movió nada")
+
+        for directory in {os.path.dirname(dst) for _, dst in plan}:
+            if not dry_run:
+                os.makedirs(directory, exist_ok=True)
+
+        device_cache = {}
+        local, remote = [], []
+        for src, dst in plan:
+            key = (os.path.dirname(src), os.path.dirname(dst))
+            if key not in device_cache:
+                device_cache[key] = dry_run or self._same_device(*key)
+            (local if device_cache[key] else remote).append((src, dst))
+        summary['local'], summary['remote'] = len(local), len(remote)
+
+        if dry_run:
+            for src, dst in plan[:20]:
+                print(f"   {src} -> {dst}")
+            if len(plan) > 20:
+                print(f"   ... y {len(plan) - 20} más")
+            print(f"🔍 Simulación: {len(plan)} archivos ({mode})")
+            return None
+
+        journal_path = journal_path or os.path.join(
+            self.dataset_path, f"layout_journal_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        start = time.perf_counter()
+        with open(journal_path, 'a', encoding='utf-8') as journal_file:
+            # Renames/hardlinks son llamadas de metadatos: secuenciales son lo más rápido
+            for src, dst in local:
+                method = self._transfer_local(src, dst, mode)
+                self._journal(journal_file, src, dst, method)
+
+            # Las copias entre dispositivos sí se benefician de varios hilos
+            def _remote(pair):
+                src, dst = pair
+                method = self._transfer_remote(src, dst, mode)
+                self._journal(journal_file, src, dst, method)
+
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                list(executor.map(_remote, remote))
+
+        print(f"✅ Reorganizados {len(plan)} archivos ({summary['local']} locales, "
+              f"{summary['remote']} entre dispositivos) en {time.perf_counter() - start:.1f}s")
+        print(f"📝 Diario para rollback: {journal_path}")
+        return journal_path
+
+    def _remove_empty_dirs(self, splits):
+        """Eliminar las carpetas de split solo si quedaron vacías (nunca rmtree)"""
+        for split in splits:
+            split_dir = os.path.join(self.dataset_path, split)
+            if not os.path.isdir(split_dir):
+                continue
+            for root, _, _ in sorted(os.walk(split_dir), key=lambda w: len(w[0]), reverse=True):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+    def merge_splits(self, splits=SPLITS, mode="move", dry_run=False):
+        """Fusionar train/valid/test en images/ + annotations/"""
+        plan = self.plan_merge(splits)
+        journal_path = self.execute(plan, mode=mode, dry_run=dry_run)
+        if journal_path and mode == "move":
+            self._remove_empty_dirs(splits)
+        return journal_path
+
+    def split_into(self, split_of_stem, default_split=None, mode="move", dry_run=False):
+        """Separar images/ + annotations/ en carpetas <split>/images y <split>/labels"""
+        return self.execute(self.plan_split(split_of_stem, default_split), mode=mode, dry_run=dry_run)
+
+    def rollback(self, journal_path):
+        """Deshacer las operaciones registradas en un diario (en orden inverso)"""
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        restored = 0
+        for record in reversed(records):
+            src, dst, method = record['src'], record['dst'], record['method']
+            if not os.path.exists(dst):
+                continue
+            if method in ("rename", "copy_move"):
+                os.makedirs(os.path.dirname(src), exist_ok=True)
+                shutil.move(dst, src)
+            else:
+                # link/copy: el origen sigue intacto, basta con quitar el destino
+                os.remove(dst)
+            restored += 1
+
+        os.replace(journal_path, journal_path + ".rolledback")
+        print(f"↶ Rollback completado: {restored} archivos restaurados")
+        return restored
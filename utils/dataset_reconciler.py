@@ -0,0 +1,115 @@
+"""
+Módulo para detectar y resolver desajustes entre images/ y las carpetas de etiquetas
+"""
+import json
+import os
+import time
+from collections import defaultdict
+
+from .label_io import LabelIO
+from .label_index import IMAGE_EXTENSIONS
+
+
+class DatasetReconciler:
+    """Clase para cruzar los stems de images/ con annotations/ (y detections/) con un scandir por carpeta"""
+
+    LABEL_FOLDERS = ("annotations", "detections")
+    ORPHANS_FOLDER = "_orphans"
+
+    def __init__(self, dataset_path):
+        self.dataset_path = dataset_path
+        self.images_path = os.path.join(dataset_path, "images")
+        self.orphans_path = os.path.join(dataset_path, self.ORPHANS_FOLDER)
+
+        self.image_files = []
+        self.label_files = {}
+        self.orphan_labels = {}
+        self.unlabeled_images = []
+        self.duplicate_stems = {}
+
+    @staticmethod
+    def _list_names(directory, extensions):
+        """Nombres de archivo con esas extensiones (solo entry.name: sin stat por archivo)"""
+        if not os.path.isdir(directory):
+            return []
+        with os.scandir(directory) as entries:
+            return [entry.name for entry in entries
+                    if not entry.name.startswith('.') and entry.name.lower().endswith(extensions)]
+
+    def scan(self):
+        """Indexar los stems de cada lado y calcular huérfanos y duplicados"""
+        self.image_files = sorted(self._list_names(self.images_path, IMAGE_EXTENSIONS))
+        images_by_stem = defaultdict(list)
+        for image_file in self.image_files:
+            images_by_stem[os.path.splitext(image_file)[0]].append(image_file)
+
+        # Mismo stem con varias extensiones (.png y .jpg): comparten un único .txt
+        self.duplicate_stems = {stem: files for stem, files in images_by_stem.items() if len(files) > 1}
+
+        self.label_files, self.orphan_labels = {}, {}
+        for folder in self.LABEL_FOLDERS:
+            names = self._list_names(os.path.join(self.dataset_path, folder), (LabelIO.LABEL_EXTENSION,))
+            self.label_files[folder] = sorted(names)
+            self.orphan_labels[folder] = sorted(n for n in names if os.path.splitext(n)[0] not in images_by_stem)
+
+        label_stems = {os.path.splitext(n)[0] for n in self.label_files["annotations"]}
+        self.unlabeled_images = [f for f in self.image_files if os.path.splitext(f)[0] not in label_stems]
+        return self
+
+    def summary(self):
+        """Conteos del último scan"""
+        return {
+            'images': len(self.image_files),
+            'labels': len(self.label_files.get("annotations", [])),
+            'orphan_labels': sum(len(v) for v in self.orphan_labels.values()),
+            'unlabeled_images': len(self.unlabeled_images),
+            'duplicate_stems': len(self.duplicate_stems),
+        }
+
+    def startup_check(self):
+        """Aviso breve al arrancar el editor (no modifica nada)"""
+        summary = self.summary()
+        if summary['orphan_labels'] or summary['duplicate_stems']:
+            print(f"⚠️ Dataset desajustado: {summary['orphan_labels']} etiquetas sin imagen, "
+                  f"{summary['duplicate_stems']} stems con varias imágenes "
+                  f"(python dataset_tools.py reconcile --dataset {self.dataset_path})")
+        return summary
+
+    def report(self):
+        """Imprimir el detalle del último scan"""
+        summary = self.summary()
+        print(f"🔗 {summary['images']} imágenes, {summary['labels']} etiquetas, "
+              f"{summary['unlabeled_images']} imágenes sin etiqueta")
+        for folder, names in self.orphan_labels.items():
+            if names:
+                preview = ", ".join(names[:5]) + (" ..." if len(names) > 5 else "")
+                print(f"   ⚠️ {folder}/: {len(names)} sin imagen ({preview})")
+        for stem, files in list(self.duplicate_stems.items())[:10]:
+            print(f"   ⚠️ {stem}: {', '.join(files)} comparten {LabelIO.label_filename(files[0])}")
+        if len(self.duplicate_stems) > 10:
+            print(f"   ... y {len(self.duplicate_stems) - 10} stems duplicados más")
+        return summary
+
+    def move_orphans(self, dry_run=False):
+        """Mover las etiquetas sin imagen a _orphans/<carpeta>/ (no se borra nada); el diario admite reorganize --rollback"""
+        moved = []
+        for folder, names in self.orphan_labels.items():
+            if not names:
+                continue
+            target_dir = os.path.join(self.orphans_path, folder)
+            if not dry_run:
+                os.makedirs(target_dir, exist_ok=True)
+            for name in names:
+                src = os.path.join(self.dataset_path, folder, name)
+                dst = os.path.join(target_dir, name)
+                if not dry_run:
+                    os.replace(src, dst)
+                moved.append({'src': src, 'dst': dst, 'method': 'rename'})
+
+        if moved and not dry_run:
+            journal_path = os.path.join(self.orphans_path, f"orphans_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+            with open(journal_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in moved)
+        action = "se moverían" if dry_run else "movidas"
+        print(f"📦 {len(moved)} etiquetas huérfanas {action} a {self.orphans_path}")
+        return moved
@@ -0,0 +1,182 @@
+"""
+Módulo para re-filtrar detecciones guardadas (umbral de confianza + NMS) sin repetir inferencia
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .label_io import LabelIO
+from .labeling_runner import LabelingRunner
+
+
+class DetectionRefilter:
+    """Clase para regenerar annotations/ desde detections/ con nuevos umbrales y NMS por clase"""
+
+    STATE_FILENAME = "_refilter_state.json"
+
+    def __init__(self, dataset_path, num_workers=8):
+        self.dataset_path = dataset_path
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.detections_path = os.path.join(dataset_path, "detections")
+        self.state_path = os.path.join(self.detections_path, self.STATE_FILENAME)
+        self.num_workers = num_workers
+
+        self.stems = []
+        self.frame_idx = np.zeros(0, dtype=np.int64)
+        self.class_ids = np.zeros(0, dtype=np.int64)
+        self.boxes = np.zeros((0, 4))
+        self.scores = np.zeros(0)
+
+    def load(self):
+        """Cargar todas las detecciones del dataset en arrays concatenados"""
+        with os.scandir(self.detections_path) as entries:
+            filenames = sorted(
+                e.name for e in entries
+                if e.is_file() and e.name.endswith(LabelIO.LABEL_EXTENSION) and not e.name.startswith('.')
+            )
+
+        paths = [os.path.join(self.detections_path, name) for name in filenames]
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            arrays = list(executor.map(lambda path: LabelIO.read_array(path, num_columns=6), paths))
+
+        self.stems = [os.path.splitext(name)[0] for name in filenames]
+        counts = np.array([len(a) for a in arrays], dtype=np.int64)
+        data = np.concatenate(arrays) if arrays else np.zeros((0, 6))
+
+        self.frame_idx = np.repeat(np.arange(len(arrays)), counts)
+        self.class_ids = data[:, 0].astype(np.int64)
+        self.boxes = data[:, 1:5]
+        self.scores = data[:, 5]
+        print(f"📦 Detecciones cargadas: {len(self.scores)} cajas en {len(self.stems)} frames")
+        return self
+
+    @staticmethod
+    def _nms_batched(boxes, iou_threshold):
+        """NMS greedy sobre G grupos del mismo tamaño a la vez; boxes (G, K, 4) ordenadas por score"""
+        xyxy = LabelIO.yolo_to_xyxy(boxes.reshape(-1, 4)).reshape(boxes.shape)
+        areas = (xyxy[..., 2] - xyxy[..., 0]) * (xyxy[..., 3] - xyxy[..., 1])
+
+        ix0 = np.maximum(xyxy[:, :, None, 0], xyxy[:, None, :, 0])
+        iy0 = np.maximum(xyxy[:, :, None, 1], xyxy[:, None, :, 1])
+        ix1 = np.minimum(xyxy[:, :, None, 2], xyxy[:, None, :, 2])
+        iy1 = np.minimum(xyxy[:, :, None, 3], xyxy[:, None, :, 3])
+        inter = np.clip(ix1 - ix0, 0, None) * np.clip(iy1 - iy0, 0, None)
+        suppress = inter / np.maximum(areas[:, :, None] + areas[:, None, :] - inter, 1e-12) > iou_threshold
+
+        keep = np.ones(boxes.shape[:2], dtype=bool)
+        for i in range(boxes.shape[1] - 1):
+            # Una caja aceptada suprime a las de menor score que solapan con ella
+            keep[:, i + 1:] &= ~(keep[:, i:i + 1] & suppress[:, i, i + 1:])
+        return keep
+
+    def select(self, confidence=0.35, class_confidence=None, iou_threshold=0.5,
+               class_agnostic=False, max_per_frame=None):
+        """Calcular la máscara de cajas que sobreviven a los nuevos umbrales y al NMS"""
+        thresholds = np.full(max(int(self.class_ids.max(initial=-1)) + 1, 1), confidence)
+        for class_id, value in (class_confidence or {}).items():
+            if 0 <= int(class_id) < len(thresholds):
+                thresholds[int(class_id)] = value
+
+        candidates = np.flatnonzero(self.scores >= thresholds[self.class_ids])
+        if iou_threshold is None or iou_threshold >= 1:
+            survivors = candidates
+        else:
+            # Grupos (frame, clase) contiguos, ordenados por score dentro de cada grupo
+            group = self.frame_idx[candidates] * (1 if class_agnostic else thresholds.size + 1)
+            if not class_agnostic:
+                group = group + self.class_ids[candidates]
+            order = np.lexsort((-self.scores[candidates], group))
+            candidates, group = candidates[order], group[order]
+            starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+            sizes = np.diff(np.r_[starts, len(group)])
+
+            # Los grupos del mismo tamaño se procesan juntos (los de una caja no necesitan NMS)
+            keep = np.ones(len(candidates), dtype=bool)
+            for size in np.unique(sizes[sizes > 1]):
+                group_starts = starts[sizes == size]
+                chunk = max(1, int(2e7 // (size * size)))
+                for c in range(0, len(group_starts), chunk):
+                    positions = group_starts[c:c + chunk, None] + np.arange(size)[None, :]
+                    keep[positions] = self._nms_batched(self.boxes[candidates[positions]], iou_threshold)
+            survivors = candidates[keep]
+
+        mask = np.zeros(len(self.scores), dtype=bool)
+        mask[survivors] = True
+
+        if max_per_frame:
+            # Limitar por frame conservando los scores más altos
+            ranked = np.lexsort((-self.scores, self.frame_idx))
+            ranked = ranked[mask[ranked]]
+            frames = self.frame_idx[ranked]
+            first = np.searchsorted(frames, frames, side='left')
+            rank_in_frame = np.arange(len(ranked)) - first
+            mask[ranked[rank_in_frame >= max_per_frame]] = False
+        return mask
+
+    def _load_state(self):
+        """Hash del último contenido generado por frame (runner + re-filtrados previos)"""
+        hashes = {
+            os.path.splitext(frame)[0]: record.get('label_sha1')
+            for frame, record in LabelingRunner.load_manifest_records(self.dataset_path).items()
+        }
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                hashes.update(json.load(f))
+        return hashes
+
+    def apply(self, mask, dry_run=False, force=False):
+        """Regenerar annotations/ con las cajas seleccionadas; respeta los archivos editados a mano"""
+        state = self._load_state()
+        order = np.argsort(self.frame_idx[mask], kind='stable')
+        selected = np.flatnonzero(mask)[order]
+        bounds = np.searchsorted(self.frame_idx[selected], np.arange(len(self.stems) + 1))
+
+        summary = {'frames': len(self.stems), 'written': 0, 'unchanged': 0,
+                   'skipped_edited': 0, 'boxes': int(mask.sum()), 'removed_boxes': int((~mask).sum())}
+        jobs = []
+        for frame_i, stem in enumerate(self.stems):
+            idx = selected[bounds[frame_i]:bounds[frame_i + 1]]
+            text = LabelIO.format_lines(self.class_ids[idx], self.boxes[idx])
+            label_path = os.path.join(self.labels_path, stem + LabelIO.LABEL_EXTENSION)
+            jobs.append((stem, label_path, text))
+
+        def _process(job):
+            stem, label_path, text = job
+            current_hash = LabelIO.content_hash(LabelIO.read_text(label_path))
+            new_hash = LabelIO.content_hash(text)
+            if current_hash == new_hash:
+                return stem, 'unchanged', new_hash
+            if not force and state.get(stem) not in (None, current_hash):
+                # El revisor editó este frame después del etiquetado automático
+                return stem, 'skipped_edited', None
+            if not dry_run:
+                if text:
+                    LabelIO.write_atomic(label_path, text)
+                elif os.path.exists(label_path):
+                    os.remove(label_path)
+            return stem, 'written', new_hash
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            results = list(executor.map(_process, jobs))
+
+        new_state = {}
+        for stem, status, new_hash in results:
+            summary[status] += 1
+            if new_hash is not None:
+                new_state[stem] = new_hash
+
+        if not dry_run:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+                previous.update(new_state)
+                new_state = previous
+            LabelIO.write_atomic(self.state_path, json.dumps(new_state))
+
+        mode = " (simulación)" if dry_run else ""
+        print(f"✅ Re-filtrado{mode}: {summary['boxes']} cajas conservadas, {summary['removed_boxes']} descartadas | "
+              f"{summary['written']} archivos escritos, {summary['unchanged']} sin cambios, "
+              f"{summary['skipped_edited']} editados a mano (omitidos)")
+        return summary
@@ -3,190 +3,373 @@ Módulo para generar figuras de Plotly con anotaciones
 """
 import base64
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import quote
 from PIL import Image
-import plotly.graph_objects as go
+import plotly.io as pio
+from dash import Patch
 from .coordinate_converter import CoordinateConverter
 
 
+# Cachés indexadas por (ruta, mtime_ns, tamaño): si el archivo cambia, la clave cambia
+@lru_cache(maxsize=4096)
+def _image_size(image_path, mtime_ns, file_size):
+    """Ancho y alto leyendo solo la cabecera de la imagen"""
+    with Image.open(image_path) as img:
+        return img.size
+
+
+@lru_cache(maxsize=1)
+def _default_template():
+    """Tema por defecto de plotly (el que go.Figure incrustaba en cada figura), convertido una vez"""
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+@lru_cache(maxsize=8)
+def _image_base64(image_path, mtime_ns, file_size):
+    """Imagen codificada como data URI (las últimas imágenes vistas quedan en memoria)"""
+    with open(image_path, "rb") as img_file:
+        img_str = base64.b64encode(img_file.read()).decode()
+    return f"data:image/jpeg;base64,{img_str}"
+
+
 class FigureGenerator:
     """Clase para generar figuras de Plotly con imágenes y anotaciones"""
     
-    def __init__(self, images_path, class_colors):
+    # Imágenes con zoom o sugerencias pendientes que se recuerdan (varios anotadores, cada uno en su imagen)
+    MAX_IMAGE_STATES = 64
+    
+    def __init__(self, images_path, class_colors, tile_pyramid=None, display_width=1280):
         self.images_path = images_path
         self.class_colors = class_colors
+        # Estilo por clase con los colores ya parseados (una vez, no por caja)
+        self.class_styles = self._build_class_styles(class_colors)
+        # Plantillas de layout por (ancho, alto, zoom): cada figura solo añade imagen, shapes y título
+        self._layout_templates = {}
         self.converter = CoordinateConverter()
+        # Pirámide de teselas opcional para imágenes grandes (ver utils.tile_pyramid)
+        self.tile_pyramid = tile_pyramid
+        self.display_width = display_width
+        # Estado por imagen (no global: cada cliente del servidor trabaja en su imagen), protegido por _state_lock
+        # Último área visible de cada imagen con zoom: {imagen: (x_range, y_range)}
+        self.viewports = OrderedDict()
+        # Sugerencias pendientes del detector: {imagen: [cajas YOLO con confidence]}
+        self.suggestions = OrderedDict()
+        self._state_lock = threading.Lock()
+
+    def _set_image_state(self, states, image_filename, value):
+        """Guardar (o quitar con None) el estado de una imagen, olvidando las menos recientes"""
+        with self._state_lock:
+            if value is None:
+                states.pop(image_filename, None)
+                return
+            states[image_filename] = value
+            states.move_to_end(image_filename)
+            while len(states) > self.MAX_IMAGE_STATES:
+                states.popitem(last=False)
+
+    def set_suggestions(self, image_filename, suggestions):
+        """Fijar (o limpiar con None) las sugerencias pendientes de una imagen"""
+        self._set_image_state(self.suggestions, image_filename, list(suggestions) if suggestions else None)
+
+    def get_suggestions(self, image_filename):
+        """Sugerencias pendientes de una imagen ([] si no hay)"""
+        with self._state_lock:
+            return list(self.suggestions.get(image_filename) or [])
+    
+    def is_tiled(self, img_width, img_height):
+        """Si la imagen se muestra con vista general + teselas en lugar de embebida"""
+        return self.tile_pyramid is not None and self.tile_pyramid.is_tiled(img_width, img_height)
+    
+    def set_viewport(self, image_filename, x_range, y_range):
+        """Recordar el área visible de una imagen (None = imagen completa)"""
+        self._set_image_state(self.viewports, image_filename, (x_range, y_range) if x_range and y_range else None)
+    
+    def background_images(self, image_filename, img_width, img_height):
+        """Imágenes de fondo del layout: vista general y, con zoom, las teselas visibles encima"""
+        version = os.stat(os.path.join(self.images_path, image_filename)).st_mtime_ns
+        name = quote(image_filename)
+        images = [dict(source=f"/tiles/{name}/overview.webp?v={version}", xref="x", yref="y",
+                       x=0, y=img_height, sizex=img_width, sizey=img_height,
+                       sizing="stretch", opacity=1, layer="below")]
+        
+        with self._state_lock:
+            x_range, y_range = self.viewports.get(image_filename, (None, None))
+        if x_range and y_range:
+            for level, tile_x, tile_y, x, y, width, height in self.tile_pyramid.visible_tiles(
+                    img_width, img_height, x_range, y_range, self.display_width):
+                images.append(dict(source=f"/tiles/{name}/{level}/{tile_x}_{tile_y}.webp?v={version}",
+                                   xref="x", yref="y", x=x, y=img_height - y, sizex=width, sizey=height,
+                                   sizing="stretch", opacity=1, layer="below"))
+        return images
     
     def get_image_as_base64(self, image_path):
-        """Convertir imagen a base64 para mostrar en Dash"""
-        with open(image_path, "rb") as img_file:
-            img_str = base64.b64encode(img_file.read()).decode()
-        return f"data:image/jpeg;base64,{img_str}"
+        """Convertir imagen a base64 para mostrar en Dash (memoizado mientras el archivo no cambie)"""
+        stat = os.stat(image_path)
+        return _image_base64(image_path, stat.st_mtime_ns, stat.st_size)
+    
+    def image_size(self, image_filename):
+        """Dimensiones de una imagen (memoizado mientras el archivo no cambie)"""
+        image_path = os.path.join(self.images_path, image_filename)
+        stat = os.stat(image_path)
+        return _image_size(image_path, stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _build_class_styles(class_colors):
+        """Tabla de estilos por clase: color de línea y prefijo 'rgba(r,g,b,' para el relleno"""
+        styles = []
+        for color in class_colors:
+            rgb = [int(color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4)]
+            styles.append({'color': color, 'fill_prefix': f"rgba({rgb[0]},{rgb[1]},{rgb[2]},"})
+        return styles
+    
+    def class_style(self, class_id):
+        """Estilo de una clase (los ids fuera de rango reutilizan colores, como antes)"""
+        return self.class_styles[class_id % len(self.class_styles)]
+    
+    @staticmethod
+    def _message_figure(title):
+        """Figura vacía con un mensaje"""
+        return {'data': [], 'layout': {'title': {'text': title}}}
     
     def create_figure_with_annotations(self, image_filename, annotations, opacity=0.3, 
                                      show_ids=True, show_coords=False, selected_id=None):
-        """Crear figura de Plotly con imagen y anotaciones"""
+        """Crear figura de Plotly con imagen y anotaciones
+        
+        Se devuelve como diccionario {'data', 'layout'}: Dash lo serializa tal cual y se evita la
+        validación de go.Figure en cada callback."""
         image_path = os.path.join(self.images_path, image_filename)
         
         if not os.path.exists(image_path):
             # Crear figura vacía si la imagen no existe
-            fig = go.Figure()
-            fig.update_layout(title="❌ Imagen no encontrada")
-            return fig, {'width': 800, 'height': 600}
+            return self._message_figure("❌ Imagen no encontrada"), {'width': 800, 'height': 600}
         
         # Cargar imagen
         try:
-            img = Image.open(image_path)
-            img_width, img_height = img.size
+            img_width, img_height = self.image_size(image_filename)
         except Exception as e:
-            fig = go.Figure()
-            fig.update_layout(title=f"❌ Error cargando imagen: {str(e)}")
-            return fig, {'width': 800, 'height': 600}
-        
-        # Crear figura
-        fig = go.Figure()
-        
-        # Convertir imagen a base64 y agregar como fondo
-        img_base64 = self.get_image_as_base64(image_path)
-        
-        fig.add_layout_image(
-            dict(
-                source=img_base64,
-                xref="x",
-                yref="y",
-                x=0,
-                y=img_height,
-                sizex=img_width,
-                sizey=img_height,
-                sizing="stretch",
-                opacity=1,
-                layer="below"
-            )
-        )
+            return self._message_figure(f"❌ Error cargando imagen: {str(e)}"), {'width': 800, 'height': 600}
         
-        # Agregar bounding boxes como shapes
-        shapes = self._create_shapes(annotations, img_width, img_height, opacity, selected_id)
+        tiled = self.is_tiled(img_width, img_height)
+        if tiled:
+            # Imagen grande: vista general reducida + teselas del área visible (servidas por URL)
+            images = self.background_images(image_filename, img_width, img_height)
+        else:
+            # Imagen embebida en base64 como fondo
+            images = [dict(source=self.get_image_as_base64(image_path), xref="x", yref="y",
+                           x=0, y=img_height, sizex=img_width, sizey=img_height,
+                           sizing="stretch", opacity=1, layer="below")]
         
-        # Agregar etiquetas de texto
-        self._add_text_annotations(fig, annotations, img_width, img_height, 
-                                 show_ids, show_coords)
+        # Layout desde la plantilla: solo se añaden imagen, shapes, etiquetas y título
+        layout = self._configure_layout(image_filename, img_width, img_height, zoomable=tiled)
+        layout['images'] = images
+        layout['shapes'] = self._create_shapes(annotations, img_width, img_height, opacity, selected_id)
+        layout['annotations'] = self._create_labels(annotations, img_width, img_height, show_ids, show_coords)
         
-        # Configurar layout
-        self._configure_layout(fig, image_filename, img_width, img_height, shapes)
+        # Centros de las cajas: traza 0, la que usan la selección por rectángulo/lazo
+        data = [self._box_center_trace(annotations, img_width, img_height, selected_id)]
+        # Sugerencias del detector como trazas (no shapes: no interfieren con la edición)
+        data += self._suggestion_traces(self.get_suggestions(image_filename), img_width, img_height)
         
-        return fig, {'width': img_width, 'height': img_height}
+        return {'data': data, 'layout': layout}, {'width': img_width, 'height': img_height}
+    
+    def display_patch(self, annotations, img_dims, opacity=0.3, show_ids=True, show_coords=False,
+                      selected_id=None):
+        """Patch para cambios de opacidad o de etiquetas: se reemplazan shapes y textos, nunca la imagen"""
+        patched = Patch()
+        patched['layout']['shapes'] = self._create_shapes(
+            annotations, img_dims['width'], img_dims['height'], opacity, selected_id
+        )
+        if show_ids or show_coords:
+            patched['layout']['annotations'] = [
+                self.label_for(idx, ann, img_dims['width'], img_dims['height'], show_ids, show_coords)
+                for idx, ann in enumerate(annotations)
+            ]
+        else:
+            patched['layout']['annotations'] = []
+        return patched
+    
+    def _create_labels(self, annotations, img_width, img_height, show_ids, show_coords):
+        """Etiquetas de texto de todas las cajas (ninguna si ambas opciones están desactivadas)"""
+        if not (show_ids or show_coords):
+            return []
+        return [self.label_for(idx, ann, img_width, img_height, show_ids, show_coords)
+                for idx, ann in enumerate(annotations)]
     
     def _create_shapes(self, annotations, img_width, img_height, opacity, selected_id=None):
         """Crear shapes para las anotaciones"""
-        shapes = []
+        return [self.shape_for(idx, ann, img_width, img_height, opacity, selected_id)
+                for idx, ann in enumerate(annotations)]
+    
+    def shape_for(self, idx, ann, img_width, img_height, opacity, selected_id=None):
+        """Shape de una anotación (también se usa para actualizar una sola caja con Patch)"""
+        x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(ann, img_width, img_height)
+        style = self.class_style(ann['class_id'])
+        color = style['color']
         
-        for idx, ann in enumerate(annotations):
-            x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(ann, img_width, img_height)
-            color = self.class_colors[ann['class_id'] % len(self.class_colors)]
-            
-            # Convertir coordenadas Y (Plotly usa coordenadas invertidas)
+        # Convertir coordenadas Y (Plotly usa coordenadas invertidas)
+        y_min_plot = img_height - y_max
+        y_max_plot = img_height - y_min
+        
+        fill_color = f"{style['fill_prefix']}{opacity})"
+        
+        # Estilos especiales para la anotación seleccionada (usar índice en lugar de ID)
+        if self.is_selected(idx, selected_id):
+            line_width = 5  # Más grosor
+            line_color = "#ffff00"  # Amarillo brillante
+            fill_opacity = min(opacity + 0.3, 1.0)  # Más opacidad
+            fill_color = f"rgba(255,255,0,{fill_opacity})"  # Amarillo semi-transparente
+        else:
+            line_width = 3
+            line_color = color
+        
+        return dict(
+            type="rect",
+            x0=x_min, y0=y_min_plot,
+            x1=x_max, y1=y_max_plot,
+            line=dict(color=line_color, width=line_width),
+            fillcolor=fill_color,
+            editable=True,
+            name=f"bbox_{idx}",  # Usar índice en lugar de ID
+            xref="x",
+            yref="y",
+            layer="above"
+        )
+    
+    @staticmethod
+    def is_selected(idx, selected_id):
+        """selected_id puede ser un índice o la lista de la selección múltiple"""
+        if isinstance(selected_id, (list, tuple, set)):
+            return idx in selected_id
+        return selected_id is not None and idx == selected_id
+    
+    def center_for(self, ann, img_width, img_height):
+        """Centro de una caja en coordenadas del gráfico"""
+        return ann['x_center'] * img_width, img_height - ann['y_center'] * img_height
+    
+    def _box_center_trace(self, annotations, img_width, img_height, selected_id=None):
+        """Punto central de cada caja (siempre la traza 0, aunque no haya cajas, para poder parchearla)"""
+        centers = [self.center_for(ann, img_width, img_height) for ann in annotations]
+        colors = [self.class_style(ann['class_id'])['color'] for ann in annotations]
+        selected = [idx for idx in range(len(annotations)) if self.is_selected(idx, selected_id)]
+        trace = dict(
+            type="scatter",
+            x=[c[0] for c in centers], y=[c[1] for c in centers], mode="markers",
+            marker=dict(size=6, color=colors, opacity=0.7),
+            customdata=[["box", idx] for idx in range(len(annotations))],
+            selected=dict(marker=dict(color="#ffff00", size=10, opacity=1)),
+            unselected=dict(marker=dict(opacity=0.7)),
+            hoverinfo="skip", showlegend=False
+        )
+        if isinstance(selected_id, (list, tuple, set)) and selected:
+            trace['selectedpoints'] = selected
+        return trace
+    
+    def label_for(self, idx, ann, img_width, img_height, show_ids, show_coords):
+        """Etiqueta de texto de una anotación (una por caja, en el mismo orden que las shapes)"""
+        x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(ann, img_width, img_height)
+        color = self.class_style(ann['class_id'])['color']
+        
+        # Convertir coordenadas Y
+        y_max_plot = img_height - y_min
+        
+        label_parts = []
+        if show_ids:
+            label_parts.append(f"ID:{idx}")  # Usar índice en lugar de ann['id']
+        label_parts.append(ann['class_name'])
+        if show_coords:
+            label_parts.append(f"({ann['x_center']:.3f},{ann['y_center']:.3f})")
+        
+        return dict(
+            x=x_min,
+            y=y_max_plot,
+            text=" | ".join(label_parts),
+            showarrow=False,
+            bgcolor=color,
+            bordercolor=color,
+            borderwidth=2,
+            font=dict(color="white", size=11, family="Arial Black"),
+            xanchor="left",
+            yanchor="bottom",
+            opacity=0.9
+        )
+    
+    def _suggestion_traces(self, suggestions, img_width, img_height):
+        """Sugerencias pendientes con borde discontinuo y un punto central para aceptarlas"""
+        if not suggestions:
+            return []
+        
+        traces = []
+        centers_x, centers_y, texts, colors = [], [], [], []
+        for idx, suggestion in enumerate(suggestions):
+            x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(suggestion, img_width, img_height)
+            color = self.class_style(suggestion['class_id'])['color']
             y_min_plot = img_height - y_max
             y_max_plot = img_height - y_min
             
-            # Convertir color hex a RGB para el fillcolor con transparencia
-            color_rgb = [int(color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4)]
-            fill_color = f"rgba({color_rgb[0]},{color_rgb[1]},{color_rgb[2]},{opacity})"
-            
-            # Estilos especiales para la anotación seleccionada (usar índice en lugar de ID)
-            if selected_id is not None and idx == selected_id:
-                line_width = 5  # Más grosor
-                line_color = "#ffff00"  # Amarillo brillante
-                fill_opacity = min(opacity + 0.3, 1.0)  # Más opacidad
-                fill_color = f"rgba(255,255,0,{fill_opacity})"  # Amarillo semi-transparente
-            else:
-                line_width = 3
-                line_color = color
-            
-            shape = dict(
-                type="rect",
-                x0=x_min, y0=y_min_plot,
-                x1=x_max, y1=y_max_plot,
-                line=dict(color=line_color, width=line_width),
-                fillcolor=fill_color,
-                editable=True,
-                name=f"bbox_{idx}",  # Usar índice en lugar de ID
-                xref="x",
-                yref="y",
-                layer="above"
-            )
-            shapes.append(shape)
-        
-        return shapes
-    
-    def _add_text_annotations(self, fig, annotations, img_width, img_height, 
-                            show_ids, show_coords):
-        """Agregar etiquetas de texto a la figura"""
-        for idx, ann in enumerate(annotations):
-            if show_ids or show_coords:
-                x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(ann, img_width, img_height)
-                color = self.class_colors[ann['class_id'] % len(self.class_colors)]
-                
-                # Convertir coordenadas Y
-                y_max_plot = img_height - y_min
-                
-                label_parts = []
-                if show_ids:
-                    label_parts.append(f"ID:{idx}")  # Usar índice en lugar de ann['id']
-                label_parts.append(ann['class_name'])
-                if show_coords:
-                    label_parts.append(f"({ann['x_center']:.3f},{ann['y_center']:.3f})")
-                
-                label_text = " | ".join(label_parts)
-                
-                fig.add_annotation(
-                    x=x_min,
-                    y=y_max_plot,
-                    text=label_text,
-                    showarrow=False,
-                    bgcolor=color,
-                    bordercolor=color,
-                    borderwidth=2,
-                    font=dict(color="white", size=11, family="Arial Black"),
-                    xanchor="left",
-                    yanchor="bottom",
-                    opacity=0.9
-                )
-    
-    def _configure_layout(self, fig, image_filename, img_width, img_height, shapes):
-        """Configurar el layout de la figura"""
-        # Configurar ejes
-        fig.update_xaxes(
-            range=[0, img_width],
-            showgrid=False,
-            showticklabels=False,
-            zeroline=False,
-            fixedrange=True
-        )
+            traces.append(dict(
+                type="scatter",
+                x=[x_min, x_max, x_max, x_min, x_min],
+                y=[y_min_plot, y_min_plot, y_max_plot, y_max_plot, y_min_plot],
+                mode="lines", line=dict(color=color, width=2, dash="dash"),
+                hoverinfo="skip", showlegend=False
+            ))
+            centers_x.append((x_min + x_max) / 2)
+            centers_y.append((y_min_plot + y_max_plot) / 2)
+            texts.append(f"Sugerencia {idx} | clase {suggestion['class_id']} | "
+                         f"{suggestion.get('confidence', 0):.2f} • clic para aceptar")
+            colors.append(color)
         
-        fig.update_yaxes(
-            range=[0, img_height],
-            showgrid=False,
-            showticklabels=False,
-            zeroline=False,
-            scaleanchor="x",
-            scaleratio=1,
-            fixedrange=True
-        )
+        traces.append(dict(
+            type="scatter",
+            x=centers_x, y=centers_y, mode="markers",
+            marker=dict(symbol="circle-open-dot", size=16, color=colors, line=dict(width=2)),
+            customdata=[["suggestion", idx] for idx in range(len(suggestions))],
+            hovertext=texts, hoverinfo="text", showlegend=False
+        ))
+        return traces
+    
+    def _layout_template(self, img_width, img_height, zoomable):
+        """Layout base (ejes, tema oscuro, estilos de dibujo) para un tamaño de imagen; se construye una vez"""
+        key = (img_width, img_height, zoomable)
+        template = self._layout_templates.get(key)
+        if template is None:
+            axis = dict(showgrid=False, showticklabels=False, zeroline=False, fixedrange=not zoomable)
+            template = dict(
+                # Con zoom solo en imágenes con teselas (ejes no fijos)
+                xaxis=dict(axis, range=[0, img_width]),
+                yaxis=dict(axis, range=[0, img_height], scaleanchor="x", scaleratio=1),
+                showlegend=False,
+                margin=dict(l=0, r=0, t=60, b=0),
+                dragmode="drawrect",
+                selectdirection="d",
+                newshape=dict(
+                    line=dict(color="#00d4aa", width=3),
+                    fillcolor="rgba(0,212,170,0.2)"
+                ),
+                plot_bgcolor='#1a1a1a',
+                paper_bgcolor='#1a1a1a',
+                font=dict(color="#adb5bd"),
+                template=_default_template()
+            )
+            self._layout_templates[key] = template
+        return template
+    
+    def _configure_layout(self, image_filename, img_width, img_height, zoomable=False):
+        """Layout de una figura: copia superficial de la plantilla más título (y uirevision con zoom)"""
+        template = self._layout_template(img_width, img_height, zoomable)
+        layout = dict(template)
         
-        fig.update_layout(
-            title=dict(
-                text=f"📸 {image_filename} ({img_width}×{img_height}) - ✏️ Dibuja para crear • Arrastra cajas para mover/redimensionar",
-                font=dict(size=16, color="#00d4aa", family="Arial Black")
-            ),
-            showlegend=False,
-            margin=dict(l=0, r=0, t=60, b=0),
-            dragmode="drawrect",
-            selectdirection="d",
-            newshape=dict(
-                line=dict(color="#00d4aa", width=3),
-                fillcolor="rgba(0,212,170,0.2)"
-            ),
-            plot_bgcolor='#1a1a1a',
-            paper_bgcolor='#1a1a1a',
-            shapes=shapes,
-            font=dict(color="#adb5bd")
+        zoom_hint = ""
+        if zoomable:
+            # Mantener el zoom del usuario al redibujar la misma imagen (solo los ejes: no afecta a las shapes)
+            layout['xaxis'] = dict(template['xaxis'], uirevision=image_filename)
+            layout['yaxis'] = dict(template['yaxis'], uirevision=image_filename)
+            zoom_hint = " • 🔍 Rueda para zoom"
+        layout['title'] = dict(
+            text=f"📸 {image_filename} ({img_width}×{img_height}) - ✏️ Dibuja para crear • Arrastra cajas para mover/redimensionar{zoom_hint}",
+            font=dict(size=16, color="#00d4aa", family="Arial Black")
         )
+        return layout
@@ -0,0 +1,86 @@
+"""
+Módulo para cachear las detecciones crudas del modelo base por hash de imagen y prompts
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+
+
+class InferenceCache:
+    """Clase para guardar detecciones crudas (cajas, scores, índice de prompt) direccionadas por contenido"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_bytes(data):
+        """Hash del contenido de la imagen"""
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def prompt_key(prompts, model_name="", thresholds=None):
+        """Clave de los prompts: cambia si cambia el texto buscado, el modelo o sus umbrales de detección
+        (p. ej. box_threshold/text_threshold de Grounding DINO), no el nombre de las clases"""
+        text = model_name + "\x1f" + "\x1e".join(prompts)
+        if thresholds:
+            text += "\x1f" + "\x1e".join(f"{name}={float(value)!r}" for name, value in sorted(thresholds.items()))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+    def _entry_path(self, image_hash, prompt_key):
+        """Ruta de una entrada (subdirectorio por prefijo para no saturar un directorio)"""
+        return os.path.join(self.cache_dir, image_hash[:2], f"{image_hash}_{prompt_key}.npz")
+
+    def get(self, image_hash, prompt_key):
+        """Obtener las detecciones cacheadas o None"""
+        path = self._entry_path(image_hash, prompt_key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {
+                    'xyxy': data['xyxy'].astype(np.float64),
+                    'confidence': data['confidence'].astype(np.float64),
+                    'class_id': data['class_id'].astype(np.int64),
+                    'image_shape': tuple(int(v) for v in data['image_shape']),
+                    'prompts': [str(p) for p in data['prompts']],
+                }
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, image_hash, prompt_key, xyxy, confidence, class_id, image_shape, prompts):
+        """Guardar detecciones crudas en formato compacto (npz comprimido, float32/int16)"""
+        path = self._entry_path(image_hash, prompt_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            xyxy=np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            confidence=np.asarray(confidence, dtype=np.float32),
+            class_id=np.asarray(class_id, dtype=np.int16),
+            image_shape=np.asarray(image_shape[:2], dtype=np.int32),
+            prompts=np.asarray(list(prompts), dtype=np.str_),
+        )
+
+        # Escritura atómica: otro worker puede estar leyendo la misma entrada
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def stats(self):
+        """Aciertos y fallos desde que se creó la caché"""
+        return {'hits': self.hits, 'misses': self.misses}
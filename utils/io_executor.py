@@ -0,0 +1,51 @@
+"""
+Módulo para sacar del hilo de la petición la E/S del editor (lectura de imágenes y etiquetas de los próximos frames)
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IOExecutor:
+    """Clase para precargar en hilos de fondo lo que necesitará la navegación: tamaño, imagen y etiquetas
+
+    Los callbacks siguen siendo síncronos; lo que cambia es que al pulsar 'siguiente' la imagen ya está leída
+    y codificada (o su vista general de teselas generada) y la etiqueta parseada en las cachés de
+    FigureGenerator y AnnotationManager."""
+
+    def __init__(self, figure_generator, annotation_manager, max_workers=4):
+        self.figure_generator = figure_generator
+        self.annotation_manager = annotation_manager
+        # Hilos: la E/S y la decodificación de PIL liberan el GIL
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="io")
+        self.pending = {}
+        # Varios hilos de petición (gunicorn gthread) navegan a la vez
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """Ejecutar una función de E/S en el pool; devuelve el Future"""
+        return self.executor.submit(function, *args)
+
+    def _warm(self, image_filename):
+        """Dejar en caché todo lo que lee la navegación para un frame"""
+        width, height = self.figure_generator.image_size(image_filename)
+        if self.figure_generator.is_tiled(width, height):
+            self.figure_generator.tile_pyramid.overview_path(image_filename)
+        else:
+            self.figure_generator.get_image_as_base64(
+                os.path.join(self.figure_generator.images_path, image_filename))
+        self.annotation_manager.load_annotations(image_filename)
+
+    def prefetch(self, image_filenames):
+        """Precargar en segundo plano los frames indicados (sin repetir los que siguen en curso)"""
+        with self.lock:
+            for image_filename in image_filenames:
+                future = self.pending.get(image_filename)
+                if future is not None and not future.done():
+                    continue
+                self.pending[image_filename] = self.executor.submit(self._warm, image_filename)
+            # Solo interesan los Future en curso
+            self.pending = {name: future for name, future in self.pending.items() if not future.done()}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
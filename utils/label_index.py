@@ -0,0 +1,122 @@
+"""
+Módulo con un índice compacto del dataset: conteo de cajas por frame y clase
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .label_io import LabelIO
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class LabelIndex:
+    """Clase para indexar images/ + annotations/ en arrays (F frames x C clases), con caché incremental"""
+
+    INDEX_FILENAME = ".label_index.npz"
+
+    def __init__(self, dataset_path, num_workers=16):
+        self.dataset_path = dataset_path
+        self.images_path = os.path.join(dataset_path, "images")
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.index_path = os.path.join(dataset_path, self.INDEX_FILENAME)
+        self.num_workers = num_workers
+
+        self.image_files = []
+        self.stems = []
+        self.counts = np.zeros((0, 0), dtype=np.int32)
+        self.has_label = np.zeros(0, dtype=bool)
+        self.signatures = np.zeros((0, 2), dtype=np.int64)
+
+    @staticmethod
+    def scan_signatures(directory, extensions):
+        """Un único scandir: {nombre: (mtime_ns, tamaño)}"""
+        if not os.path.isdir(directory):
+            return {}
+        signatures = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.name.lower().endswith(extensions):
+                    continue
+                stat = entry.stat()
+                signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def _load_cached(self):
+        """Cargar el índice guardado: {stem: (firma, fila de conteos)}"""
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                stems = [str(s) for s in data['stems']]
+                return {stem: (tuple(int(v) for v in sig), row)
+                        for stem, sig, row in zip(stems, data['signatures'], data['counts'])}
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return {}
+
+    def _save(self):
+        """Guardar el índice de forma atómica"""
+        buffer = io.BytesIO()
+        np.savez(buffer, stems=np.asarray(self.stems, dtype=np.str_),
+                 signatures=self.signatures, counts=self.counts)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _count_classes(label_path):
+        """Conteo de cajas por clase de un archivo"""
+        data = LabelIO.read_array(label_path)
+        if not len(data):
+            return np.zeros(0, dtype=np.int32)
+        class_ids = data[:, 0].astype(np.int64)
+        return np.bincount(class_ids[class_ids >= 0]).astype(np.int32)
+
+    def build(self, num_classes=None, use_cache=True):
+        """Construir el índice; solo se releen las etiquetas cuya firma (mtime, tamaño) cambió"""
+        images = self.scan_signatures(self.images_path, IMAGE_EXTENSIONS)
+        labels = self.scan_signatures(self.labels_path, (LabelIO.LABEL_EXTENSION,))
+        cached = self._load_cached() if use_cache else {}
+
+        self.image_files = sorted(images)
+        self.stems = [os.path.splitext(name)[0] for name in self.image_files]
+        signatures = [labels.get(stem + LabelIO.LABEL_EXTENSION, (0, -1)) for stem in self.stems]
+
+        rows = [None] * len(self.stems)
+        stale = []
+        for i, (stem, signature) in enumerate(zip(self.stems, signatures)):
+            hit = cached.get(stem)
+            if signature == (0, -1):
+                rows[i] = np.zeros(0, dtype=np.int32)
+            elif hit is not None and hit[0] == signature:
+                rows[i] = hit[1]
+            else:
+                stale.append(i)
+
+        paths = [os.path.join(self.labels_path, self.stems[i] + LabelIO.LABEL_EXTENSION) for i in stale]
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            for i, row in zip(stale, executor.map(self._count_classes, paths)):
+                rows[i] = row
+
+        width = max([len(r) for r in rows] + [num_classes or 0])
+        counts = np.zeros((len(rows), width), dtype=np.int32)
+        for i, row in enumerate(rows):
+            # Las filas cacheadas pueden tener ceros de relleno al final
+            n = min(len(row), width)
+            counts[i, :n] = row[:n]
+
+        self.counts = counts
+        self.signatures = np.asarray(signatures, dtype=np.int64).reshape(-1, 2)
+        self.has_label = self.signatures[:, 1] >= 0
+        if use_cache and stale:
+            self._save()
+
+        print(f"📇 Índice: {len(self.stems)} frames, {int(counts.sum())} cajas, "
+              f"{len(stale)} etiquetas releídas")
+        return self
+
+    def class_totals(self):
+        """Número de cajas por clase en todo el dataset"""
+        return self.counts.sum(axis=0)
@@ -0,0 +1,112 @@
+"""
+Módulo para lectura y escritura rápida de archivos de etiquetas YOLO
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+class LabelIO:
+    """Clase con utilidades de E/S para archivos YOLO (.txt) en forma de arrays"""
+
+    LABEL_EXTENSION = '.txt'
+
+    @staticmethod
+    def label_filename(image_filename):
+        """Obtener el nombre del archivo de etiquetas para una imagen"""
+        return os.path.splitext(image_filename)[0] + LabelIO.LABEL_EXTENSION
+
+    @staticmethod
+    def read_array(label_path, num_columns=5):
+        """Leer un archivo YOLO como array (N, num_columns); las líneas mal formadas se ignoran"""
+        rows = []
+        try:
+            with open(label_path, 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < num_columns:
+                        continue
+                    try:
+                        rows.append([float(p) for p in parts[:num_columns]])
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+        if not rows:
+            return np.zeros((0, num_columns), dtype=np.float64)
+        return np.asarray(rows, dtype=np.float64)
+
+    @staticmethod
+    def format_lines(class_ids, boxes, scores=None):
+        """Formatear clases y cajas YOLO (N, 4) como texto; añade la confianza si se indica"""
+        lines = []
+        for i in range(len(class_ids)):
+            x_center, y_center, width, height = boxes[i]
+            line = f"{int(class_ids[i])} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}"
+            if scores is not None:
+                line += f" {scores[i]:.4f}"
+            lines.append(line + "\n")
+        return "".join(lines)
+
+    @staticmethod
+    def xyxy_to_yolo(xyxy, img_width, img_height):
+        """Convertir cajas en píxeles (N, 4) x_min,y_min,x_max,y_max a YOLO normalizado"""
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        x_min = np.clip(xyxy[:, 0], 0, img_width)
+        y_min = np.clip(xyxy[:, 1], 0, img_height)
+        x_max = np.clip(xyxy[:, 2], 0, img_width)
+        y_max = np.clip(xyxy[:, 3], 0, img_height)
+
+        boxes = np.stack([
+            (x_min + x_max) / 2 / img_width,
+            (y_min + y_max) / 2 / img_height,
+            (x_max - x_min) / img_width,
+            (y_max - y_min) / img_height,
+        ], axis=1)
+        return np.clip(boxes, 0, 1)
+
+    @staticmethod
+    def yolo_to_xyxy(boxes, img_width=1.0, img_height=1.0):
+        """Convertir cajas YOLO (N, 4) a esquinas x_min,y_min,x_max,y_max"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        half_w = boxes[:, 2] / 2
+        half_h = boxes[:, 3] / 2
+        return np.stack([
+            (boxes[:, 0] - half_w) * img_width,
+            (boxes[:, 1] - half_h) * img_height,
+            (boxes[:, 0] + half_w) * img_width,
+            (boxes[:, 1] + half_h) * img_height,
+        ], axis=1)
+
+    @staticmethod
+    def content_hash(text):
+        """Hash del contenido de un archivo de etiquetas (un archivo inexistente equivale a '')"""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def read_text(path):
+        """Leer un archivo de etiquetas como texto ('' si no existe)"""
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    @staticmethod
+    def write_atomic(path, text):
+        """Escribir un archivo de forma atómica (archivo temporal + os.replace)"""
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix=LabelIO.LABEL_EXTENSION)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            # mkstemp crea el archivo con permisos 0600
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,230 @@
+"""
+Módulo para revisar la calidad de todas las etiquetas del dataset con comprobaciones vectorizadas
+"""
+import json
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .config_loader import ConfigLoader
+from .label_io import LabelIO
+from .dataset_reconciler import DatasetReconciler
+
+
+# Problemas que --fix corrige reescribiendo la etiqueta (el resto solo se informan)
+FIXABLE_CODES = ('malformed', 'unknown_class', 'zero_area', 'out_of_range', 'duplicate')
+
+
+def _parse_label(text):
+    """Separar las líneas válidas (array N x 5 + nº de línea) de las mal formadas"""
+    rows, line_numbers, malformed = [], [], []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            if len(parts) != 5:
+                raise ValueError
+            rows.append([float(p) for p in parts])
+            line_numbers.append(line_no)
+        except ValueError:
+            malformed.append((line_no, line.strip()[:60]))
+    data = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+    return data, np.asarray(line_numbers, dtype=np.int64), malformed
+
+
+def _duplicate_mask(class_ids, xyxy, valid, frame_of, duplicate_iou):
+    """Cajas con misma clase e IoU >= umbral respecto a una caja anterior del mismo frame"""
+    duplicate = np.zeros(len(class_ids), dtype=bool)
+    if not len(class_ids):
+        return duplicate
+    # Los frames se agrupan por número de cajas para calcular el IoU de todos a la vez (F, n, n)
+    starts = np.flatnonzero(np.r_[True, frame_of[1:] != frame_of[:-1]])
+    sizes = np.diff(np.r_[starts, len(class_ids)])
+    for size in np.unique(sizes[sizes > 1]):
+        rows = starts[sizes == size][:, None] + np.arange(size)[None, :]
+        a = xyxy[rows]
+        inter_w = np.clip(np.minimum(a[:, :, None, 2], a[:, None, :, 2]) - np.maximum(a[:, :, None, 0], a[:, None, :, 0]), 0, None)
+        inter_h = np.clip(np.minimum(a[:, :, None, 3], a[:, None, :, 3]) - np.maximum(a[:, :, None, 1], a[:, None, :, 1]), 0, None)
+        inter = inter_w * inter_h
+        area = (a[:, :, 2] - a[:, :, 0]) * (a[:, :, 3] - a[:, :, 1])
+        iou = inter / np.maximum(area[:, :, None] + area[:, None, :] - inter, 1e-12)
+        ids, ok = class_ids[rows], valid[rows]
+        same = (ids[:, :, None] == ids[:, None, :]) & ok[:, :, None] & ok[:, None, :]
+        earlier = np.triu(np.ones((size, size), dtype=bool), k=1)
+        duplicate[rows] = ((iou >= duplicate_iou) & same & earlier).any(axis=1)
+    return duplicate
+
+
+def _check_boxes(data, frame_of, num_classes, duplicate_iou):
+    """Máscaras booleanas por problema para todas las cajas de un bloque de frames"""
+    class_ids, boxes = data[:, 0], data[:, 1:5]
+    unknown_class = (class_ids != np.round(class_ids)) | (class_ids < 0)
+    if num_classes:
+        unknown_class |= class_ids >= num_classes
+    zero_area = (boxes[:, 2] <= 0) | (boxes[:, 3] <= 0)
+
+    xyxy = LabelIO.yolo_to_xyxy(boxes)
+    tolerance = 1e-6
+    out_of_range = ((boxes < 0) | (boxes > 1)).any(axis=1) | \
+                   ((xyxy < -tolerance) | (xyxy > 1 + tolerance)).any(axis=1)
+    out_of_range &= ~zero_area
+
+    valid = ~(unknown_class | zero_area)
+    duplicate = _duplicate_mask(class_ids, xyxy, valid, frame_of, duplicate_iou)
+    return {'unknown_class': unknown_class, 'zero_area': zero_area,
+            'out_of_range': out_of_range, 'duplicate': duplicate}
+
+
+def _fix_boxes(data, masks):
+    """Eliminar cajas irrecuperables y recortar al rango [0, 1] las que se salen"""
+    keep = ~(masks['unknown_class'] | masks['zero_area'] | masks['duplicate'])
+    data = data[keep]
+    xyxy = np.clip(LabelIO.yolo_to_xyxy(data[:, 1:5]), 0, 1)
+    boxes = LabelIO.xyxy_to_yolo(xyxy, 1, 1)
+    visible = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+    return data[visible, 0], boxes[visible]
+
+
+def _lint_files(labels_path, label_files, num_classes, duplicate_iou, fix):
+    """Revisar (y opcionalmente corregir) un bloque de archivos; se ejecuta en un proceso worker"""
+    issues = []
+    parsed = []
+    for label_file in label_files:
+        data, line_numbers, malformed = _parse_label(LabelIO.read_text(os.path.join(labels_path, label_file)))
+        issues.extend((label_file, line_no, 'malformed', content) for line_no, content in malformed)
+        parsed.append((data, line_numbers, bool(malformed)))
+
+    # Todas las cajas del bloque en un único array: las comprobaciones se hacen de una vez
+    data = np.concatenate([p[0] for p in parsed]) if parsed else np.zeros((0, 5))
+    line_numbers = np.concatenate([p[1] for p in parsed]) if parsed else np.zeros(0, dtype=np.int64)
+    frame_of = np.repeat(np.arange(len(parsed)), [len(p[0]) for p in parsed])
+
+    masks = _check_boxes(data, frame_of, num_classes, duplicate_iou)
+    for code, mask in masks.items():
+        issues.extend((label_files[f], int(l), code, "") for f, l in zip(frame_of[mask], line_numbers[mask]))
+
+    flagged = np.zeros(len(data), dtype=bool)
+    for mask in masks.values():
+        flagged |= mask
+    ok = ~flagged
+    # (índice de archivo en el bloque, línea, clase, log-área) de las cajas válidas
+    size_rows = list(zip(frame_of[ok].tolist(), line_numbers[ok].tolist(), data[ok, 0].astype(int).tolist(),
+                         np.log(data[ok, 3] * data[ok, 4]).tolist()))
+
+    fixed_files = 0
+    if fix:
+        flagged_frames = set(frame_of[flagged].tolist())
+        bounds = np.r_[0, np.cumsum([len(p[0]) for p in parsed])]
+        for f, (_, _, had_malformed) in enumerate(parsed):
+            if not had_malformed and f not in flagged_frames:
+                continue
+            rows = slice(bounds[f], bounds[f + 1])
+            class_ids, boxes = _fix_boxes(data[rows], {code: mask[rows] for code, mask in masks.items()})
+            LabelIO.write_atomic(os.path.join(labels_path, label_files[f]), LabelIO.format_lines(class_ids, boxes))
+            fixed_files += 1
+    return issues, size_rows, fixed_files
+
+
+class LabelLinter:
+    """Clase para revisar todas las etiquetas del dataset, informar de los problemas y corregirlos"""
+
+    REPORT_FILENAME = "lint_report.json"
+
+    def __init__(self, dataset_path, num_workers=None, duplicate_iou=0.9, size_z=5.0, chunk_size=2000):
+        self.dataset_path = dataset_path
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.duplicate_iou = duplicate_iou
+        self.size_z = size_z
+        self.chunk_size = chunk_size
+
+    def _num_classes(self):
+        """Número de clases de data.yaml (None si no hay data.yaml: no se comprueban los ids)"""
+        yaml_path = os.path.join(self.dataset_path, "data.yaml")
+        if not os.path.exists(yaml_path):
+            return None
+        return len(ConfigLoader(yaml_path).get_classes())
+
+    @staticmethod
+    def _orphan_issues(reconciler):
+        """Etiquetas sin imagen, stems con varias imágenes e imágenes sin etiqueta"""
+        issues = [(f, 0, 'orphan_label', "") for f in reconciler.orphan_labels["annotations"]]
+        issues += [(f, 0, 'duplicate_stem', ", ".join(files))
+                   for files in reconciler.duplicate_stems.values() for f in files]
+        issues += [(f, 0, 'missing_label', "") for f in reconciler.unlabeled_images]
+        return issues
+
+    def _size_outliers(self, size_rows):
+        """Cajas con área atípica para su clase (z robusto sobre log-área, en todo el dataset)"""
+        if not size_rows:
+            return []
+        files = np.array([r[0] for r in size_rows], dtype=object)
+        lines = np.array([r[1] for r in size_rows], dtype=np.int64)
+        class_ids = np.array([r[2] for r in size_rows], dtype=np.int64)
+        log_areas = np.array([r[3] for r in size_rows], dtype=np.float64)
+
+        issues = []
+        for class_id in np.unique(class_ids):
+            members = class_ids == class_id
+            if members.sum() < 20:
+                continue  # Pocas cajas: la estadística no es fiable
+            values = log_areas[members]
+            median = np.median(values)
+            mad = np.median(np.abs(values - median)) * 1.4826
+            z = np.abs(values - median) / max(mad, 1e-6)
+            outliers = z > self.size_z
+            issues += [(f, int(l), 'size_outlier', f"clase {class_id}, área {np.exp(a):.2e}")
+                       for f, l, a in zip(files[members][outliers], lines[members][outliers], values[outliers])]
+        return issues
+
+    def run(self, fix=False, report_path=None):
+        """Revisar todo el dataset; con fix se reescriben las etiquetas corregibles"""
+        num_classes = self._num_classes()
+        reconciler = DatasetReconciler(self.dataset_path).scan()
+        label_files = reconciler.label_files["annotations"]
+        chunks = [label_files[i:i + self.chunk_size] for i in range(0, len(label_files), self.chunk_size)]
+        print(f"🔎 Revisando {len(label_files)} etiquetas en {len(chunks)} bloques...")
+
+        options = (num_classes, self.duplicate_iou, fix)
+        if len(chunks) <= 1 or self.num_workers <= 1:
+            results = [_lint_files(self.labels_path, chunk, *options) for chunk in chunks]
+        else:
+            # spawn: mismo comportamiento en Linux y Windows (como el etiquetado distribuido)
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context) as executor:
+                futures = [executor.submit(_lint_files, self.labels_path, chunk, *options) for chunk in chunks]
+                results = [future.result() for future in futures]
+
+        issues, size_rows, fixed_files = [], [], 0
+        for chunk, (chunk_issues, chunk_sizes, chunk_fixed) in zip(chunks, results):
+            issues += chunk_issues
+            size_rows += [(chunk[i], line, class_id, area) for i, line, class_id, area in chunk_sizes]
+            fixed_files += chunk_fixed
+        issues += self._size_outliers(size_rows)
+        issues += self._orphan_issues(reconciler)
+
+        summary = Counter(code for _, _, code, _ in issues)
+        report = {
+            'labels': len(label_files),
+            'images': len(reconciler.image_files),
+            'num_classes': num_classes,
+            'fixed_files': fixed_files,
+            'summary': dict(sorted(summary.items())),
+            'issues': [{'file': f, 'line': l, 'code': c, 'detail': d} for f, l, c, d in issues],
+        }
+        report_path = report_path or os.path.join(self.dataset_path, self.REPORT_FILENAME)
+        LabelIO.write_atomic(report_path, json.dumps(report, ensure_ascii=False, indent=1))
+
+        for code, count in report['summary'].items():
+            marker = "🛠️" if fix and code in FIXABLE_CODES else "⚠️"
+            print(f"   {marker} {code}: {count}")
+        if not issues:
+            print("✅ Sin problemas en las etiquetas")
+        if fix:
+            print(f"🛠️ {fixed_files} etiquetas corregidas")
+        print(f"📝 Informe: {report_path}")
+        return report
@@ -0,0 +1,356 @@
+"""
+Módulo para el etiquetado automático por lotes y reanudable con modelos base de autodistill
+"""
+import glob
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from .inference_cache import InferenceCache
+from .label_io import LabelIO
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class StubDetectionModel:
+    """Modelo base falso para pruebas en CPU (misma interfaz que un DetectionBaseModel)"""
+
+    def __init__(self, class_names=("vehicle",), boxes_per_image=2, confidence=0.8):
+        self.class_names = list(class_names)
+        self.boxes_per_image = boxes_per_image
+        self.confidence = confidence
+
+    def predict(self, image):
+        """Generar cajas deterministas a partir del tamaño de la imagen"""
+        height, width = image.shape[:2]
+        xyxy, class_ids = [], []
+        for i in range(self.boxes_per_image):
+            # Cajas escalonadas en diagonal, una clase por caja
+            frac = (i + 1) / (self.boxes_per_image + 1)
+            cx, cy = width * frac, height * frac
+            bw, bh = width * 0.1, height * 0.1
+            xyxy.append([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2])
+            class_ids.append(i % len(self.class_names))
+
+        return {
+            'xyxy': np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            'class_id': np.asarray(class_ids, dtype=np.int64),
+            'confidence': np.full(len(class_ids), self.confidence, dtype=np.float32),
+        }
+
+    def predict_batch(self, images):
+        """Predicción por lotes"""
+        return [self.predict(image) for image in images]
+
+
+class LabelingRunner:
+    """Clase para etiquetar frames por lotes con un modelo base, con manifiesto para reanudar"""
+
+    MANIFEST_FILENAME = "labeling_manifest.jsonl"
+    MANIFEST_PATTERN = "labeling_manifest*.jsonl"
+    # Atributos de umbral de los modelos base (Grounding DINO / Grounded SAM)
+    THRESHOLD_ATTRIBUTES = ("box_threshold", "text_threshold")
+
+    def __init__(self, base_model, output_dir, batch_size=8, num_workers=4, prefetch=32,
+                 class_names=None, link_images=True, manifest_name=None, cache=None):
+        self.base_model = base_model
+        self.output_dir = output_dir
+        self.images_path = os.path.join(output_dir, "images")
+        self.labels_path = os.path.join(output_dir, "annotations")
+        self.detections_path = os.path.join(output_dir, "detections")
+        self.manifest_path = os.path.join(output_dir, manifest_name or self.MANIFEST_FILENAME)
+        self.batch_size = max(1, batch_size)
+        self.num_workers = max(1, num_workers)
+        self.prefetch = max(self.batch_size, prefetch)
+        self.link_images = link_images
+        self.cache = cache
+        self._manifest_lock = threading.Lock()
+
+        # El modelo devuelve índices de prompt; varias frases pueden apuntar a la misma clase
+        self.prompts, prompt_classes = self._get_ontology(base_model)
+        self.class_names = class_names or list(dict.fromkeys(prompt_classes))
+        self.prompt_to_class = np.array(
+            [self.class_names.index(c) if c in self.class_names else -1 for c in prompt_classes],
+            dtype=np.int64
+        )
+        self.prompt_key = InferenceCache.prompt_key(self.prompts, type(base_model).__name__,
+                                                    self._get_thresholds(base_model))
+
+    @staticmethod
+    def _get_ontology(base_model):
+        """Obtener prompts y clase destino de cada prompt desde la ontología del modelo"""
+        ontology = getattr(base_model, 'ontology', None)
+        if ontology is not None and hasattr(ontology, 'prompts') and hasattr(ontology, 'classes'):
+            return list(ontology.prompts()), list(ontology.classes())
+        names = list(getattr(base_model, 'class_names', []))
+        return names, names
+
+    @staticmethod
+    def _get_thresholds(base_model):
+        """Umbrales del modelo que cambian qué detecciones devuelve (parte de la clave de la caché)"""
+        return {name: getattr(base_model, name) for name in LabelingRunner.THRESHOLD_ATTRIBUTES
+                if isinstance(getattr(base_model, name, None), (int, float))}
+
+    def _map_classes(self, prompt_ids):
+        """Convertir índices de prompt en índices de clase (-1 si la clase ya no existe)"""
+        if not len(self.prompt_to_class):
+            return prompt_ids
+        valid = (prompt_ids >= 0) & (prompt_ids < len(self.prompt_to_class))
+        class_ids = np.full(len(prompt_ids), -1, dtype=np.int64)
+        class_ids[valid] = self.prompt_to_class[prompt_ids[valid]]
+        return class_ids
+
+    @staticmethod
+    def list_frames(input_folder, extensions=IMAGE_EXTENSIONS):
+        """Listar los frames de una carpeta en orden"""
+        with os.scandir(input_folder) as entries:
+            return sorted(
+                entry.name for entry in entries
+                if entry.is_file() and entry.name.lower().endswith(tuple(extensions))
+            )
+
+    @classmethod
+    def load_manifest_records(cls, output_dir):
+        """Leer los registros de todos los manifiestos del dataset (incluidos los de workers)"""
+        records = {}
+        for manifest_path in sorted(glob.glob(os.path.join(output_dir, cls.MANIFEST_PATTERN))):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        records[record['frame']] = record
+                    except (ValueError, KeyError):
+                        # Última línea truncada por una interrupción
+                        continue
+        return records
+
+    def load_manifest(self):
+        """Cargar el conjunto de frames ya procesados"""
+        return set(self.load_manifest_records(self.output_dir))
+
+    def _append_manifest(self, records):
+        """Registrar frames terminados en el manifiesto"""
+        with self._manifest_lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_data_yaml(self):
+        """Crear data.yaml con las clases si todavía no existe"""
+        yaml_path = os.path.join(self.output_dir, "data.yaml")
+        if os.path.exists(yaml_path) or not self.class_names:
+            return
+        content = yaml.safe_dump({'names': self.class_names, 'nc': len(self.class_names)},
+                                 allow_unicode=True, sort_keys=False)
+        # Escritura atómica: varios workers pueden crearlo a la vez
+        LabelIO.write_atomic(yaml_path, content)
+
+    @staticmethod
+    def _decode_image(data, image_path):
+        """Decodificar una imagen en formato BGR (el que espera autodistill)"""
+        import cv2  # Import diferido: solo se necesita al etiquetar
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"No se pudo leer la imagen: {image_path}")
+        return image
+
+    def _load_frame(self, image_path):
+        """Leer un frame; con caché, solo se decodifica si no hay detecciones guardadas"""
+        with open(image_path, 'rb') as f:
+            data = f.read()
+
+        item = {'image': None, 'digest': None, 'cached': None}
+        if self.cache is not None:
+            item['digest'] = InferenceCache.hash_bytes(data)
+            item['cached'] = self.cache.get(item['digest'], self.prompt_key)
+            if item['cached'] is not None:
+                item['shape'] = item['cached']['image_shape']
+                return item
+
+        item['image'] = self._decode_image(data, image_path)
+        item['shape'] = item['image'].shape[:2]
+        return item
+
+    @staticmethod
+    def _to_arrays(detections):
+        """Normalizar detecciones (supervision.Detections o dict) a arrays xyxy, clases y confianzas"""
+        if detections is None:
+            return np.zeros((0, 4)), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        def _get(name):
+            if isinstance(detections, dict):
+                return detections.get(name)
+            return getattr(detections, name, None)
+
+        xyxy = _get('xyxy')
+        xyxy = np.asarray([] if xyxy is None else xyxy, dtype=np.float64).reshape(-1, 4)
+        class_id = _get('class_id')
+        class_id = np.zeros(len(xyxy), dtype=np.int64) if class_id is None else np.asarray(class_id, dtype=np.int64)
+        confidence = _get('confidence')
+        confidence = np.ones(len(xyxy)) if confidence is None else np.asarray(confidence, dtype=np.float64)
+        return xyxy, class_id, confidence
+
+    def _predict_batch(self, items):
+        """Ejecutar el modelo solo sobre las imágenes sin detecciones en caché"""
+        results = [item['cached'] for item in items]
+        missing = [i for i, item in enumerate(items) if item['cached'] is None]
+        if not missing:
+            return results
+
+        images = [items[i]['image'] for i in missing]
+        if hasattr(self.base_model, 'predict_batch'):
+            predictions = list(self.base_model.predict_batch(images))
+        else:
+            predictions = [self.base_model.predict(image) for image in images]
+
+        for i, detections in zip(missing, predictions):
+            results[i] = detections
+            if self.cache is not None:
+                xyxy, prompt_ids, confidence = self._to_arrays(detections)
+                self.cache.put(items[i]['digest'], self.prompt_key, xyxy, confidence,
+                               prompt_ids, items[i]['shape'], self.prompts)
+        return results
+
+    def _place_image(self, src_path, frame):
+        """Colocar la imagen en images/ (hardlink si es posible, si no copia)"""
+        dst_path = os.path.join(self.images_path, frame)
+        if os.path.exists(dst_path):
+            return
+        if self.link_images:
+            try:
+                os.link(src_path, dst_path)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src_path, dst_path)
+
+    def _write_outputs(self, input_folder, frame, image_shape, detections):
+        """Escribir imagen, etiquetas YOLO y detecciones con score de un frame"""
+        height, width = image_shape[:2]
+        xyxy, prompt_ids, confidence = self._to_arrays(detections)
+        class_ids = self._map_classes(prompt_ids)
+        keep = class_ids >= 0
+        xyxy, class_ids, confidence = xyxy[keep], class_ids[keep], confidence[keep]
+
+        self._place_image(os.path.join(input_folder, frame), frame)
+
+        label_filename = LabelIO.label_filename(frame)
+        label_path = os.path.join(self.labels_path, label_filename)
+        detections_path = os.path.join(self.detections_path, label_filename)
+        label_text = ""
+        if len(xyxy):
+            boxes = LabelIO.xyxy_to_yolo(xyxy, width, height)
+            # detections/ conserva el score de cada caja para re-filtrar sin inferencia
+            LabelIO.write_atomic(detections_path, LabelIO.format_lines(class_ids, boxes, confidence))
+            label_text = LabelIO.format_lines(class_ids, boxes)
+            LabelIO.write_atomic(label_path, label_text)
+        else:
+            # El editor no usa archivos vacíos
+            for path in (label_path, detections_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        return len(xyxy), LabelIO.content_hash(label_text)
+
+    def _produce(self, input_folder, frames, executor, pending, stop_event):
+        """Encolar decodificaciones en un orden estable (la cola acotada limita la memoria)"""
+        try:
+            for frame in frames:
+                if stop_event.is_set():
+                    break
+                future = executor.submit(self._load_frame, os.path.join(input_folder, frame))
+                pending.put((frame, future))
+        finally:
+            pending.put(None)
+
+    def run(self, input_folder, frames=None):
+        """Etiquetar todos los frames pendientes de una carpeta"""
+        os.makedirs(self.images_path, exist_ok=True)
+        os.makedirs(self.labels_path, exist_ok=True)
+        os.makedirs(self.detections_path, exist_ok=True)
+        self._write_data_yaml()
+
+        frames = frames if frames is not None else self.list_frames(input_folder)
+        done = self.load_manifest()
+        todo = [f for f in frames if f not in done]
+        summary = {'total': len(frames), 'skipped': len(frames) - len(todo),
+                   'processed': 0, 'failed': 0, 'boxes': 0, 'seconds': 0.0}
+
+        print(f"🏷️ Frames: {len(frames)} | Ya procesados: {summary['skipped']} | Pendientes: {len(todo)}")
+        if not todo:
+            return summary
+
+        start = time.perf_counter()
+        pending = queue.Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            producer = threading.Thread(
+                target=self._produce, args=(input_folder, todo, executor, pending, stop_event), daemon=True
+            )
+            producer.start()
+
+            try:
+                finished = False
+                while not finished:
+                    batch_frames, batch_items = [], []
+                    while len(batch_frames) < self.batch_size:
+                        entry = pending.get()
+                        if entry is None:
+                            finished = True
+                            break
+                        frame, future = entry
+                        try:
+                            batch_items.append(future.result())
+                            batch_frames.append(frame)
+                        except Exception as e:
+                            print(f"⚠️ Error leyendo {frame}: {e}")
+                            summary['failed'] += 1
+
+                    if not batch_frames:
+                        continue
+
+                    detections = self._predict_batch(batch_items)
+                    writes = [
+                        executor.submit(self._write_outputs, input_folder, frame, item['shape'], dets)
+                        for frame, item, dets in zip(batch_frames, batch_items, detections)
+                    ]
+
+                    records = []
+                    for frame, write in zip(batch_frames, writes):
+                        n_boxes, label_hash = write.result()
+                        records.append({'frame': frame, 'boxes': n_boxes, 'label_sha1': label_hash})
+                        summary['boxes'] += n_boxes
+                    self._append_manifest(records)
+                    summary['processed'] += len(records)
+
+                    if summary['processed'] % 200 < len(records) or finished:
+                        elapsed = time.perf_counter() - start
+                        print(f"   {summary['processed']}/{len(todo)} frames "
+                              f"({summary['processed'] / max(elapsed, 1e-9):.1f} frames/s)")
+            finally:
+                stop_event.set()
+                # Vaciar la cola para desbloquear al productor
+                while producer.is_alive():
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        time.sleep(0.01)
+                producer.join()
+
+        summary['seconds'] = time.perf_counter() - start
+        print(f"✅ Etiquetado terminado: {summary['processed']} frames, {summary['boxes']} cajas "
+              f"en {summary['seconds']:.1f}s")
+        if self.cache is not None:
+            summary['cache'] = self.cache.stats()
+            print(f"💾 Caché de inferencia: {summary['cache']['hits']} aciertos, {summary['cache']['misses']} fallos")
+        return summary
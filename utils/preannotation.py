@@ -0,0 +1,202 @@
+"""
+Módulo para pre-anotación asistida por modelo: detectores intercambiables y sugerencias en segundo plano
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .label_io import LabelIO
+
+
+class StubDetector:
+    """Detector de prueba sin GPU ni pesos: cajas deterministas a partir del nombre de la imagen"""
+
+    def __init__(self, class_ids=(0,), boxes_per_image=2, confidence=0.6):
+        self.class_ids = list(class_ids)
+        self.boxes_per_image = boxes_per_image
+        self.confidence = confidence
+
+    def predict(self, image_path):
+        """Devolver sugerencias en formato YOLO normalizado"""
+        seed = int(hashlib.sha1(os.path.basename(image_path).encode('utf-8')).hexdigest()[:8], 16)
+        rng = np.random.default_rng(seed)
+        suggestions = []
+        for i in range(self.boxes_per_image):
+            width, height = rng.uniform(0.08, 0.25, size=2)
+            suggestions.append({
+                'class_id': self.class_ids[i % len(self.class_ids)],
+                'x_center': float(rng.uniform(width / 2, 1 - width / 2)),
+                'y_center': float(rng.uniform(height / 2, 1 - height / 2)),
+                'width': float(width),
+                'height': float(height),
+                'confidence': self.confidence,
+            })
+        return suggestions
+
+
+class YOLODetector:
+    """Detector con un modelo Ultralytics (.pt), p. ej. el YOLOv8 destilado con target_model.train"""
+
+    def __init__(self, weights_path, confidence=0.25, device=None):
+        from ultralytics import YOLO  # Import diferido: dependencia opcional
+        self.model = YOLO(weights_path)
+        self.confidence = confidence
+        self.device = device
+
+    def predict(self, image_path):
+        """Devolver sugerencias en formato YOLO normalizado"""
+        kwargs = {'conf': self.confidence, 'verbose': False}
+        if self.device:
+            kwargs['device'] = self.device
+        result = self.model.predict(image_path, **kwargs)[0]
+        boxes = result.boxes.xywhn.cpu().numpy()
+        class_ids = result.boxes.cls.cpu().numpy().astype(int)
+        scores = result.boxes.conf.cpu().numpy()
+        return [
+            {'class_id': int(c), 'x_center': float(b[0]), 'y_center': float(b[1]),
+             'width': float(b[2]), 'height': float(b[3]), 'confidence': float(s)}
+            for b, c, s in zip(boxes, class_ids, scores)
+        ]
+
+
+class ONNXDetector:
+    """Detector YOLOv8 exportado a ONNX, ejecutado en CPU con onnxruntime"""
+
+    def __init__(self, model_path, confidence=0.25, iou_threshold=0.5, input_size=640):
+        import onnxruntime  # Import diferido: dependencia opcional
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self.input_size = input_size
+
+    def _preprocess(self, image_path):
+        """Letterbox a input_size x input_size, RGB, NCHW float32"""
+        from PIL import Image
+        image = Image.open(image_path).convert("RGB")
+        width, height = image.size
+        scale = self.input_size / max(width, height)
+        new_w, new_h = int(round(width * scale)), int(round(height * scale))
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        pad_x, pad_y = (self.input_size - new_w) // 2, (self.input_size - new_h) // 2
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = np.asarray(image.resize((new_w, new_h)))
+        tensor = canvas.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return tensor, (width, height, scale, pad_x, pad_y)
+
+    @staticmethod
+    def _nms(xyxy, scores, iou_threshold):
+        """NMS greedy simple (pocas cajas por imagen)"""
+        order = np.argsort(-scores)
+        areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+        keep = []
+        while len(order):
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+            inter_w = np.clip(np.minimum(xyxy[i, 2], xyxy[rest, 2]) - np.maximum(xyxy[i, 0], xyxy[rest, 0]), 0, None)
+            inter_h = np.clip(np.minimum(xyxy[i, 3], xyxy[rest, 3]) - np.maximum(xyxy[i, 1], xyxy[rest, 1]), 0, None)
+            inter = inter_w * inter_h
+            iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-12)
+            order = rest[iou <= iou_threshold]
+        return np.asarray(keep, dtype=np.int64)
+
+    def predict(self, image_path):
+        """Devolver sugerencias en formato YOLO normalizado"""
+        tensor, (width, height, scale, pad_x, pad_y) = self._preprocess(image_path)
+        output = self.session.run(None, {self.input_name: tensor})[0][0]
+        # Salida YOLOv8: (4 + num_clases, N) con cajas cx, cy, w, h en píxeles del letterbox
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        valid = scores >= self.confidence
+        boxes, class_ids, scores = predictions[valid, :4], class_ids[valid], scores[valid]
+        if not len(boxes):
+            return []
+
+        boxes = boxes.astype(np.float64)
+        boxes[:, 0] = (boxes[:, 0] - pad_x) / scale
+        boxes[:, 1] = (boxes[:, 1] - pad_y) / scale
+        boxes[:, 2:] /= scale
+        xyxy = LabelIO.yolo_to_xyxy(boxes)
+
+        # NMS por clase desplazando las cajas de cada clase
+        offsets = class_ids[:, None] * (max(width, height) + 1)
+        keep = self._nms(xyxy + offsets, scores, self.iou_threshold)
+        yolo = LabelIO.xyxy_to_yolo(xyxy[keep], width, height)
+        return [
+            {'class_id': int(c), 'x_center': float(b[0]), 'y_center': float(b[1]),
+             'width': float(b[2]), 'height': float(b[3]), 'confidence': float(s)}
+            for b, c, s in zip(yolo, class_ids[keep], scores[keep])
+        ]
+
+
+def build_detector(spec, confidence=0.25):
+    """Construir un detector a partir de 'stub', una ruta .pt o una ruta .onnx"""
+    if spec is None:
+        return None
+    if spec == "stub":
+        return StubDetector()
+    extension = os.path.splitext(spec)[1].lower()
+    if extension == ".onnx":
+        return ONNXDetector(spec, confidence=confidence)
+    if extension == ".pt":
+        return YOLODetector(spec, confidence=confidence)
+    raise ValueError(f"Detector no soportado: {spec} (use 'stub', un .pt o un .onnx)")
+
+
+class SuggestionService:
+    """Clase para calcular sugerencias en un worker de fondo, con prefetch de los siguientes frames"""
+
+    def __init__(self, detector, images_path, prefetch=3, max_cached=64):
+        self.detector = detector
+        self.images_path = images_path
+        self.prefetch_count = prefetch
+        self.max_cached = max_cached
+        # Un único worker: los modelos no suelen ser seguros entre hilos
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="suggestions")
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _submit(self, image_filename):
+        """Encolar una imagen si no está calculada ni pendiente"""
+        with self.lock:
+            future = self.futures.get(image_filename)
+            if future is not None:
+                self.futures.move_to_end(image_filename)
+                return future
+            image_path = os.path.join(self.images_path, image_filename)
+            future = self.executor.submit(self.detector.predict, image_path)
+            self.futures[image_filename] = future
+            while len(self.futures) > self.max_cached:
+                _, old = self.futures.popitem(last=False)
+                old.cancel()
+            return future
+
+    def prefetch(self, image_filenames):
+        """Calcular en segundo plano las sugerencias de los próximos frames"""
+        for image_filename in image_filenames[:self.prefetch_count]:
+            self._submit(image_filename)
+
+    def predict(self, image_path):
+        """Misma interfaz que un detector, pero en el worker del servicio: otros consumidores (p. ej. la cola de
+        revisión) comparten el modelo sin llamarlo desde dos hilos a la vez. No se guarda en el caché de la UI"""
+        return self.executor.submit(self.detector.predict, image_path).result()
+
+    def get(self, image_filename, timeout=30):
+        """Obtener las sugerencias de una imagen (espera si todavía se están calculando)"""
+        future = self._submit(image_filename)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise RuntimeError(f"El detector sigue procesando {image_filename}, inténtelo de nuevo") from None
+        except Exception as e:
+            # No guardar el fallo: el próximo intento vuelve a ejecutar el detector
+            with self.lock:
+                if self.futures.get(image_filename) is future:
+                    del self.futures[image_filename]
+            raise RuntimeError(f"Error del detector en {image_filename}: {e}") from e
@@ -0,0 +1,256 @@
+"""
+Módulo para priorizar la revisión: puntúa cada frame por incertidumbre, desacuerdo y anomalías de conteo
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .label_io import LabelIO
+from .label_index import LabelIndex, IMAGE_EXTENSIONS
+
+
+class ReviewQueue:
+    """Clase para calcular (en segundo plano y con caché) el orden de revisión de los frames"""
+
+    QUEUE_FILENAME = ".review_queue.npz"
+    PREDICTIONS_PATTERN = ".review_predictions.{key}.jsonl"
+    WEIGHTS = {'uncertainty': 1.0, 'disagreement': 1.5, 'count_anomaly': 1.0}
+    # Firma (mtime_ns, tamaño) por frame de cada archivo del que depende su puntuación; (0, -1) si no existe
+    SIGNATURE_KEYS = ('image_signatures', 'label_signatures', 'detection_signatures')
+
+    def __init__(self, dataset_path, detector=None, detector_name="", num_workers=8,
+                 iou_threshold=0.5, window=5, chunk_size=64):
+        self.dataset_path = dataset_path
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.detections_path = os.path.join(dataset_path, "detections")
+        self.images_path = os.path.join(dataset_path, "images")
+        self.queue_path = os.path.join(dataset_path, self.QUEUE_FILENAME)
+        self.detector = detector
+        key = hashlib.sha1(detector_name.encode('utf-8')).hexdigest()[:8]
+        # El desacuerdo guardado solo vale para el mismo detector
+        self.detector_key = key if detector is not None else ""
+        self.predictions_path = os.path.join(dataset_path, self.PREDICTIONS_PATTERN.format(key=key))
+        self.num_workers = num_workers
+        self.iou_threshold = iou_threshold
+        self.window = window
+        self.chunk_size = chunk_size
+
+        self.image_files = []
+        self.scores = np.zeros(0)
+        self.components = {}
+        self.progress = {'stage': '', 'done': 0, 'total': 0, 'running': False, 'error': None}
+        self._thread = None
+
+    def _scan(self, image_files=None):
+        """Imágenes (las actuales si no se indican) y firmas de imagen, etiqueta y detecciones de cada una"""
+        images = LabelIndex.scan_signatures(self.images_path, IMAGE_EXTENSIONS)
+        image_files = sorted(images) if image_files is None else image_files
+        signatures = {'image_signatures': [images.get(f, (0, -1)) for f in image_files]}
+        for name, directory in (('label_signatures', self.labels_path),
+                                ('detection_signatures', self.detections_path)):
+            scanned = LabelIndex.scan_signatures(directory, (LabelIO.LABEL_EXTENSION,))
+            signatures[name] = [scanned.get(LabelIO.label_filename(f), (0, -1)) for f in image_files]
+        return image_files, {name: np.asarray(sig, dtype=np.int64).reshape(-1, 2) for name, sig in signatures.items()}
+
+    def _load_saved(self):
+        """Contenido de .review_queue.npz como dict de arrays; None si no existe o está en un formato antiguo"""
+        try:
+            with np.load(self.queue_path, allow_pickle=False) as data:
+                saved = {k: data[k] for k in ('image_files', 'scores', 'detector', *self.WEIGHTS, *self.SIGNATURE_KEYS)}
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        saved['image_files'] = [str(f) for f in saved['image_files']]
+        saved['detector'] = str(saved['detector'])
+        return saved
+
+    def load_cached(self):
+        """Cargar la última cola calculada; False si no existe o si alguna imagen, etiqueta o detección cambió
+        desde entonces (en ese caso compute() solo recalcula las filas afectadas)"""
+        saved = self._load_saved()
+        if saved is None or saved['detector'] != self.detector_key:
+            return False
+        image_files, signatures = self._scan()
+        if image_files != saved['image_files'] or any(
+                not np.array_equal(signatures[name], saved[name]) for name in self.SIGNATURE_KEYS):
+            return False
+        self.image_files = image_files
+        self.scores = saved['scores']
+        self.components = {k: saved[k] for k in self.WEIGHTS}
+        return True
+
+    def order(self):
+        """Nombres de imagen ordenados de mayor a menor prioridad"""
+        ranking = np.argsort(-self.scores, kind='stable')
+        return [self.image_files[i] for i in ranking]
+
+    def _read_all(self, directory, num_columns, image_files):
+        """Leer un archivo por imagen (en paralelo); lista de arrays alineada con image_files"""
+        paths = [os.path.join(directory, LabelIO.label_filename(f)) for f in image_files]
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            return list(executor.map(lambda p: LabelIO.read_array(p, num_columns=num_columns), paths))
+
+    @staticmethod
+    def _uncertainty(detections):
+        """Incertidumbre del modelo base: scores cerca de 0.5 o frames sin detecciones seguras"""
+        if not len(detections):
+            return 0.0
+        scores = detections[:, 5]
+        return float(np.mean(1.0 - np.abs(scores - 0.5) * 2.0))
+
+    def _count_anomaly(self, counts):
+        """Desvío del número de cajas respecto a la mediana de los frames vecinos (z robusto)"""
+        if not len(counts):
+            return counts.astype(np.float64)
+        half = self.window
+        padded = np.pad(counts.astype(np.float64), half, mode='edge')
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1)
+        median = np.median(windows, axis=1)
+        mad = np.median(np.abs(windows - median[:, None]), axis=1)
+        return np.abs(counts - median) / (mad + 1.0)
+
+    def _disagreement(self, predictions, labels):
+        """1 - fracción de cajas emparejadas (IoU >= umbral y misma clase) entre modelo y etiquetas"""
+        if not len(predictions) and not len(labels):
+            return 0.0
+        if not len(predictions) or not len(labels):
+            return 1.0
+        a = LabelIO.yolo_to_xyxy(predictions[:, 1:5])
+        b = LabelIO.yolo_to_xyxy(labels[:, 1:5])
+        inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+        inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+        inter = inter_w * inter_h
+        area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+        area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        iou = inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-12)
+        iou[predictions[:, 0][:, None] != labels[:, 0][None, :]] = 0
+        match = iou >= self.iou_threshold
+        matched = match.any(axis=1).sum() + match.any(axis=0).sum()
+        return float(1.0 - matched / (len(predictions) + len(labels)))
+
+    def _load_predictions(self):
+        """Predicciones ya calculadas del modelo destilado: {imagen: (firma, array)}"""
+        cached = {}
+        if not os.path.exists(self.predictions_path):
+            return cached
+        with open(self.predictions_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Línea truncada por una interrupción
+                boxes = np.asarray(record['boxes'], dtype=np.float64).reshape(-1, 6)
+                cached[record['image']] = (tuple(record['sig']), boxes)
+        return cached
+
+    def _predict_all(self, signatures, image_files):
+        """Ejecutar el detector por bloques, añadiendo al caché para poder reanudar"""
+        cached = self._load_predictions()
+        todo = [f for f in image_files
+                if f not in cached or cached[f][0] != tuple(signatures.get(f, (0, 0)))]
+        self.progress.update(stage='detector', done=0, total=len(todo))
+
+        for start in range(0, len(todo), self.chunk_size):
+            chunk = todo[start:start + self.chunk_size]
+            lines = []
+            for image_file in chunk:
+                suggestions = self.detector.predict(os.path.join(self.images_path, image_file))
+                boxes = [[s['class_id'], s['x_center'], s['y_center'], s['width'], s['height'],
+                          s.get('confidence', 1.0)] for s in suggestions]
+                signature = list(signatures.get(image_file, (0, 0)))
+                cached[image_file] = (tuple(signature), np.asarray(boxes, dtype=np.float64).reshape(-1, 6))
+                lines.append(json.dumps({'image': image_file, 'sig': signature, 'boxes': boxes}) + "\n")
+            with open(self.predictions_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            self.progress['done'] += len(chunk)
+
+        return [cached[f][1] for f in image_files]
+
+    def _reuse(self, saved, component, signatures, depends_on):
+        """Valores anteriores de 'component' en el orden actual e índices de las filas a recalcular: frames
+        nuevos o cuyos archivos de 'depends_on' cambiaron"""
+        values = np.zeros(len(self.image_files))
+        if saved is None:
+            return values, list(range(len(self.image_files)))
+        position = {f: j for j, f in enumerate(saved['image_files'])}
+        stale = []
+        for i, image_file in enumerate(self.image_files):
+            j = position.get(image_file)
+            if j is None or any(not np.array_equal(signatures[name][i], saved[name][j]) for name in depends_on):
+                stale.append(i)
+            else:
+                values[i] = saved[component][j]
+        return values, stale
+
+    def compute(self):
+        """Calcular la puntuación de los frames y guardarla; se reutilizan las filas cuyos archivos no cambiaron"""
+        index = LabelIndex(self.dataset_path).build()
+        self.image_files = index.image_files
+        num_frames = len(self.image_files)
+        _, signatures = self._scan(self.image_files)
+        saved = self._load_saved()
+
+        self.progress.update(stage='etiquetas', done=0, total=num_frames)
+        # Depende de los vecinos: se recalcula entera a partir de los conteos del índice (ya incremental)
+        components = {'count_anomaly': self._count_anomaly(index.counts.sum(axis=1))}
+
+        components['uncertainty'], stale = self._reuse(saved, 'uncertainty', signatures, ('detection_signatures',))
+        num_stale = len(stale)
+        if stale and os.path.isdir(self.detections_path):
+            detections = self._read_all(self.detections_path, 6, [self.image_files[i] for i in stale])
+            components['uncertainty'][stale] = [self._uncertainty(d) for d in detections]
+
+        if self.detector is not None:
+            if saved is not None and saved['detector'] != self.detector_key:
+                saved = None
+            components['disagreement'], stale = self._reuse(
+                saved, 'disagreement', signatures, ('image_signatures', 'label_signatures'))
+            num_stale = max(num_stale, len(stale))
+            if stale:
+                stale_files = [self.image_files[i] for i in stale]
+                labels = self._read_all(self.labels_path, 5, stale_files)
+                image_signatures = {f: tuple(int(v) for v in signatures['image_signatures'][i])
+                                    for f, i in zip(stale_files, stale)}
+                predictions = self._predict_all(image_signatures, stale_files)
+                components['disagreement'][stale] = [self._disagreement(p, l) for p, l in zip(predictions, labels)]
+        else:
+            components['disagreement'] = np.zeros(num_frames)
+
+        # Cada componente se normaliza a [0, 1] antes de ponderar
+        scores = np.zeros(num_frames)
+        for name, weight in self.WEIGHTS.items():
+            values = components[name].astype(np.float64)
+            top = values.max(initial=0.0)
+            scores += weight * (values / top if top > 0 else values)
+
+        self.scores, self.components = scores, components
+        buffer = io.BytesIO()
+        np.savez(buffer, image_files=np.asarray(self.image_files, dtype=np.str_), scores=scores,
+                 detector=np.str_(self.detector_key), **components, **signatures)
+        tmp_path = self.queue_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self.queue_path)
+        print(f"🧭 Cola de revisión: {num_frames} frames puntuados ({num_stale} recalculados)")
+        return self
+
+    def start(self):
+        """Calcular la cola en un hilo de fondo"""
+        self.progress.update(running=True, error=None)
+
+        def _run():
+            try:
+                self.compute()
+            except Exception as e:
+                print(f"❌ Error calculando la cola de revisión: {e}")
+                self.progress['error'] = str(e)
+            finally:
+                self.progress['running'] = False
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+        return self
@@ -0,0 +1,104 @@
+"""
+Módulo para interpretar relayoutData de Plotly como cambios puntuales sobre las anotaciones
+"""
+import re
+
+import numpy as np
+
+from .coordinate_converter import CoordinateConverter
+
+
+class ShapeEditEngine:
+    """Clase para convertir relayoutData en deltas por índice y aplicarlos solo a las cajas tocadas"""
+
+    SHAPE_KEY = re.compile(r'^shapes\[(\d+)\]\.(x0|x1|y0|y1)$')
+    COORDS = ('x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, min_size=5, tolerance=1e-5):
+        self.min_size = min_size
+        self.tolerance = tolerance
+        self.converter = CoordinateConverter()
+
+    def parse(self, relayout_data, annotations, img_dims):
+        """Clasificar el evento: ('new', shape), ('edit', {índice: {coord: valor}}) o (None, None)"""
+        deltas = {}
+        for key, value in relayout_data.items():
+            match = self.SHAPE_KEY.match(key)
+            if match:
+                deltas.setdefault(int(match.group(1)), {})[match.group(2)] = value
+        if deltas:
+            return 'edit', deltas
+
+        shapes = relayout_data.get('shapes')
+        if shapes:
+            if len(shapes) > len(annotations):
+                return 'new', shapes[-1]
+            if len(shapes) == len(annotations):
+                deltas = self.diff_shapes(shapes, annotations, img_dims)
+                return ('edit', deltas) if deltas else (None, None)
+        return None, None
+
+    def plot_coords(self, annotation, img_dims):
+        """Esquinas de una anotación en coordenadas del gráfico (y invertida)"""
+        x_min, y_min, x_max, y_max = self.converter.yolo_to_pixel(annotation, img_dims['width'], img_dims['height'])
+        return {'x0': x_min, 'x1': x_max, 'y0': img_dims['height'] - y_max, 'y1': img_dims['height'] - y_min}
+
+    def diff_shapes(self, shapes, annotations, img_dims):
+        """Lista completa de shapes: comparar vectorizado y devolver solo las que se movieron"""
+        current = np.array([[s.get(c, 0) for c in self.COORDS] for s in shapes], dtype=np.float64)
+        expected = np.array([[self.plot_coords(a, img_dims)[c] for c in self.COORDS] for a in annotations],
+                            dtype=np.float64).reshape(-1, 4)
+        # Plotly puede devolver las esquinas intercambiadas
+        current = np.concatenate([np.minimum(current[:, :2], current[:, 2:]),
+                                  np.maximum(current[:, :2], current[:, 2:])], axis=1)
+        moved = np.flatnonzero((np.abs(current - expected) > 0.5).any(axis=1))
+        return {int(i): dict(zip(self.COORDS, current[i].tolist())) for i in moved}
+
+    def expand_group_move(self, deltas, annotations, img_dims, group):
+        """Si se arrastró (sin redimensionar) una caja de la selección múltiple, mover el resto lo mismo"""
+        if not group or len(deltas) != 1:
+            return deltas
+        index, delta = next(iter(deltas.items()))
+        if index not in group or not 0 <= index < len(annotations) or set(delta) != set(self.COORDS):
+            return deltas
+        before = self.plot_coords(annotations[index], img_dims)
+        dx = min(delta['x0'], delta['x1']) - before['x0']
+        dy = min(delta['y0'], delta['y1']) - before['y0']
+        resized = (abs(abs(delta['x1'] - delta['x0']) - (before['x1'] - before['x0'])) > 0.5 or
+                   abs(abs(delta['y1'] - delta['y0']) - (before['y1'] - before['y0'])) > 0.5)
+        if resized:
+            return deltas
+        expanded = dict(deltas)
+        for other in group:
+            if other != index and 0 <= other < len(annotations):
+                coords = self.plot_coords(annotations[other], img_dims)
+                expanded[other] = {'x0': coords['x0'] + dx, 'x1': coords['x1'] + dx,
+                                   'y0': coords['y0'] + dy, 'y1': coords['y1'] + dy}
+        return expanded
+
+    def apply(self, deltas, annotations, img_dims):
+        """Aplicar los deltas; devuelve (anotaciones, índices que cambiaron). Solo se convierten las tocadas"""
+        updated = list(annotations)
+        changed = []
+        for index, delta in deltas.items():
+            if not 0 <= index < len(annotations):
+                continue
+            annotation = annotations[index]
+            coords = self.plot_coords(annotation, img_dims)
+            coords.update(delta)
+            x0, x1 = sorted((coords['x0'], coords['x1']))
+            y0, y1 = sorted((coords['y0'], coords['y1']))
+            # Convertir Y del gráfico a Y de imagen
+            y0_img, y1_img = img_dims['height'] - y1, img_dims['height'] - y0
+            if not self.converter.validate_pixel_coords(x0, y0_img, x1, y1_img, min_size=self.min_size):
+                continue
+
+            x_center, y_center, width, height = self.converter.pixel_to_yolo(
+                x0, y0_img, x1, y1_img, img_dims['width'], img_dims['height']
+            )
+            new_values = {'x_center': x_center, 'y_center': y_center, 'width': width, 'height': height}
+            if all(abs(annotation[k] - v) <= self.tolerance for k, v in new_values.items()):
+                continue
+            updated[index] = {**annotation, **new_values}
+            changed.append(index)
+        return updated, sorted(changed)
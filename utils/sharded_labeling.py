@@ -0,0 +1,163 @@
+"""
+Módulo para repartir el etiquetado automático entre varios procesos (y nodos)
+"""
+import json
+import multiprocessing
+import os
+import time
+
+from .labeling_runner import LabelingRunner, StubDetectionModel
+
+
+def stub_model_factory(device="cpu", class_names=("vehicle",)):
+    """Fábrica del modelo falso (sirve como model_factory para pruebas locales)"""
+    return StubDetectionModel(class_names=class_names)
+
+
+def _run_worker(worker_id, device, model_factory, output_dir, input_folder, frames,
+                manifest_name, runner_kwargs):
+    """Proceso worker: fija su dispositivo, construye el modelo y etiqueta su shard"""
+    model_device = device
+    if device == "cpu":
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    elif device.startswith("cuda:"):
+        # Cada worker ve una sola GPU; para el modelo es siempre "cuda:0" (o CPU si se enmascaró a vacío)
+        visible = device.split(":", 1)[1].strip()
+        os.environ["CUDA_VISIBLE_DEVICES"] = visible
+        model_device = "cuda:0" if visible else "cpu"
+
+    print(f"🔧 Worker {worker_id}: {len(frames)} frames en {device}")
+    base_model = model_factory(device=model_device)
+    runner = LabelingRunner(
+        base_model, output_dir,
+        manifest_name=manifest_name,
+        **runner_kwargs
+    )
+    runner.run(input_folder, frames=frames)
+
+
+class ShardedLabelingCoordinator:
+    """Clase para coordinar el etiquetado en N procesos con un dispositivo por worker"""
+
+    def __init__(self, model_factory, output_dir, num_workers=2, devices=None,
+                 node_index=0, num_nodes=1, runner_kwargs=None):
+        self.model_factory = model_factory
+        self.output_dir = output_dir
+        self.num_workers = max(1, num_workers)
+        self.devices = self.resolve_devices(self.num_workers, devices)
+        self.node_index = node_index
+        self.num_nodes = max(1, num_nodes)
+        self.runner_kwargs = runner_kwargs or {}
+
+    @staticmethod
+    def resolve_devices(num_workers, devices=None):
+        """Asignar un dispositivo a cada worker (lista explícita, GPUs disponibles o CPU)"""
+        if devices:
+            return [devices[i % len(devices)] for i in range(num_workers)]
+
+        gpu_count = 0
+        try:
+            import torch
+            if torch.cuda.is_available():
+                gpu_count = torch.cuda.device_count()
+        except ImportError:
+            pass
+
+        if gpu_count == 0:
+            return ["cpu"] * num_workers
+        return [f"cuda:{i % gpu_count}" for i in range(num_workers)]
+
+    def partition_node(self, frames):
+        """Frames que corresponden a este nodo (reparto estable sobre la lista ordenada)"""
+        return [f for i, f in enumerate(sorted(frames)) if i % self.num_nodes == self.node_index]
+
+    def partition(self, frames):
+        """Repartir los frames: primero por nodo, luego en bloques contiguos por worker"""
+        node_frames = self.partition_node(frames)
+        done = set(LabelingRunner.load_manifest_records(self.output_dir))
+        pending = [f for f in node_frames if f not in done]
+
+        # Bloques contiguos: cada worker recorre frames consecutivos del video
+        shards = []
+        chunk, extra = divmod(len(pending), self.num_workers)
+        start = 0
+        for worker_id in range(self.num_workers):
+            end = start + chunk + (1 if worker_id < extra else 0)
+            shards.append(pending[start:end])
+            start = end
+        return node_frames, shards
+
+    def _count_done(self, frames_set):
+        """Contar los frames del nodo terminados según el manifiesto compartido"""
+        return sum(1 for f in LabelingRunner.load_manifest_records(self.output_dir) if f in frames_set)
+
+    def _worker_manifest_name(self, worker_id):
+        """Nombre del manifiesto de un worker (único entre nodos)"""
+        return f"labeling_manifest.n{self.node_index}.w{worker_id}.jsonl"
+
+    def merge_manifests(self, node_frames):
+        """Fusionar los manifiestos de los workers del nodo en un único manifiesto"""
+        records = LabelingRunner.load_manifest_records(self.output_dir)
+        if self.num_nodes == 1:
+            merged_name = LabelingRunner.MANIFEST_FILENAME
+        else:
+            # Cada nodo reescribe solo el suyo para no pisar el trabajo de los demás
+            merged_name = f"labeling_manifest.n{self.node_index}.jsonl"
+            records = {f: r for f, r in records.items() if f in node_frames}
+
+        merged_path = os.path.join(self.output_dir, merged_name)
+        tmp_path = merged_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for frame in sorted(records):
+                f.write(json.dumps(records[frame]) + "\n")
+        os.replace(tmp_path, merged_path)
+
+        for worker_id in range(self.num_workers):
+            worker_path = os.path.join(self.output_dir, self._worker_manifest_name(worker_id))
+            if os.path.exists(worker_path):
+                os.remove(worker_path)
+        return records
+
+    def run(self, input_folder, poll_interval=5.0):
+        """Lanzar los workers, seguir el progreso y fusionar los resultados"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        frames = LabelingRunner.list_frames(input_folder)
+        node_frames, shards = self.partition(frames)
+        node_set = set(node_frames)
+        total_pending = sum(len(s) for s in shards)
+
+        print(f"🧩 Nodo {self.node_index + 1}/{self.num_nodes}: {len(node_frames)} frames, "
+              f"{total_pending} pendientes en {self.num_workers} workers ({', '.join(self.devices)})")
+
+        # spawn: obligatorio con CUDA y consistente entre Linux y Windows
+        context = multiprocessing.get_context("spawn")
+        processes = []
+        for worker_id, (device, shard) in enumerate(zip(self.devices, shards)):
+            if not shard:
+                continue
+            process = context.Process(
+                target=_run_worker,
+                args=(worker_id, device, self.model_factory, self.output_dir, input_folder,
+                      shard, self._worker_manifest_name(worker_id), self.runner_kwargs),
+                name=f"labeling-worker-{worker_id}"
+            )
+            process.start()
+            processes.append(process)
+
+        start = time.perf_counter()
+        while any(p.is_alive() for p in processes):
+            time.sleep(poll_interval)
+            done = self._count_done(node_set)
+            elapsed = time.perf_counter() - start
+            print(f"📈 Progreso: {done}/{len(node_frames)} frames ({elapsed:.0f}s)")
+
+        for process in processes:
+            process.join()
+        failed = [p.name for p in processes if p.exitcode != 0]
+
+        records = self.merge_manifests(node_set)
+        done = sum(1 for f in records if f in node_set)
+        print(f"✅ Etiquetado distribuido terminado: {done}/{len(node_frames)} frames")
+        if failed:
+            print(f"⚠️ Workers con error: {', '.join(failed)} (volver a ejecutar para reanudar)")
+        return {'total': len(node_frames), 'done': done, 'failed_workers': failed}
@@ -0,0 +1,144 @@
+"""
+Módulo con un índice espacial por frame (rejilla uniforme sobre las cajas en píxeles) para clics y solapes
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from .label_io import LabelIO
+
+
+class SpatialIndex:
+    """Clase para responder 'qué caja hay bajo el cursor' y 'qué cajas solapan con esta' sin recorrer todas"""
+
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.key = None
+        self.img_dims = None
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.cells = defaultdict(set)
+        self.cells_of = []
+
+    @staticmethod
+    def _to_arrays(annotations, img_dims):
+        """Cajas x_min,y_min,x_max,y_max en píxeles de imagen (y hacia abajo) y sus clases"""
+        yolo = np.array([[a['x_center'], a['y_center'], a['width'], a['height']] for a in annotations],
+                        dtype=np.float64).reshape(-1, 4)
+        class_ids = np.array([int(a.get('class_id', 0)) for a in annotations], dtype=np.int64)
+        return LabelIO.yolo_to_xyxy(yolo, img_dims['width'], img_dims['height']), class_ids
+
+    def _cell_range(self, x0, y0, x1, y1):
+        """Celdas de la rejilla que cubre un rectángulo"""
+        size = self.cell_size
+        return [(cx, cy)
+                for cx in range(int(x0 // size), int(x1 // size) + 1)
+                for cy in range(int(y0 // size), int(y1 // size) + 1)]
+
+    def _insert(self, index):
+        cells = self._cell_range(*self.boxes[index])
+        for cell in cells:
+            self.cells[cell].add(index)
+        self.cells_of[index] = cells
+
+    def _remove(self, index):
+        for cell in self.cells_of[index]:
+            self.cells[cell].discard(index)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        self.cells_of[index] = []
+
+    def build(self, annotations, img_dims, key=None):
+        """Indexar desde cero las anotaciones de un frame"""
+        self.key = key
+        self.img_dims = dict(img_dims)
+        self.boxes, self.class_ids = self._to_arrays(annotations, img_dims)
+        self.cells = defaultdict(set)
+        self.cells_of = [[] for _ in range(len(self.boxes))]
+        for index in range(len(self.boxes)):
+            self._insert(index)
+        return self
+
+    def update(self, index, annotation):
+        """Reubicar una caja editada (solo se tocan sus celdas)"""
+        boxes, class_ids = self._to_arrays([annotation], self.img_dims)
+        self._remove(index)
+        self.boxes[index] = boxes[0]
+        self.class_ids[index] = class_ids[0]
+        self._insert(index)
+
+    def sync(self, annotations, img_dims, key=None):
+        """Poner el índice al día con las anotaciones actuales: si solo cambiaron algunas cajas se reubican esas"""
+        if key != self.key or img_dims != self.img_dims or len(annotations) != len(self.boxes):
+            return self.build(annotations, img_dims, key)
+        boxes, class_ids = self._to_arrays(annotations, img_dims)
+        moved = np.flatnonzero((np.abs(boxes - self.boxes) > 1e-6).any(axis=1) | (class_ids != self.class_ids))
+        for index in moved:
+            self.update(int(index), annotations[index])
+        return self
+
+    def _candidates(self, x0, y0, x1, y1):
+        """Índices registrados en las celdas que cubre el rectángulo (superconjunto del resultado)"""
+        found = set()
+        for cell in self._cell_range(x0, y0, x1, y1):
+            found |= self.cells.get(cell, set())
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def hit_test(self, x, y, margin=0.0):
+        """Cajas que contienen el punto (píxeles de imagen), de la más pequeña a la más grande
+
+        Con cajas anidadas la más pequeña es la única que no se puede seleccionar de otra forma; a igual área
+        gana la dibujada encima (índice mayor)."""
+        candidates = self._candidates(x - margin, y - margin, x + margin, y + margin)
+        if not len(candidates):
+            return []
+        boxes = self.boxes[candidates]
+        inside = ((boxes[:, 0] - margin <= x) & (x <= boxes[:, 2] + margin) &
+                  (boxes[:, 1] - margin <= y) & (y <= boxes[:, 3] + margin))
+        hits, boxes = candidates[inside], boxes[inside]
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        return hits[np.lexsort((-hits, area))].tolist()
+
+    def query(self, x0, y0, x1, y1):
+        """Cajas que intersectan el rectángulo (píxeles de imagen), en orden de índice"""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        candidates = self._candidates(x0, y0, x1, y1)
+        if not len(candidates):
+            return []
+        boxes = self.boxes[candidates]
+        overlap = (boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0)
+        return sorted(candidates[overlap].tolist())
+
+    def _iou(self, box, candidates):
+        boxes = self.boxes[candidates]
+        inter_w = np.clip(np.minimum(boxes[:, 2], box[2]) - np.maximum(boxes[:, 0], box[0]), 0, None)
+        inter_h = np.clip(np.minimum(boxes[:, 3], box[3]) - np.maximum(boxes[:, 1], box[1]), 0, None)
+        inter = inter_w * inter_h
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        box_area = (box[2] - box[0]) * (box[3] - box[1])
+        return inter / np.maximum(area + box_area - inter, 1e-12)
+
+    def overlapping(self, box, min_iou=0.0, class_id=None, exclude=None):
+        """Cajas que solapan con 'box' (x_min,y_min,x_max,y_max): [(índice, IoU)] de mayor a menor IoU"""
+        candidates = np.array(self.query(*box), dtype=np.int64)
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if class_id is not None:
+            candidates = candidates[self.class_ids[candidates] == class_id]
+        if not len(candidates):
+            return []
+        iou = self._iou(np.asarray(box, dtype=np.float64), candidates)
+        keep = (iou > 0) & (iou >= min_iou)
+        order = np.argsort(-iou[keep], kind='stable')
+        return [(int(i), float(v)) for i, v in zip(candidates[keep][order], iou[keep][order])]
+
+    def duplicates(self, min_iou=0.9, same_class=True):
+        """Parejas (i, j, IoU) con i < j que probablemente son la misma caja repetida"""
+        pairs = []
+        for index in range(len(self.boxes)):
+            class_id = int(self.class_ids[index]) if same_class else None
+            for other, iou in self.overlapping(self.boxes[index], min_iou, class_id, exclude=index):
+                if other > index:
+                    pairs.append((index, other, iou))
+        return pairs
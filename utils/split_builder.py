@@ -0,0 +1,152 @@
+"""
+Módulo para generar splits train/val/test estratificados por clase y sin fugas entre frames vecinos
+"""
+import os
+import re
+
+import numpy as np
+import yaml
+
+from .label_io import LabelIO
+from .label_index import LabelIndex
+
+
+class SplitBuilder:
+    """Clase para repartir segmentos de video entre splits y escribir data.yaml + listas de imágenes"""
+
+    SPLIT_NAMES = ("train", "val", "test")
+    FRAME_PATTERN = re.compile(r'^(.*?)(\d+)$')
+
+    def __init__(self, dataset_path, ratios=(0.8, 0.2, 0.0), segment_length=50, seed=0, index=None, gap=5):
+        self.dataset_path = dataset_path
+        self.ratios = np.asarray(ratios, dtype=np.float64) / float(sum(ratios))
+        self.segment_length = max(1, int(segment_length))
+        # Frames que se descartan al inicio de un segmento cuyo vecino anterior cayó en otro split
+        self.gap = max(0, min(int(gap), self.segment_length - 1))
+        self.seed = seed
+        self.index = index
+
+    def segment_ids(self, stems):
+        """Agrupar frames consecutivos del mismo video: (prefijo, número // segment_length)"""
+        keys = {}
+        segment_of = np.empty(len(stems), dtype=np.int64)
+        for i, stem in enumerate(stems):
+            match = self.FRAME_PATTERN.match(stem)
+            if match:
+                key = (match.group(1), int(match.group(2)) // self.segment_length)
+            else:
+                # Sin número de frame no hay vecinos conocidos: segmento propio
+                key = (stem, -1)
+            segment_of[i] = keys.setdefault(key, len(keys))
+        return segment_of, len(keys)
+
+    def boundary_frames(self, stems, split_of_frame):
+        """Máscara de frames a excluir: los 'gap' primeros de un segmento cuyo segmento anterior del mismo video
+        está en otro split (los frames 49 y 50 son casi idénticos aunque caigan en segmentos distintos)"""
+        excluded = np.zeros(len(stems), dtype=bool)
+        if not self.gap:
+            return excluded
+        frames, split_at = [], {}
+        for i, stem in enumerate(stems):
+            match = self.FRAME_PATTERN.match(stem)
+            if match:
+                segment, position = divmod(int(match.group(2)), self.segment_length)
+                frames.append((i, match.group(1), segment, position))
+                split_at[(match.group(1), segment)] = split_of_frame[i]
+        for i, prefix, segment, position in frames:
+            if position < self.gap:
+                previous = split_at.get((prefix, segment - 1))
+                excluded[i] = previous is not None and previous != split_of_frame[i]
+        return excluded
+
+    def assign(self, counts, segment_of, num_segments):
+        """Asignar cada segmento al split con mayor déficit en las clases que contiene"""
+        num_classes = counts.shape[1]
+        # Conteos por segmento: clases + número de frames (para respetar también la proporción de imágenes)
+        seg_counts = np.zeros((num_segments, num_classes + 1), dtype=np.float64)
+        np.add.at(seg_counts[:, :num_classes], segment_of, counts)
+        np.add.at(seg_counts[:, num_classes], segment_of, 1)
+
+        totals = np.maximum(seg_counts.sum(axis=0), 1)
+        targets = self.ratios[:, None] * totals[None, :]
+        current = np.zeros_like(targets)
+        active = self.ratios > 0
+
+        # Primero los segmentos con las clases más raras (estratificación iterativa)
+        rarity = np.where(seg_counts > 0, totals[None, :], np.inf)
+        rarity[:, num_classes] = np.inf
+        rarest_class = np.where(np.isfinite(rarity.min(axis=1)), rarity.argmin(axis=1), num_classes)
+        tie_break = np.random.default_rng(self.seed).random(num_segments)
+        order = np.lexsort((tie_break, -seg_counts[:, num_classes], totals[rarest_class]))
+
+        split_of_segment = np.zeros(num_segments, dtype=np.int64)
+        safe_targets = np.maximum(targets, 1e-9)
+        for s in order:
+            # Manda el déficit relativo de la clase más rara del segmento; el resto desempata
+            need = (targets - current) / safe_targets
+            score = need[:, rarest_class[s]] + 1e-3 * need[:, seg_counts[s] > 0].sum(axis=1)
+            score[~active] = -np.inf
+            k = int(np.argmax(score))
+            split_of_segment[s] = k
+            current[k] += seg_counts[s]
+        return split_of_segment
+
+    def build(self):
+        """Calcular el split de cada frame; devuelve {nombre_split: [imagenes]}"""
+        index = self.index or LabelIndex(self.dataset_path).build()
+        segment_of, num_segments = self.segment_ids(index.stems)
+        split_of_segment = self.assign(index.counts, segment_of, num_segments)
+        split_of_frame = split_of_segment[segment_of]
+        # Hueco en las fronteras entre splits: esos frames no van a ninguno
+        excluded = self.boundary_frames(index.stems, split_of_frame)
+        split_of_frame[excluded] = -1
+
+        splits = {}
+        for k, name in enumerate(self.SPLIT_NAMES):
+            if self.ratios[k] > 0:
+                members = np.flatnonzero(split_of_frame == k)
+                splits[name] = [index.image_files[i] for i in members]
+
+        totals = np.maximum(index.class_totals(), 1)
+        print(f"🧮 {len(index.stems)} frames en {num_segments} segmentos")
+        if excluded.any():
+            print(f"   ✂️ {int(excluded.sum())} frames excluidos en fronteras entre splits (--gap {self.gap})")
+        for k, name in enumerate(self.SPLIT_NAMES):
+            if name in splits:
+                share = index.counts[split_of_frame == k].sum(axis=0) / totals
+                per_class = ", ".join(f"{c}:{v:.0%}" for c, v in enumerate(share))
+                print(f"   {name}: {len(splits[name])} frames | cajas por clase [{per_class}]")
+        return splits
+
+    def _ensure_labels_link(self):
+        """Ultralytics busca las etiquetas en labels/: enlace simbólico a annotations/"""
+        link_path = os.path.join(self.dataset_path, "labels")
+        if os.path.lexists(link_path):
+            return
+        try:
+            os.symlink("annotations", link_path, target_is_directory=True)
+        except OSError as e:
+            print(f"⚠️ No se pudo crear labels/ -> annotations/ ({e}); cree el enlace a mano para entrenar")
+
+    def write(self, splits):
+        """Escribir <split>.txt y actualizar data.yaml sin copiar imágenes"""
+        for name, image_files in splits.items():
+            # Rutas './...' relativas al .txt: el dataset se puede mover sin regenerar las listas
+            text = "".join(f"./images/{image_file}\n" for image_file in image_files)
+            LabelIO.write_atomic(os.path.join(self.dataset_path, f"{name}.txt"), text)
+
+        yaml_path = os.path.join(self.dataset_path, "data.yaml")
+        data = {}
+        if os.path.exists(yaml_path):
+            with open(yaml_path, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        data['path'] = os.path.abspath(self.dataset_path)
+        for name in self.SPLIT_NAMES:
+            data.pop(name, None)
+            if name in splits:
+                data[name] = f"{name}.txt"
+        LabelIO.write_atomic(yaml_path, yaml.safe_dump(data, allow_unicode=True, sort_keys=False))
+
+        self._ensure_labels_link()
+        print(f"✅ Splits escritos en {yaml_path}")
+        return yaml_path
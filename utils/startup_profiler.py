@@ -0,0 +1,112 @@
+"""
+Módulo para medir el arranque del editor (--profile-startup): tiempo de imports por paquete y de cada etapa
+"""
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """Clase para cronometrar las etapas de inicialización e informar de lo que cuesta arrancar"""
+
+    # Paquetes pesados: el informe avisa si alguno acabó cargado en el proceso del editor
+    HEAVY_MODULES = ("torch", "torchvision", "autodistill", "ultralytics", "onnxruntime", "cv2", "pandas", "sklearn")
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """Cronometrar un bloque; sin --profile-startup no hace nada"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def record(self, name, seconds):
+        """Añadir una etapa medida en otro sitio (p. ej. en un hilo de fondo)"""
+        if self.enabled:
+            self.stages.append((name, seconds))
+
+    def report_on_first_response(self, url, module_name=None, timeout=60):
+        """Consultar 'url' en un hilo hasta que el servidor conteste, cronometrar desde el inicio del perfil e
+        imprimir entonces el informe. El listado de imágenes sigue en segundo plano: solo aparece si ya terminó"""
+        if not self.enabled:
+            return
+
+        def _probe():
+            deadline = time.perf_counter() + timeout
+            while time.perf_counter() < deadline:
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        response.read()
+                    break
+                except OSError:
+                    time.sleep(0.01)  # Servidor todavía sin escuchar
+            else:
+                print(f"⚠️ {url} no respondió en {timeout} s")
+                return
+            self.record("hasta la primera respuesta HTTP", time.perf_counter() - self.started)
+            self.report(module_name)
+
+        threading.Thread(target=_probe, daemon=True, name="startup-probe").start()
+
+    @staticmethod
+    def import_times(module_name, top=12):
+        """Coste de los imports directos de 'module_name', agrupados por paquete y medidos con -X importtime en
+        un proceso limpio: [(paquete, segundos)] de mayor a menor"""
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+                                capture_output=True, text=True)
+        totals, children = defaultdict(float), []
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | nombre": el nombre va sangrado 2 espacios por nivel y los
+            # imports anidados aparecen antes que el módulo que los importa
+            parts = line.split("|")
+            if not line.startswith("import time:") or len(parts) != 3:
+                continue
+            try:
+                own, cumulative = int(parts[0].split(":")[1]), int(parts[1])
+            except ValueError:
+                continue  # Cabecera
+            name = parts[2][1:]
+            level = (len(name) - len(name.lstrip())) // 2
+            name = name.strip()
+            if level == 1:
+                children.append((name.split(".")[0], cumulative))
+            elif level == 0:
+                if name == module_name:
+                    for package, micros in children:
+                        totals[package] += micros / 1e6
+                    totals[f"{module_name} (propio)"] += own / 1e6
+                children = []
+        return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+    def report(self, module_name=None):
+        """Imprimir imports por paquete, etapas de inicialización y paquetes pesados cargados"""
+        if not self.enabled:
+            return
+        print("\n⏱️ PERFIL DE ARRANQUE")
+        if module_name:
+            imports = self.import_times(module_name)
+            print(f"  Imports de {module_name} (proceso limpio, acumulado por paquete):")
+            for package, seconds in imports:
+                print(f"    {package:<32}{seconds * 1000:>9.1f} ms")
+        print("  Etapas:")
+        for name, seconds in self.stages:
+            print(f"    {name:<32}{seconds * 1000:>9.1f} ms")
+        print(f"  Total desde el inicio del perfil: {(time.perf_counter() - self.started) * 1000:.1f} ms")
+        heavy = sorted({name.split(".")[0] for name in sys.modules} & set(self.HEAVY_MODULES))
+        if heavy:
+            print(f"  ⚠️ Paquetes pesados cargados: {', '.join(heavy)}")
+        else:
+            print("  ✅ Sin torch/autodistill/cv2 cargados en el editor")
@@ -0,0 +1,160 @@
+"""
+Módulo para generar y servir miniaturas WebP (con las cajas dibujadas) para la vista de cuadrícula
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .label_io import LabelIO
+from .label_index import LabelIndex, IMAGE_EXTENSIONS
+
+
+def _render_thumbnails(images_path, labels_path, cache_dir, items, size, class_colors):
+    """Generar un bloque de miniaturas; se ejecuta en un proceso worker. Devuelve {imagen: firma}"""
+    from PIL import Image, ImageDraw
+
+    rendered = {}
+    for image_file, signature in items:
+        try:
+            with Image.open(os.path.join(images_path, image_file)) as image:
+                # draft: los JPEG se decodifican directamente a escala reducida
+                image.draft('RGB', (size, size))
+                thumbnail = image.convert('RGB')
+            thumbnail.thumbnail((size, size))
+
+            labels = LabelIO.read_array(os.path.join(labels_path, LabelIO.label_filename(image_file)))
+            if len(labels):
+                draw = ImageDraw.Draw(thumbnail)
+                xyxy = LabelIO.yolo_to_xyxy(labels[:, 1:5], *thumbnail.size)
+                for class_id, box in zip(labels[:, 0].astype(int), xyxy):
+                    draw.rectangle(box.tolist(), outline=class_colors[class_id % len(class_colors)], width=2)
+
+            thumbnail.save(os.path.join(cache_dir, image_file + ".webp"), "WEBP", quality=70, method=4)
+            rendered[image_file] = signature
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Miniatura omitida {image_file}: {e}")
+    return rendered
+
+
+class ThumbnailCache:
+    """Clase para mantener una miniatura WebP por frame con un índice de firmas (imagen + etiqueta)"""
+
+    CACHE_FOLDER = ".thumbnails"
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, dataset_path, class_colors, size=160, num_workers=None, chunk_size=256):
+        self.images_path = os.path.join(dataset_path, "images")
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.cache_dir = os.path.join(dataset_path, self.CACHE_FOLDER)
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILENAME)
+        self.class_colors = list(class_colors)
+        self.size = size
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+        self.index = self._load_index()
+        self.lock = threading.Lock()
+        self.progress = {'done': 0, 'total': 0, 'running': False, 'error': None}
+        self._thread = None
+
+    def _load_index(self):
+        """Índice {imagen: [mtime_ns imagen, tamaño imagen, mtime_ns etiqueta, tamaño etiqueta]}"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with self.lock:
+            text = json.dumps(self.index)
+        LabelIO.write_atomic(self.index_path, text)
+
+    def signature(self, image_file):
+        """Firma actual de una imagen y su etiqueta (dos stat)"""
+        signature = []
+        for path in (os.path.join(self.images_path, image_file),
+                     os.path.join(self.labels_path, LabelIO.label_filename(image_file))):
+            try:
+                stat = os.stat(path)
+                signature += [stat.st_mtime_ns, stat.st_size]
+            except FileNotFoundError:
+                signature += [0, 0]
+        return signature
+
+    def _stale_items(self):
+        """Miniaturas que faltan o cuya imagen/etiqueta cambió (un scandir por carpeta)"""
+        images = LabelIndex.scan_signatures(self.images_path, IMAGE_EXTENSIONS)
+        labels = LabelIndex.scan_signatures(self.labels_path, (LabelIO.LABEL_EXTENSION,))
+        items = []
+        for image_file in sorted(images):
+            signature = list(images[image_file]) + list(labels.get(LabelIO.label_filename(image_file), (0, 0)))
+            if self.index.get(image_file) != signature:
+                items.append((image_file, signature))
+        return items
+
+    def start(self):
+        """Generar en segundo plano las miniaturas pendientes con un pool de procesos"""
+        if self.progress['running']:
+            return self
+        self.progress.update(done=0, total=0, running=True, error=None)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            items = self._stale_items()
+            self.progress['total'] = len(items)
+            chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+            if not chunks:
+                return
+
+            args = (self.images_path, self.labels_path, self.cache_dir)
+            # spawn: mismo comportamiento en Linux y Windows (como el etiquetado distribuido)
+            context = multiprocessing.get_context("spawn")
+            last_save = time.monotonic()
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context) as executor:
+                futures = {executor.submit(_render_thumbnails, *args, chunk, self.size, self.class_colors): len(chunk)
+                           for chunk in chunks}
+                for future in as_completed(futures):
+                    rendered = future.result()
+                    with self.lock:
+                        self.index.update(rendered)
+                    self.progress['done'] += futures[future]
+                    if time.monotonic() - last_save > 5:
+                        self._save_index()
+                        last_save = time.monotonic()
+            self._save_index()
+            print(f"🖼️ Miniaturas generadas: {len(items)}")
+        except Exception as e:
+            print(f"❌ Error generando miniaturas: {e}")
+            self.progress['error'] = str(e)
+        finally:
+            self.progress['running'] = False
+
+    def thumbnail_path(self, image_file):
+        """Ruta de la miniatura, regenerándola en el momento si falta o está desactualizada"""
+        path = os.path.join(self.cache_dir, image_file + ".webp")
+        signature = self.signature(image_file)
+        if signature[:2] == [0, 0]:
+            return None  # La imagen no existe
+        with self.lock:
+            cached = self.index.get(image_file)
+        if cached != signature or not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            rendered = _render_thumbnails(self.images_path, self.labels_path, self.cache_dir,
+                                          [(image_file, signature)], self.size, self.class_colors)
+            if not rendered:
+                return None
+            with self.lock:
+                self.index.update(rendered)
+        return path
+
+    def version(self, image_file):
+        """Token para invalidar la caché del navegador cuando cambia la etiqueta"""
+        return "-".join(str(v) for v in self.signature(image_file)[2:])
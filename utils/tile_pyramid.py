@@ -0,0 +1,119 @@
+"""
+Módulo con una pirámide de teselas por imagen (generada bajo demanda y guardada en disco) para frames de alta resolución
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+
+class TilePyramid:
+    """Clase para servir una vista general reducida y las teselas que cubren el área visible a cada nivel de zoom"""
+
+    CACHE_FOLDER = ".tiles"
+
+    def __init__(self, dataset_path, tile_size=512, overview_side=1280, min_side=2048, max_cached_levels=4):
+        self.images_path = os.path.join(dataset_path, "images")
+        self.cache_dir = os.path.join(dataset_path, self.CACHE_FOLDER)
+        self.tile_size = tile_size
+        self.overview_side = overview_side
+        # Por debajo de este lado la imagen se envía entera, como hasta ahora
+        self.min_side = min_side
+        self.max_cached_levels = max_cached_levels
+        self.levels = OrderedDict()
+        self.lock = threading.Lock()
+
+    def is_tiled(self, img_width, img_height):
+        """Si la imagen es lo bastante grande para usar la pirámide"""
+        return max(img_width, img_height) > self.min_side
+
+    def overview_level(self, img_width, img_height):
+        """Nivel (factor 2^nivel) cuya imagen entera cabe en overview_side"""
+        return max(0, math.ceil(math.log2(max(img_width, img_height) / self.overview_side)))
+
+    def _level_image(self, image_file, level):
+        """Imagen reducida de un nivel (caché LRU en memoria de los últimos niveles usados)"""
+        from PIL import Image
+
+        key = (image_file, level)
+        with self.lock:
+            if key in self.levels:
+                self.levels.move_to_end(key)
+                return self.levels[key]
+
+        with Image.open(os.path.join(self.images_path, image_file)) as image:
+            factor = 2 ** level
+            size = (max(1, math.ceil(image.width / factor)), max(1, math.ceil(image.height / factor)))
+            # draft: los JPEG se decodifican directamente a escala reducida cuando es posible
+            image.draft('RGB', size)
+            level_image = image.convert('RGB')
+        if level_image.size != size:
+            level_image = level_image.resize(size, Image.LANCZOS)
+
+        with self.lock:
+            self.levels[key] = level_image
+            while len(self.levels) > self.max_cached_levels:
+                self.levels.popitem(last=False)
+        return level_image
+
+    def _is_fresh(self, path, image_file):
+        """La tesela existe y es posterior a la imagen de origen"""
+        try:
+            return os.stat(path).st_mtime_ns >= os.stat(os.path.join(self.images_path, image_file)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _save(image, path):
+        """Guardar WebP de forma atómica (varias peticiones pueden pedir la misma tesela)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, "WEBP", quality=80, method=4)
+        os.replace(tmp_path, path)
+
+    def overview_path(self, image_file):
+        """Vista general de la imagen completa (un único archivo pequeño)"""
+        path = os.path.join(self.cache_dir, image_file, "overview.webp")
+        if not self._is_fresh(path, image_file):
+            from PIL import Image
+            with Image.open(os.path.join(self.images_path, image_file)) as image:
+                level = self.overview_level(image.width, image.height)
+            self._save(self._level_image(image_file, level), path)
+        return path
+
+    def tile_path(self, image_file, level, tile_x, tile_y):
+        """Tesela (tile_x, tile_y) del nivel indicado, generada la primera vez que se pide"""
+        path = os.path.join(self.cache_dir, image_file, str(level), f"{tile_x}_{tile_y}.webp")
+        if not self._is_fresh(path, image_file):
+            level_image = self._level_image(image_file, level)
+            x0, y0 = tile_x * self.tile_size, tile_y * self.tile_size
+            if x0 >= level_image.width or y0 >= level_image.height:
+                return None
+            box = (x0, y0, min(x0 + self.tile_size, level_image.width), min(y0 + self.tile_size, level_image.height))
+            self._save(level_image.crop(box), path)
+        return path
+
+    def visible_tiles(self, img_width, img_height, x_range, y_range, display_width):
+        """Teselas que cubren el área visible al nivel adecuado para el zoom: [(nivel, tx, ty, x, y, ancho, alto)]
+
+        x_range/y_range están en coordenadas del gráfico (y invertida respecto a la imagen)."""
+        x0, x1 = sorted(max(0.0, min(float(v), img_width)) for v in x_range)
+        y0, y1 = sorted(max(0.0, min(img_height - float(v), img_height)) for v in y_range)
+        if x1 <= x0 or y1 <= y0:
+            return []
+
+        # Píxeles de imagen por píxel de pantalla -> nivel de la pirámide
+        density = (x1 - x0) / max(display_width, 1)
+        level = max(0, int(math.floor(math.log2(density)))) if density > 1 else 0
+        if level >= self.overview_level(img_width, img_height):
+            return []  # La vista general ya tiene suficiente resolución
+
+        span = self.tile_size * 2 ** level
+        tiles = []
+        for tile_y in range(int(y0 // span), int(math.ceil(y1 / span))):
+            for tile_x in range(int(x0 // span), int(math.ceil(x1 / span))):
+                width = min(span, img_width - tile_x * span)
+                height = min(span, img_height - tile_y * span)
+                if width > 0 and height > 0:
+                    tiles.append((level, tile_x, tile_y, tile_x * span, tile_y * span, width, height))
+        return tiles
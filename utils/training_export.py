@@ -0,0 +1,181 @@
+"""
+Módulo para exportar el dataset editado al layout de entrenamiento de Ultralytics de forma incremental
+"""
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from .label_io import LabelIO
+from .label_index import LabelIndex, IMAGE_EXTENSIONS
+
+
+class TrainingExporter:
+    """Clase para materializar <split>/images y <split>/labels con enlaces, actualizando solo lo que cambió"""
+
+    STATE_FILENAME = ".export_state.json"
+    # Nombre de carpeta que usa autodistill/Ultralytics para cada split
+    SPLIT_FOLDERS = {"train": "train", "val": "valid", "test": "test"}
+
+    def __init__(self, dataset_path, export_path, link_mode="hardlink", num_workers=8):
+        self.dataset_path = dataset_path
+        self.images_path = os.path.join(dataset_path, "images")
+        self.labels_path = os.path.join(dataset_path, "annotations")
+        self.export_path = export_path
+        self.state_path = os.path.join(export_path, self.STATE_FILENAME)
+        self.link_mode = link_mode
+        self.num_workers = num_workers
+
+    def load_splits(self):
+        """Leer las listas <split>.txt generadas por 'split' ({imagen: split})"""
+        split_of = {}
+        for split in self.SPLIT_FOLDERS:
+            list_path = os.path.join(self.dataset_path, f"{split}.txt")
+            if not os.path.exists(list_path):
+                continue
+            with open(list_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        split_of[os.path.basename(line)] = split
+        return split_of
+
+    @classmethod
+    def split_key(cls, split):
+        """Aceptar el nombre del split ('val') o el de su carpeta ('valid')"""
+        if split in cls.SPLIT_FOLDERS:
+            return split
+        for key, folder in cls.SPLIT_FOLDERS.items():
+            if split == folder:
+                return key
+        raise ValueError(f"Split desconocido: {split!r} (válidos: {', '.join(cls.SPLIT_FOLDERS)})")
+
+    def _load_state(self):
+        """Estado de la última exportación: {ruta_destino: [mtime_ns, tamaño]} del origen"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _link_image(self, src, dst):
+        """Las imágenes no cambian: hardlink/symlink con copia como último recurso"""
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if self.link_mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        if self.link_mode in ("hardlink", "symlink"):
+            try:
+                os.symlink(os.path.abspath(src), dst)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+
+    def _scan_exported(self):
+        """Archivos presentes en <carpeta>/images y <carpeta>/labels del destino (rutas relativas)"""
+        found = set()
+        for folder in self.SPLIT_FOLDERS.values():
+            for kind in ("images", "labels"):
+                directory = os.path.join(self.export_path, folder, kind)
+                try:
+                    with os.scandir(directory) as entries:
+                        found.update(f"{folder}/{kind}/{entry.name}" for entry in entries
+                                     if not entry.is_dir(follow_symlinks=False))
+                except FileNotFoundError:
+                    continue
+        return found
+
+    @staticmethod
+    def _copy_label(src, dst):
+        """Las etiquetas se copian: el editor las reescribe y un enlace cambiaría el dataset durante el entrenamiento"""
+        shutil.copy2(src, dst)
+
+    def _write_data_yaml(self, splits_present):
+        """data.yaml del layout exportado (conserva names/nc del dataset original)"""
+        data = {}
+        source_yaml = os.path.join(self.dataset_path, "data.yaml")
+        if os.path.exists(source_yaml):
+            with open(source_yaml, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        data = {k: v for k, v in data.items() if k not in ("path", "train", "val", "test")}
+        data['path'] = os.path.abspath(self.export_path)
+        for split in splits_present:
+            data[split] = f"{self.SPLIT_FOLDERS[split]}/images"
+        LabelIO.write_atomic(os.path.join(self.export_path, "data.yaml"),
+                             yaml.safe_dump(data, allow_unicode=True, sort_keys=False))
+
+    def export(self, split_of=None, default_split="train", full=False):
+        """Exportar; sin 'full' solo se tocan los archivos cuyo origen o split cambió. Con 'full' se reescribe
+        todo y se borra del destino cualquier archivo que ya no corresponda (frames borrados o cambiados de split).
+        'default_split' solo se usa si no hay listas <split>.txt: con listas, un frame que no aparece en ninguna
+        (p. ej. el hueco que deja 'split' en las fronteras) no se exporta"""
+        if split_of is None:
+            split_of = self.load_splits()
+        if split_of:
+            default_split = None
+        default_split = self.split_key(default_split) if default_split is not None else None
+        images = LabelIndex.scan_signatures(self.images_path, IMAGE_EXTENSIONS)
+        labels = LabelIndex.scan_signatures(self.labels_path, (LabelIO.LABEL_EXTENSION,))
+        previous = self._load_state()
+
+        # Estado deseado: ruta relativa de destino -> (origen, firma)
+        desired = {}
+        for image_file in sorted(images):
+            split = split_of.get(image_file, default_split)
+            if split is None:
+                continue
+            folder = self.SPLIT_FOLDERS[self.split_key(split)]
+            desired[f"{folder}/images/{image_file}"] = (
+                os.path.join(self.images_path, image_file), list(images[image_file]))
+            label_file = LabelIO.label_filename(image_file)
+            if label_file in labels:
+                desired[f"{folder}/labels/{label_file}"] = (
+                    os.path.join(self.labels_path, label_file), list(labels[label_file]))
+
+        if full:
+            # El estado puede faltar o estar desfasado: lo que haya en el destino decide qué sobra
+            changed = list(desired)
+            removed = sorted((set(previous) | self._scan_exported()) - set(desired))
+        else:
+            changed = [rel for rel, (_, sig) in desired.items() if previous.get(rel) != sig]
+            removed = [rel for rel in previous if rel not in desired]
+
+        for folder in {rel.rsplit("/", 1)[0] for rel in changed}:
+            os.makedirs(os.path.join(self.export_path, folder), exist_ok=True)
+
+        def _apply(rel):
+            dst = os.path.join(self.export_path, rel)
+            if rel in desired:
+                src = desired[rel][0]
+                if "/labels/" in rel:
+                    self._copy_label(src, dst)
+                else:
+                    self._link_image(src, dst)
+            elif os.path.lexists(dst):
+                os.remove(dst)
+
+        # Primero los borrados: un frame que cambia de split no debe quedar en las dos carpetas. Si algo falla,
+        # la excepción sale antes de guardar el estado y la siguiente exportación lo reintenta
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            list(executor.map(_apply, removed))
+            list(executor.map(_apply, changed))
+
+        os.makedirs(self.export_path, exist_ok=True)
+        self._write_data_yaml([s for s in self.SPLIT_FOLDERS
+                               if any(rel.startswith(self.SPLIT_FOLDERS[s] + "/") for rel in desired)])
+        LabelIO.write_atomic(self.state_path, json.dumps({rel: sig for rel, (_, sig) in desired.items()}))
+
+        skipped = sum(1 for image_file in images if image_file not in split_of) if default_split is None else 0
+        summary = {'files': len(desired), 'updated': len(changed), 'removed': len(removed), 'skipped': skipped}
+        print(f"📦 Exportación: {summary['files']} archivos, {summary['updated']} actualizados, "
+              f"{summary['removed']} eliminados -> {self.export_path}")
+        if skipped:
+            print(f"   ✂️ {skipped} imágenes fuera de las listas <split>.txt no se exportan")
+        return summary
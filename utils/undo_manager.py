@@ -1,6 +1,7 @@
 """
 Módulo para el sistema de deshacer (undo)
 """
+import threading
 
 
 class UndoManager:
@@ -9,6 +10,8 @@ class UndoManager:
     def __init__(self, max_steps=20):
         self.undo_stack = []
         self.max_steps = max_steps
+        # El servidor atiende varias peticiones a la vez (gunicorn gthread)
+        self.lock = threading.Lock()
     
     def push_state(self, image_filename, annotations):
         """Agregar estado al stack de undo"""
@@ -17,29 +20,37 @@ class UndoManager:
             'annotations': [ann.copy() for ann in annotations]  # Deep copy
         }
         
-        self.undo_stack.append(state)
-        
-        # Limitar el tamaño del stack
-        if len(self.undo_stack) > self.max_steps:
-            self.undo_stack.pop(0)
+        with self.lock:
+            self.undo_stack.append(state)
+            
+            # Limitar el tamaño del stack
+            if len(self.undo_stack) > self.max_steps:
+                self.undo_stack.pop(0)
     
-    def pop_state(self):
-        """Recuperar último estado del stack de undo"""
-        if self.undo_stack:
-            return self.undo_stack.pop()
+    def pop_state(self, image_filename=None):
+        """Recuperar último estado del stack de undo (el último de 'image_filename' si se indica: con varios
+        anotadores, deshacer en una imagen no consume las acciones hechas en otra)"""
+        with self.lock:
+            for i in range(len(self.undo_stack) - 1, -1, -1):
+                if image_filename is None or self.undo_stack[i]['image_filename'] == image_filename:
+                    return self.undo_stack.pop(i)
         return None
     
     def can_undo(self):
         """Verificar si se puede deshacer"""
         return len(self.undo_stack) > 0
     
-    def get_undo_count(self):
-        """Obtener número de acciones que se pueden deshacer"""
-        return len(self.undo_stack)
+    def get_undo_count(self, image_filename=None):
+        """Obtener número de acciones que se pueden deshacer (en 'image_filename' si se indica)"""
+        with self.lock:
+            if image_filename is None:
+                return len(self.undo_stack)
+            return sum(1 for state in self.undo_stack if state['image_filename'] == image_filename)
     
     def clear(self):
         """Limpiar el stack de undo"""
-        self.undo_stack.clear()
+        with self.lock:
+            self.undo_stack.clear()
     
     def get_last_state_for_image(self, image_filename):
         """Obtener el último estado para una imagen específica"""
@@ -0,0 +1,27 @@
+"""
+Punto de entrada WSGI del editor para servidores de producción
+
+    ANNOTATION_DATASET=dataset_cruce_3 gunicorn -c gunicorn.conf.py wsgi:server
+
+Variables de entorno:
+    ANNOTATION_DATASET        Ruta del dataset (por defecto dataset_cruce_3)
+    ANNOTATION_DETECTOR       Detector para sugerencias: 'stub', pesos .pt o modelo .onnx (opcional)
+    ANNOTATION_DETECTOR_CONF  Confianza mínima de las sugerencias (por defecto 0.25)
+    ANNOTATION_IO_WORKERS     Hilos de precarga de imágenes y etiquetas (por defecto 4)
+"""
+import os
+
+from advanced_annotation_tool_modular import AdvancedAnnotationTool
+from utils import build_detector
+
+detector_spec = os.environ.get("ANNOTATION_DETECTOR") or None
+
+tool = AdvancedAnnotationTool(
+    dataset_path=os.environ.get("ANNOTATION_DATASET", "dataset_cruce_3"),
+    detector=build_detector(detector_spec, confidence=float(os.environ.get("ANNOTATION_DETECTOR_CONF", "0.25"))),
+    detector_name=detector_spec or "",
+    io_workers=int(os.environ.get("ANNOTATION_IO_WORKERS", "4"))
+)
+app = tool.app
+# Aplicación Flask subyacente de Dash (la que cargan gunicorn, waitress o uWSGI)
+server = app.server